@@ -0,0 +1,121 @@
+"""
+Abonos a empeños de artículos de valor y vehículos.
+
+Cada abono se guarda en la tabla abonos (solo se agregan filas) y el saldo
+resultante queda en la fila del empeño, así consultar el saldo no requiere
+recorrer los abonos. El abono cubre primero el interés pendiente y el resto
+baja el capital; desde ahí el interés corre sobre el capital pendiente.
+"""
+from datetime import date
+from fastapi import HTTPException
+from database import database, execute_rowcount
+from models import abonos, articulos_valor, vehiculos
+from intereses import calcular_interes
+from versiones import MENSAJE_CONFLICTO
+
+# tipo -> (tabla, columna del valor prestado, columna de la fecha del empeño, columna en abonos)
+EMPENOS = {
+    "articulo": (articulos_valor, "valor", "fecha_registro", "articulo_id"),
+    "vehiculo": (vehiculos, "valor_empeno", "fecha_empeno", "vehiculo_id"),
+}
+
+# Valores que dejan la fila sin abonos (al empeñar de nuevo un vehículo)
+SALDO_INICIAL = {
+    "saldo_capital": None,
+    "saldo_interes": None,
+    "meses_liquidados": None,
+    "total_abonado": 0,
+    "fecha_ultimo_abono": None,
+}
+
+
+def estado_cuenta(fila, tipo: str, as_of: date = None) -> dict:
+    """Saldo vigente del empeño leído de la fila (sin recorrer los abonos)"""
+    _, columna_valor, columna_fecha, _ = EMPENOS[tipo]
+    cuenta = calcular_interes(
+        fila[columna_valor],
+        fila["interes_porcentaje"],
+        fila[columna_fecha],
+        tipo,
+        as_of,
+        fila["saldo_capital"],
+        fila["saldo_interes"],
+        fila["meses_liquidados"],
+    )
+    capital = fila["saldo_capital"] if fila["saldo_capital"] is not None else fila[columna_valor]
+    cuenta["saldo_capital"] = float(capital or 0)
+    cuenta["total_abonado"] = float(fila["total_abonado"] or 0)
+    cuenta["fecha_ultimo_abono"] = fila["fecha_ultimo_abono"]
+    return cuenta
+
+
+async def registrar_abono(fila, tipo: str, monto: float, valores_recuperado: dict,
+                          versiones: list = None) -> dict:
+    """
+    Registra el abono y actualiza el saldo del empeño en una sola transacción.
+    Si el abono cubre el valor actual se aplican además valores_recuperado
+    (cambio de estado del bien). versiones son las de If-Match, si se envió.
+    """
+    tabla, _, _, columna_abono = EMPENOS[tipo]
+    cuenta = estado_cuenta(fila, tipo)
+    valor_actual = cuenta["valor_actual"]
+
+    interes_pagado = round(min(monto, cuenta["interes_acumulado"]), 2)
+    capital_pagado = round(min(monto - interes_pagado, cuenta["saldo_capital"]), 2)
+    aplicado = round(interes_pagado + capital_pagado, 2)
+    saldo = round(valor_actual - aplicado, 2)
+    recuperado = monto >= valor_actual
+
+    valores = {
+        "saldo_capital": round(cuenta["saldo_capital"] - capital_pagado, 2),
+        "saldo_interes": round(cuenta["interes_acumulado"] - interes_pagado, 2),
+        "meses_liquidados": cuenta["meses_transcurridos"],
+        "total_abonado": tabla.c.total_abonado + aplicado,
+        "fecha_ultimo_abono": date.today(),
+        "version": tabla.c.version + 1,
+    }
+    if recuperado:
+        valores.update(valores_recuperado)
+
+    async with database.transaction():
+        # La versión leída sirve de control: si entró otro abono o una edición
+        # mientras tanto, este no se aplica sobre un saldo viejo
+        actualizadas = await execute_rowcount(
+            tabla.update().where(
+                (tabla.c.id == fila["id"]) &
+                (tabla.c.version == fila["version"])
+            ).values(**valores)
+        )
+        if actualizadas == 0:
+            if versiones is not None:
+                raise HTTPException(status_code=412, detail=MENSAJE_CONFLICTO)
+            raise HTTPException(
+                status_code=409,
+                detail="El empeño cambió mientras se registraba el abono. Intenta de nuevo."
+            )
+        abono_id = await database.execute(abonos.insert().values(
+            monto=aplicado,
+            interes_pagado=interes_pagado,
+            capital_pagado=capital_pagado,
+            saldo_resultante=saldo,
+            **{columna_abono: fila["id"]}
+        ))
+
+    return {
+        "abono_id": abono_id,
+        "valor_actual": valor_actual,
+        "monto_abono": monto,
+        "interes_pagado": interes_pagado,
+        "capital_pagado": capital_pagado,
+        "saldo_pendiente": saldo,
+        "cambio": round(max(0, monto - valor_actual), 2),
+        "recuperado": recuperado,
+        "meses_transcurridos": cuenta["meses_transcurridos"],
+        "interes_acumulado": cuenta["interes_acumulado"],
+    }
+
+
+async def listar_abonos(tipo: str, empeno_id: int) -> list:
+    columna = abonos.c[EMPENOS[tipo][3]]
+    query = abonos.select().where(columna == empeno_id).order_by(abonos.c.id)
+    return [dict(row) for row in await database.fetch_all(query)]
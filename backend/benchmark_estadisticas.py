@@ -0,0 +1,113 @@
+"""
+Benchmark de GET /transacciones/estadisticas con muchas transacciones.
+
+Crea una base SQLite temporal, la llena en dos etapas (N/10 y N filas) y en
+cada una mide tiempo y pico de memoria de Python (tracemalloc) de:
+
+  - filas en Python: leer todas las transacciones y sumarlas en un bucle
+    (como se calculaba antes)
+  - GROUP BY: SUM/COUNT agrupado por tipo sobre la tabla transacciones
+  - endpoint: obtener_estadisticas_transacciones, que lee el resumen diario
+
+    python benchmark_estadisticas.py            # 1.000.000 transacciones
+    python benchmark_estadisticas.py 200000
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+TMP = tempfile.mkdtemp(prefix="jerosmotos_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP, 'bench.db')}"
+
+import asyncio
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from database import database, engine, metadata
+from models import transacciones, TipoTransaccionEnum
+from rollup_transacciones import reconstruir
+from routers.transacciones import obtener_estadisticas_transacciones
+
+TIPOS = [tipo.value for tipo in TipoTransaccionEnum]
+LOTE = 50_000
+ADMIN = {"id": 1, "rol": "administrador"}
+
+
+def sembrar(desde: int, hasta: int):
+    """Inserta las transacciones desde..hasta-1 repartidas en ~3 años, 5 sedes y 20 usuarios"""
+    random.seed(desde)
+    inicio = datetime.now() - timedelta(days=3 * 365)
+    with engine.begin() as conn:
+        for lote in range(desde, hasta, LOTE):
+            filas = []
+            for _ in range(lote, min(lote + LOTE, hasta)):
+                precio = random.randint(100, 20_000) * 1000
+                filas.append({
+                    "tipo": random.choice(TIPOS),
+                    "usuario_id": random.randint(1, 20),
+                    "sede_id": random.randint(1, 5),
+                    "precio_venta": precio,
+                    "precio_compra": precio * 0.8,
+                    "ganancia": precio * 0.2,
+                    "fecha_transaccion": inicio + timedelta(seconds=random.randint(0, 3 * 365 * 86400)),
+                })
+            conn.execute(transacciones.insert(), filas)
+        reconstruir(conn)
+
+
+async def filas_en_python():
+    total_ventas = total_ganancias = 0
+    por_tipo = {}
+    for row in await database.fetch_all(transacciones.select()):
+        total_ventas += float(row["precio_venta"] or 0)
+        total_ganancias += float(row["ganancia"] or 0)
+        por_tipo[row["tipo"]] = por_tipo.get(row["tipo"], 0) + 1
+    return por_tipo
+
+
+async def group_by():
+    return await database.fetch_all(select(
+        transacciones.c.tipo,
+        func.count(),
+        func.sum(transacciones.c.precio_venta),
+        func.sum(transacciones.c.ganancia),
+    ).group_by(transacciones.c.tipo))
+
+
+async def endpoint():
+    return await obtener_estadisticas_transacciones(None, None, None, ADMIN)
+
+
+async def medir(nombre: str, funcion):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    await funcion()
+    duracion = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {nombre:<18} {duracion * 1000:>10.1f} ms {pico / 1024 / 1024:>10.2f} MB")
+
+
+async def main(n: int):
+    metadata.create_all(engine)
+    await database.connect()
+    try:
+        cargadas = 0
+        for etapa in (n // 10, n):
+            sembrar(cargadas, etapa)
+            cargadas = etapa
+            print(f"{etapa} transacciones (tiempo, pico de memoria):")
+            await medir("filas en Python", filas_en_python)
+            await medir("GROUP BY", group_by)
+            await medir("endpoint", endpoint)
+    finally:
+        await database.disconnect()
+        engine.dispose()
+        shutil.rmtree(TMP, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
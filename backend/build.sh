@@ -7,4 +7,10 @@ pip install -r requirements.txt
 echo "Creando base de datos SQLite..."
 python create_sqlite_db.py
 
+echo "Migrando media en base64 al almacenamiento de archivos..."
+python migrate_media_blobs.py
+
+echo "Reconstruyendo el resumen diario de transacciones..."
+python rollup_transacciones.py
+
 echo "Build completado!"
@@ -0,0 +1,92 @@
+"""
+Índice de búsqueda de texto completo (SQLite FTS5) sobre vehículos, artículos
+de valor y clientes de transacciones. Los triggers lo mantienen sincronizado con
+las tablas; este archivo también sirve como comando para reconstruirlo:
+
+    python busqueda_fts.py
+
+Cada fila del índice usa rowid = id * 4 + código del tipo, así los triggers
+borran y reemplazan por rowid sin recorrer el índice.
+"""
+from sqlalchemy import text
+from database import engine
+
+TABLA_FTS = "busqueda_fts"
+
+# tipo -> (código en el rowid, tabla, columnas del título, columnas del detalle)
+FUENTES = {
+    "vehiculo": (0, "vehiculos", ["marca", "modelo"], ["placa", "color", "cilindraje"]),
+    "articulo": (1, "articulos_valor", ["descripcion"], ["cliente_nombre", "cliente_documento", "cliente_telefono"]),
+    "transaccion": (2, "transacciones", ["cliente_nombre"], ["cliente_documento", "cliente_telefono", "observaciones"]),
+}
+TIPOS_POR_CODIGO = {codigo: tipo for tipo, (codigo, _, _, _) in FUENTES.items()}
+
+
+def _concatenar(columnas, prefijo=""):
+    partes = " || ' ' || ".join(f"coalesce({prefijo}{columna}, '')" for columna in columnas)
+    return f"trim({partes})"
+
+
+def _valores(tipo, prefijo):
+    codigo, _, titulo, detalle = FUENTES[tipo]
+    return f"{prefijo}id * 4 + {codigo}, {_concatenar(titulo, prefijo)}, {_concatenar(detalle, prefijo)}"
+
+
+def sentencias_indice():
+    """DDL de la tabla FTS5 y de los triggers que la mantienen"""
+    sentencias = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+        "titulo, detalle, tokenize = 'unicode61 remove_diacritics 2')"
+    ]
+    for tipo, (codigo, tabla, titulo, detalle) in FUENTES.items():
+        columnas = ", ".join(titulo + detalle)
+        insertar = f"INSERT INTO {TABLA_FTS}(rowid, titulo, detalle) VALUES ({_valores(tipo, 'new.')});"
+        borrar = f"DELETE FROM {TABLA_FTS} WHERE rowid = old.id * 4 + {codigo};"
+        sentencias += [
+            f"CREATE TRIGGER IF NOT EXISTS {tabla}_fts_ai AFTER INSERT ON {tabla} BEGIN {insertar} END",
+            f"CREATE TRIGGER IF NOT EXISTS {tabla}_fts_au AFTER UPDATE OF {columnas} ON {tabla} "
+            f"BEGIN {borrar} {insertar} END",
+            f"CREATE TRIGGER IF NOT EXISTS {tabla}_fts_ad AFTER DELETE ON {tabla} BEGIN {borrar} END",
+        ]
+    return sentencias
+
+
+def reconstruir(conn):
+    """Vuelve a cargar el índice completo a partir de las tablas"""
+    conn.execute(text(f"DELETE FROM {TABLA_FTS}"))
+    for tipo, (_, tabla, _, _) in FUENTES.items():
+        conn.execute(text(
+            f"INSERT INTO {TABLA_FTS}(rowid, titulo, detalle) SELECT {_valores(tipo, '')} FROM {tabla}"
+        ))
+
+
+def crear_indice(conn):
+    """
+    Crea el índice y los triggers si no existen (solo SQLite). Si el índice es
+    nuevo se llena con los datos actuales. Devuelve False si no se pudo crear.
+    """
+    if conn.dialect.name != "sqlite":
+        return False
+    existia = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nombre"
+    ), {"nombre": TABLA_FTS}).first() is not None
+    try:
+        for sentencia in sentencias_indice():
+            conn.execute(text(sentencia))
+    except Exception as e:
+        # SQLite compilado sin FTS5: la búsqueda usará LIKE
+        print(f"No se pudo crear el índice de búsqueda FTS5: {e}")
+        return False
+    if not existia:
+        reconstruir(conn)
+    return True
+
+
+if __name__ == "__main__":
+    with engine.begin() as conn:
+        if crear_indice(conn):
+            reconstruir(conn)
+            total = conn.execute(text(f"SELECT count(*) FROM {TABLA_FTS}")).scalar()
+            print(f"Índice de búsqueda reconstruido: {total} filas.")
+        else:
+            print("La base de datos no soporta FTS5; la búsqueda usará LIKE.")
@@ -0,0 +1,125 @@
+import os
+import time
+import asyncio
+
+REFERENCE_CACHE_TTL = int(os.getenv("REFERENCE_CACHE_TTL", "300"))  # segundos
+REPORTES_CACHE_TTL = int(os.getenv("REPORTES_CACHE_TTL", "60"))  # segundos
+
+
+class ReadThroughCache:
+    """
+    Caché en memoria para tablas pequeñas que casi no cambian.
+    Si el valor no está o venció, se carga con el loader; las escrituras
+    llaman a invalidate() para que el siguiente acceso lea la base.
+    """
+
+    def __init__(self, nombre: str, ttl: int = REFERENCE_CACHE_TTL, max_entradas: int = 128):
+        self.nombre = nombre
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.hits = 0
+        self.misses = 0
+        self._valores = {}
+        self._lock = asyncio.Lock()
+
+    async def get(self, key, loader):
+        entrada = self._valores.get(key)
+        if entrada is not None and entrada[1] > time.monotonic():
+            self.hits += 1
+            return entrada[0]
+
+        async with self._lock:
+            # Otro request pudo haberlo cargado mientras se esperaba el lock
+            entrada = self._valores.get(key)
+            if entrada is not None and entrada[1] > time.monotonic():
+                self.hits += 1
+                return entrada[0]
+            self.misses += 1
+            valor = await loader()
+            ahora = time.monotonic()
+            if len(self._valores) >= self.max_entradas:
+                # Con claves por filtros, las entradas vencidas no se vuelven a pedir
+                self._valores = {k: v for k, v in self._valores.items() if v[1] > ahora}
+            self._valores[key] = (valor, ahora + self.ttl)
+            return valor
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._valores.clear()
+        else:
+            self._valores.pop(key, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "nombre": self.nombre,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0,
+            "entradas": len(self._valores),
+            "ttl": self.ttl,
+        }
+
+
+class VersionedCache:
+    """
+    Caché de respuestas ligado a una versión global. Cada escritura llama a
+    bump() y todas las entradas anteriores dejan de servirse. La versión incluye
+    el momento de arranque para que un reinicio no repita ETags ya entregados.
+    """
+
+    def __init__(self, nombre: str, max_entradas: int = 128):
+        self.nombre = nombre
+        self.max_entradas = max_entradas
+        self.hits = 0
+        self.misses = 0
+        self._inicio = int(time.time())
+        self._contador = 0
+        self._valores = {}
+
+    @property
+    def version(self) -> str:
+        return f"{self._inicio}-{self._contador}"
+
+    def bump(self):
+        """Llamar después de confirmar la escritura en la base de datos"""
+        self._contador += 1
+        self._valores.clear()
+
+    async def get(self, key, loader):
+        if key in self._valores:
+            self.hits += 1
+            return self._valores[key]
+
+        self.misses += 1
+        version = self.version
+        valor = await loader()
+        # Si hubo una escritura mientras se consultaba, no guardar el resultado
+        if version == self.version:
+            if len(self._valores) >= self.max_entradas:
+                self._valores.clear()
+            self._valores[key] = valor
+        return valor
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "nombre": self.nombre,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0,
+            "entradas": len(self._valores),
+            "version": self.version,
+        }
+
+
+sedes_cache = ReadThroughCache("sedes")
+usuarios_nombres_cache = ReadThroughCache("usuarios_nombres")
+# Versión global del inventario de vehículos (catálogo público)
+inventario_cache = VersionedCache("inventario")
+# Versión de la cartera de empeños (artículos y vehículos)
+empenos_cache = VersionedCache("empenos")
+# Agregados de /reportes/resumen por combinación de filtros; vencen solos
+reportes_cache = ReadThroughCache("reportes", ttl=REPORTES_CACHE_TTL)
+
+caches = [sedes_cache, usuarios_nombres_cache, inventario_cache, empenos_cache, reportes_cache]
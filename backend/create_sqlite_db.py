@@ -1,12 +1,37 @@
-from sqlalchemy import insert, select
+from sqlalchemy import insert, select, inspect, text
 from database import engine, metadata, database
 import models
-import asyncio
+from busqueda_fts import crear_indice
+
+def add_missing_columns():
+    """create_all no modifica tablas existentes: agrega las columnas nuevas del modelo"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            existentes = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existentes:
+                    continue
+                print(f"Agregando columna {table.name}.{column.name}...")
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.execute(text(ddl))
 
 # Ensure tables are created
 def create_tables():
     print("Creando tablas en SQLite...")
     metadata.create_all(engine)
+    add_missing_columns()
+    # create_all no agrega índices nuevos a tablas que ya existían
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    # Índice FTS5 y triggers de la búsqueda unificada
+    with engine.begin() as conn:
+        crear_indice(conn)
     print("Tablas creadas exitosamente.")
 
 async def seed_data():
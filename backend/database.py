@@ -10,3 +10,50 @@ metadata = MetaData()
 engine = create_engine(
     DATABASE_URL, connect_args={"check_same_thread": False}
 )
+
+# databases solo devuelve lastrowid; el número de filas afectadas se consulta
+# en la misma conexión justo después del UPDATE/DELETE
+ROWCOUNT_SQL = "SELECT ROW_COUNT()" if database.url.dialect == "mysql" else "SELECT changes()"
+
+async def execute_rowcount(query) -> int:
+    """Ejecuta un UPDATE o DELETE y devuelve cuántas filas modificó"""
+    async with database.connection() as connection:
+        await connection.execute(query)
+        return await connection.fetch_val(ROWCOUNT_SQL)
+
+async def insertar_filas(tabla, filas: list):
+    """
+    Inserta muchas filas con un solo executemany del driver, dentro de la
+    transacción en curso. execute_many de databases compila y ejecuta fila por
+    fila (una ida y vuelta al hilo del driver por cada una). Aplica los valores
+    por defecto escalares de las columnas que no vienen en las filas.
+    """
+    if not filas:
+        return
+    compilado = tabla.insert().compile(dialect=engine.dialect, column_keys=list(filas[0]))
+    nombres = list(compilado.binds)
+    procesadores = {nombre: tabla.c[nombre].type.bind_processor(engine.dialect) for nombre in nombres}
+    por_defecto = {
+        nombre: tabla.c[nombre].default.arg
+        for nombre in nombres
+        if tabla.c[nombre].default is not None and tabla.c[nombre].default.is_scalar
+    }
+
+    def procesar(fila):
+        valores = {}
+        for nombre in nombres:
+            valor = fila[nombre] if nombre in fila else por_defecto.get(nombre)
+            procesador = procesadores[nombre]
+            valores[nombre] = procesador(valor) if procesador else valor
+        if compilado.positiontup:
+            return tuple(valores[nombre] for nombre in compilado.positiontup)
+        return valores
+
+    parametros = [procesar(fila) for fila in filas]
+    async with database.connection() as connection:
+        raw = connection.raw_connection
+        if hasattr(raw, "executemany"):  # aiosqlite
+            await raw.executemany(str(compilado), parametros)
+        else:  # aiomysql / asyncmy
+            async with raw.cursor() as cursor:
+                await cursor.executemany(str(compilado), parametros)
@@ -0,0 +1,87 @@
+"""
+Exportación de listados en CSV o NDJSON (un objeto JSON por línea).
+
+Las filas se leen de la base con database.iterate (cursor del lado del
+servidor) y se envían por bloques con StreamingResponse, así que exportar un
+año completo usa memoria constante, sin armar la lista entera.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import AsyncIterator, List
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# Filas por bloque enviado al cliente (y por lote al calcular intereses)
+LOTE = 500
+
+
+def validar_formato(formato: str) -> str:
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado. Opciones: {', '.join(FORMATOS)}")
+    return formato
+
+
+def _valor(valor):
+    if isinstance(valor, Enum):
+        return valor.value
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+async def en_lotes(filas: AsyncIterator, tamano: int = LOTE) -> AsyncIterator[list]:
+    """Agrupa un iterador asíncrono de filas en listas de hasta tamano filas"""
+    lote = []
+    async for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+async def _csv(filas: AsyncIterator[dict], columnas: List[str]):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    # BOM para que Excel abra el archivo como UTF-8 (tildes y ñ)
+    buffer.write("\ufeff")
+    escritor.writerow(columnas)
+    async for lote in en_lotes(filas):
+        for fila in lote:
+            escritor.writerow(["" if fila.get(c) is None else _valor(fila.get(c)) for c in columnas])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def _ndjson(filas: AsyncIterator[dict], columnas: List[str]):
+    async for lote in en_lotes(filas):
+        yield "".join(
+            json.dumps({c: _valor(fila.get(c)) for c in columnas}, ensure_ascii=False) + "\n"
+            for fila in lote
+        )
+
+
+def respuesta_exportacion(filas: AsyncIterator[dict], columnas: List[str], formato: str,
+                          nombre: str) -> StreamingResponse:
+    """StreamingResponse con las filas en el formato pedido, como archivo descargable"""
+    generador = _csv if formato == "csv" else _ndjson
+    archivo = f"{nombre}_{date.today().isoformat()}.{formato}"
+    return StreamingResponse(
+        generador(filas, columnas),
+        media_type=FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{archivo}"'},
+    )
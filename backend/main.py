@@ -1,7 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from database import database
-from routers import usuarios, sedes, vehiculos, mantenimientos, articulos_valor, transacciones
+from media_variants import shutdown_pool
+from routers.usuarios import password_executor, load_token_versions
+from routers import usuarios, sedes, vehiculos, mantenimientos, articulos_valor, transacciones, busqueda, empenos, reportes
 
 app = FastAPI(title="Jeros'Motos API")
 
@@ -16,7 +18,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
     allow_headers=["*"],
-    expose_headers=["*"],
+    # Con credenciales el navegador no acepta "*": se listan los encabezados que lee el frontend
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag"],
 )
 
 # Endpoint de ping para keep-alive (Render)
@@ -37,11 +40,17 @@ app.include_router(vehiculos.router, prefix="/vehiculos", tags=["vehiculos"])
 app.include_router(mantenimientos.router, prefix="/mantenimientos", tags=["mantenimientos"])
 app.include_router(articulos_valor.router, prefix="/articulos_valor", tags=["articulos_valor"])
 app.include_router(transacciones.router, prefix="/transacciones", tags=["transacciones"])
+app.include_router(busqueda.router, prefix="/buscar", tags=["busqueda"])
+app.include_router(empenos.router, prefix="/empenos", tags=["empenos"])
+app.include_router(reportes.router, prefix="/reportes", tags=["reportes"])
 
 @app.on_event("startup")
 async def startup():
     await database.connect()
+    await load_token_versions()
 
 @app.on_event("shutdown")
 async def shutdown():
     await database.disconnect()
+    shutdown_pool()
+    password_executor.shutdown(wait=False)
@@ -0,0 +1,357 @@
+import os
+import base64
+import asyncio
+import hashlib
+import tempfile
+from contextlib import closing
+from typing import Optional
+from urllib.parse import urlencode
+from fastapi import Request, Response, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func
+from database import database
+from models import vehiculos_media, articulos_imagenes, media_variantes
+
+MEDIA_STORAGE = os.getenv("MEDIA_STORAGE", "local")
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", "./media")
+
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_PREFIX = os.getenv("S3_PREFIX", "media/")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # Ej: http://localhost:9000 para MinIO
+S3_REGION = os.getenv("S3_REGION")
+
+CHUNK_SIZE = 256 * 1024
+
+# Límites de subida por tipo de archivo (en MB)
+MAX_UPLOAD_MB = {
+    "imagen": int(os.getenv("MAX_IMAGEN_MB", "15")),
+    "video": int(os.getenv("MAX_VIDEO_MB", "200")),
+}
+# Subidas procesadas a la vez; la memoria usada queda acotada a ~MAX_UPLOADS_CONCURRENTES * CHUNK_SIZE
+MAX_UPLOADS_CONCURRENTES = int(os.getenv("MAX_UPLOADS_CONCURRENTES", "2"))
+# El contenido de un blob nunca cambia (su ruta es su hash), pero las URL /raw van por id y los
+# id se reutilizan: solo se cachea indefinidamente si la URL lleva el hash (?v=<sha256>)
+CACHE_CONTROL_INMUTABLE = "public, max-age=31536000, immutable"
+# Sin ?v= el navegador guarda la copia pero la revalida con el ETag (responde 304 si no cambió)
+CACHE_CONTROL_REVALIDAR = "public, no-cache"
+
+
+def url_versionada(url: str, sha256: Optional[str], **params) -> str:
+    """Agrega ?v=<sha256> (y otros parámetros) a la URL de un archivo para poder cachearla como inmutable"""
+    params = {clave: valor for clave, valor in params.items() if valor is not None}
+    if sha256:
+        params["v"] = sha256
+    return f"{url}?{urlencode(params)}" if params else url
+
+
+def cache_control(request: Request, sha256: str) -> str:
+    """Inmutable solo si la URL pedida lleva el hash del contenido que se está sirviendo"""
+    return CACHE_CONTROL_INMUTABLE if request.query_params.get("v") == sha256 else CACHE_CONTROL_REVALIDAR
+
+
+def blob_key(sha256: str) -> str:
+    """Ruta relativa de un blob a partir de su hash (ab/cd/abcd...)"""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+class LocalMediaStorage:
+    """
+    Almacena los archivos en disco direccionados por su SHA-256.
+    Dos archivos con el mismo contenido comparten un único blob.
+    """
+
+    def __init__(self, root: str = MEDIA_ROOT):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put_file(self, temp_path: str, sha256: str) -> str:
+        """Mueve un archivo temporal ya hasheado a su ubicación definitiva"""
+        key = blob_key(sha256)
+        destino = self._path(key)
+        if os.path.exists(destino):
+            # Deduplicación: el contenido ya está almacenado
+            os.remove(temp_path)
+            return key
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(temp_path, destino)
+        return key
+
+    def open(self, key: str, start: int = 0):
+        f = open(self._path(key), "rb")
+        if start:
+            f.seek(start)
+        return f
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self._path(key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3MediaStorage:
+    """
+    Almacena los archivos en un bucket compatible con S3 (AWS, MinIO, etc.).
+    Con S3_ENDPOINT_URL se puede apuntar a un servidor local para pruebas.
+    """
+
+    def __init__(self, bucket: str = S3_BUCKET, prefix: str = S3_PREFIX,
+                 endpoint_url: str = S3_ENDPOINT_URL, region: str = S3_REGION):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("MEDIA_STORAGE=s3 requiere instalar boto3")
+        if not bucket:
+            raise RuntimeError("MEDIA_STORAGE=s3 requiere la variable S3_BUCKET")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except ClientError:
+            return False
+
+    def put_file(self, temp_path: str, sha256: str) -> str:
+        key = blob_key(sha256)
+        try:
+            if not self.exists(key):
+                self.client.upload_file(temp_path, self.bucket, self._object_key(key))
+        finally:
+            os.remove(temp_path)
+        return key
+
+    def open(self, key: str, start: int = 0):
+        params = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        if start:
+            params["Range"] = f"bytes={start}-"
+        response = self.client.get_object(**params)
+        return response["Body"]
+
+    def size(self, key: str) -> int:
+        response = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        return response["ContentLength"]
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+
+def _create_storage():
+    if MEDIA_STORAGE == "s3":
+        return S3MediaStorage()
+    return LocalMediaStorage()
+
+
+storage = _create_storage()
+
+
+def _temp_dir() -> str:
+    # Los temporales se crean junto al almacenamiento local para que os.replace no copie entre discos
+    if isinstance(storage, LocalMediaStorage):
+        tmp = os.path.join(storage.root, ".tmp")
+        os.makedirs(tmp, exist_ok=True)
+        return tmp
+    return tempfile.gettempdir()
+
+
+def save_bytes(data: bytes) -> dict:
+    """Guarda un contenido en el almacenamiento y devuelve su hash, ruta y tamaño"""
+    sha256 = hashlib.sha256(data).hexdigest()
+    fd, temp_path = tempfile.mkstemp(dir=_temp_dir())
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    ruta = storage.put_file(temp_path, sha256)
+    return {"sha256": sha256, "ruta": ruta, "tamano": len(data)}
+
+
+_upload_semaphore = asyncio.Semaphore(MAX_UPLOADS_CONCURRENTES)
+
+
+async def save_upload(archivo: UploadFile, tipo: str) -> dict:
+    """
+    Copia una subida al almacenamiento por bloques, calculando el hash a medida
+    que se lee. Nunca se tiene el archivo completo en memoria y se rechaza con
+    413 en cuanto supera el límite de su tipo.
+    """
+    limite = MAX_UPLOAD_MB[tipo] * 1024 * 1024
+    async with _upload_semaphore:
+        hasher = hashlib.sha256()
+        tamano = 0
+        fd, temp_path = tempfile.mkstemp(dir=_temp_dir())
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = await archivo.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    tamano += len(chunk)
+                    if tamano > limite:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"El archivo supera el tamaño máximo permitido para {tipo} ({MAX_UPLOAD_MB[tipo]} MB)"
+                        )
+                    hasher.update(chunk)
+                    await run_in_threadpool(f.write, chunk)
+            sha256 = hasher.hexdigest()
+            ruta = await run_in_threadpool(storage.put_file, temp_path, sha256)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return {"sha256": sha256, "ruta": ruta, "tamano": tamano}
+
+
+def read_bytes(ruta: str) -> bytes:
+    with closing(storage.open(ruta)) as f:
+        return f.read()
+
+
+def iter_blob(ruta: str, start: int = 0, length: int = None):
+    """Lee el blob (o un rango) por bloques para enviarlo sin cargarlo completo en memoria"""
+    with closing(storage.open(ruta, start)) as f:
+        restante = length
+        while restante is None or restante > 0:
+            chunk = f.read(CHUNK_SIZE if restante is None else min(CHUNK_SIZE, restante))
+            if not chunk:
+                break
+            if restante is not None:
+                restante -= len(chunk)
+            yield chunk
+
+
+def parse_range(range_header: str, tamano: int):
+    """
+    Interpreta un encabezado Range de un solo rango (bytes=inicio-fin, bytes=inicio-
+    o bytes=-sufijo). Devuelve (inicio, fin) inclusivo, None si el encabezado se
+    debe ignorar, o lanza ValueError si el rango no se puede satisfacer.
+    """
+    unidad, _, rangos = range_header.partition("=")
+    if unidad.strip().lower() != "bytes" or "," in rangos:
+        # Varios rangos no se soportan: se responde el archivo completo
+        return None
+    inicio, guion, fin = rangos.strip().partition("-")
+    if not guion or (inicio and not inicio.isdigit()) or (fin and not fin.isdigit()):
+        return None
+    if not inicio:
+        if not fin:
+            return None
+        sufijo = int(fin)
+        if sufijo == 0 or tamano == 0:
+            raise ValueError("Rango vacío")
+        return max(0, tamano - sufijo), tamano - 1
+    inicio = int(inicio)
+    if fin and int(fin) < inicio:
+        return None
+    if inicio >= tamano:
+        raise ValueError("Rango fuera del archivo")
+    fin = int(fin) if fin else tamano - 1
+    return inicio, min(fin, tamano - 1)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Evalúa el encabezado If-None-Match contra un ETag fuerte"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidatos = [valor.strip() for valor in if_none_match.split(",")]
+    return "*" in candidatos or etag in candidatos or f"W/{etag}" in candidatos
+
+
+def blob_response(request: Request, sha256: str, ruta: str, mime: str, tamano: int = None,
+                  vary: str = None, version: str = None, inmutable: bool = True) -> Response:
+    """
+    Respuesta binaria de un blob con ETag y soporte de GET condicional.
+    version es el hash que debe traer ?v= para marcarla inmutable (por defecto el
+    del propio blob; las variantes usan el del original, que es el que va en la URL).
+    Con inmutable=False siempre se revalida (el original servido en lugar de una
+    variante que todavía no existe).
+    """
+    etag = f'"{sha256}"'
+    control = cache_control(request, version or sha256) if inmutable else CACHE_CONTROL_REVALIDAR
+    headers = {"ETag": etag, "Cache-Control": control}
+    if vary:
+        headers["Vary"] = vary
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if tamano is None:
+        tamano = storage.size(ruta)
+    headers["Accept-Ranges"] = "bytes"
+    
+    # Range / If-Range: permite al reproductor de video empezar rápido y adelantar
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            rango = parse_range(range_header, tamano)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{tamano}"
+            return Response(status_code=416, headers=headers)
+        if rango is not None:
+            inicio, fin = rango
+            headers["Content-Range"] = f"bytes {inicio}-{fin}/{tamano}"
+            headers["Content-Length"] = str(fin - inicio + 1)
+            return StreamingResponse(
+                iter_blob(ruta, inicio, fin - inicio + 1),
+                status_code=206,
+                media_type=mime,
+                headers=headers
+            )
+    
+    headers["Content-Length"] = str(tamano)
+    return StreamingResponse(iter_blob(ruta), media_type=mime, headers=headers)
+
+
+def legacy_response(request: Request, data_base64: str, mime: str) -> Response:
+    """Respuesta para filas antiguas que aún guardan el archivo en base64 (sin migrar)"""
+    contenido = base64.b64decode(data_base64)
+    sha256 = hashlib.sha256(contenido).hexdigest()
+    etag = f'"{sha256}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control(request, sha256)}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=contenido, media_type=mime, headers=headers)
+
+
+def delete_blob(ruta: str):
+    storage.delete(ruta)
+
+
+async def blob_en_uso(ruta: str) -> bool:
+    """Indica si algún archivo original o variante sigue referenciando el blob"""
+    for tabla in (vehiculos_media, articulos_imagenes, media_variantes):
+        query = select(func.count()).select_from(tabla).where(tabla.c.ruta == ruta)
+        if await database.fetch_val(query):
+            return True
+    return False
+
+
+async def release_blob(ruta: str):
+    """Elimina el blob (y sus variantes) solo si ningún registro de media lo sigue referenciando"""
+    from media_variants import eliminar_variantes
+
+    if not ruta:
+        return
+    for tabla in (vehiculos_media, articulos_imagenes):
+        query = select(func.count()).select_from(tabla).where(tabla.c.ruta == ruta)
+        if await database.fetch_val(query):
+            return
+    # El original ya no se usa: sus variantes tampoco
+    await eliminar_variantes(ruta.rsplit("/", 1)[-1])
+    if not await blob_en_uso(ruta):
+        await run_in_threadpool(delete_blob, ruta)
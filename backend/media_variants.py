@@ -0,0 +1,187 @@
+import os
+import io
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from database import database
+from models import media_variantes
+from media_storage import save_bytes, read_bytes, delete_blob, blob_en_uso
+
+# Lado mayor (en píxeles) de cada variante; nunca se amplía una imagen más pequeña
+VARIANTES = {
+    "thumb": 240,
+    "card": 640,
+    "detail": 1280,
+}
+FORMATOS = {
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+CALIDAD = 82
+
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "2"))
+# Segundos antes de reintentar un archivo cuyas variantes no se pudieron generar
+MEDIA_REINTENTO_VARIANTES = int(os.getenv("MEDIA_REINTENTO_VARIANTES", "3600"))
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+# sha256 -> [lock, coroutines que lo usan o esperan]
+_locks = {}
+# sha256 -> instante (time.monotonic) a partir del cual se puede reintentar
+_fallidas = {}
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=MEDIA_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def generar_derivados(contenido: bytes) -> dict:
+    """
+    Genera todas las variantes de una imagen. Se ejecuta en un proceso aparte
+    para que Pillow no bloquee el event loop. Al re-codificar sin pasar exif
+    los metadatos EXIF (GPS, cámara, etc.) se descartan.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(contenido)) as original:
+        # Aplicar la orientación EXIF antes de descartar los metadatos
+        imagen = ImageOps.exif_transpose(original)
+        if imagen.mode not in ("RGB", "RGBA"):
+            imagen = imagen.convert("RGBA" if "transparency" in imagen.info else "RGB")
+
+        derivados = {}
+        for variante, lado in VARIANTES.items():
+            redimensionada = imagen.copy()
+            redimensionada.thumbnail((lado, lado), Image.LANCZOS)
+
+            salida = io.BytesIO()
+            redimensionada.save(salida, format="WEBP", quality=CALIDAD, method=4)
+            derivados[(variante, "webp")] = salida.getvalue()
+
+            if redimensionada.mode == "RGBA":
+                # JPEG no soporta transparencia: se compone sobre fondo blanco
+                fondo = Image.new("RGB", redimensionada.size, (255, 255, 255))
+                fondo.paste(redimensionada, mask=redimensionada.getchannel("A"))
+                redimensionada = fondo
+            salida = io.BytesIO()
+            redimensionada.save(salida, format="JPEG", quality=CALIDAD, optimize=True, progressive=True)
+            derivados[(variante, "jpeg")] = salida.getvalue()
+
+    return derivados
+
+
+@asynccontextmanager
+async def _bloqueo(sha256: str):
+    """
+    Lock por archivo original. Se descarta cuando nadie más lo espera, así
+    quien llegue después no crea un lock nuevo mientras otro sigue generando.
+    """
+    entrada = _locks.setdefault(sha256, [asyncio.Lock(), 0])
+    entrada[1] += 1
+    try:
+        async with entrada[0]:
+            yield
+    finally:
+        entrada[1] -= 1
+        if entrada[1] == 0:
+            _locks.pop(sha256, None)
+
+
+def fallo_reciente(sha256: str) -> bool:
+    """True si la última generación de variantes falló hace menos de MEDIA_REINTENTO_VARIANTES"""
+    reintento = _fallidas.get(sha256)
+    if reintento is None:
+        return False
+    if time.monotonic() >= reintento:
+        _fallidas.pop(sha256, None)
+        return False
+    return True
+
+
+async def crear_variantes(sha256: str, ruta: str):
+    """Genera y guarda las variantes que falten para un archivo original"""
+    async with _bloqueo(sha256):
+        query = media_variantes.select().where(media_variantes.c.sha256_origen == sha256)
+        existentes = {(row.variante, row.formato) for row in await database.fetch_all(query)}
+        if len(existentes) == len(VARIANTES) * len(FORMATOS):
+            return
+
+        contenido = await run_in_threadpool(read_bytes, ruta)
+        loop = asyncio.get_running_loop()
+        derivados = await loop.run_in_executor(_get_pool(), generar_derivados, contenido)
+
+        for (variante, formato), data in derivados.items():
+            if (variante, formato) in existentes:
+                continue
+            blob = await run_in_threadpool(save_bytes, data)
+            await database.execute(media_variantes.insert().values(
+                sha256_origen=sha256,
+                variante=variante,
+                formato=formato,
+                sha256=blob["sha256"],
+                ruta=blob["ruta"],
+                tamano=blob["tamano"],
+                mime=FORMATOS[formato]
+            ))
+
+
+async def crear_variantes_seguro(sha256: str, ruta: str):
+    """
+    Como crear_variantes, pero un error no interrumpe la subida: se registra y
+    el archivo no se reintenta hasta pasados MEDIA_REINTENTO_VARIANTES segundos.
+    """
+    try:
+        await crear_variantes(sha256, ruta)
+        _fallidas.pop(sha256, None)
+    except Exception:
+        logger.exception("No se pudieron generar las variantes de %s", sha256)
+        _fallidas[sha256] = time.monotonic() + MEDIA_REINTENTO_VARIANTES
+
+
+async def obtener_variante(sha256: str, ruta: str, variante: str, formato: str,
+                           background_tasks: BackgroundTasks):
+    """
+    Devuelve la fila de la variante solicitada, o None si todavía no existe o no
+    se pudo generar (imagen ilegible); en ese caso se sirve el original. Si falta
+    y no hay otra generación en curso ni un fallo reciente, se agenda en segundo plano.
+    """
+    query = media_variantes.select().where(
+        (media_variantes.c.sha256_origen == sha256) &
+        (media_variantes.c.variante == variante) &
+        (media_variantes.c.formato == formato)
+    )
+    row = await database.fetch_one(query)
+    if row is None and sha256 not in _locks and not fallo_reciente(sha256):
+        background_tasks.add_task(crear_variantes_seguro, sha256, ruta)
+    return row
+
+
+async def eliminar_variantes(sha256: str):
+    query = media_variantes.select().where(media_variantes.c.sha256_origen == sha256)
+    filas = await database.fetch_all(query)
+    if not filas:
+        return
+    await database.execute(media_variantes.delete().where(media_variantes.c.sha256_origen == sha256))
+    for row in filas:
+        if not await blob_en_uso(row.ruta):
+            await run_in_threadpool(delete_blob, row.ruta)
+
+
+def formato_preferido(accept: str) -> str:
+    """WebP si el navegador lo acepta, JPEG como respaldo"""
+    return "webp" if accept and "image/webp" in accept else "jpeg"
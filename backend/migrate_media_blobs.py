@@ -0,0 +1,79 @@
+"""
+Migración única: mueve los archivos guardados en base64 dentro de
+vehiculos_media.archivo_data y articulos_imagenes.imagen_data al
+almacenamiento de media (ver media_storage.py).
+
+Es idempotente: solo procesa filas que todavía no tienen ruta.
+Uso: python migrate_media_blobs.py
+"""
+import base64
+import mimetypes
+from sqlalchemy import inspect, text, select, update
+from database import engine
+from models import vehiculos_media, articulos_imagenes
+from media_storage import save_bytes
+
+NUEVAS_COLUMNAS = {
+    "sha256": "VARCHAR(64)",
+    "ruta": "VARCHAR(255)",
+    "tamano": "INTEGER",
+    "mime": "VARCHAR(100)",
+}
+
+
+def agregar_columnas(conn, tabla):
+    """Agrega las columnas de metadatos a bases creadas antes del cambio"""
+    existentes = {col["name"] for col in inspect(conn).get_columns(tabla.name)}
+    for nombre, tipo in NUEVAS_COLUMNAS.items():
+        if nombre not in existentes:
+            print(f"Agregando columna {tabla.name}.{nombre}...")
+            conn.execute(text(f"ALTER TABLE {tabla.name} ADD COLUMN {nombre} {tipo}"))
+    conn.commit()
+
+
+def adivinar_mime(nombre_archivo, por_defecto):
+    mime, _ = mimetypes.guess_type(nombre_archivo or "")
+    return mime or por_defecto
+
+
+def migrar_tabla(conn, tabla, columna_data, columna_nombre):
+    query = select(tabla.c.id).where(tabla.c[columna_data].isnot(None) & tabla.c.ruta.is_(None))
+    ids = [row.id for row in conn.execute(query)]
+    print(f"{tabla.name}: {len(ids)} archivos por migrar")
+
+    for row_id in ids:
+        # Se lee una fila a la vez para no cargar todos los base64 en memoria
+        row = conn.execute(select(tabla).where(tabla.c.id == row_id)).mappings().first()
+        try:
+            contenido = base64.b64decode(row[columna_data])
+        except Exception as e:
+            print(f"  Fila {row_id}: base64 inválido, se omite ({e})")
+            continue
+
+        blob = save_bytes(contenido)
+        mime_por_defecto = "video/mp4" if row.get("tipo") == "video" else "image/jpeg"
+        conn.execute(
+            update(tabla).where(tabla.c.id == row_id).values(
+                sha256=blob["sha256"],
+                ruta=blob["ruta"],
+                tamano=blob["tamano"],
+                mime=adivinar_mime(row[columna_nombre], mime_por_defecto),
+                **{columna_data: None}
+            )
+        )
+        conn.commit()
+
+
+if __name__ == "__main__":
+    with engine.connect() as conn:
+        agregar_columnas(conn, vehiculos_media)
+        agregar_columnas(conn, articulos_imagenes)
+        migrar_tabla(conn, vehiculos_media, "archivo_data", "archivo")
+        migrar_tabla(conn, articulos_imagenes, "imagen_data", "imagen")
+
+    if engine.dialect.name == "sqlite":
+        # Recuperar el espacio que ocupaban los base64
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+
+    print("Migración de media completada.")
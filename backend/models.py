@@ -1,4 +1,4 @@
-from sqlalchemy import Table, Column, Integer, String, Enum, Date, DECIMAL, ForeignKey, TIMESTAMP, Text
+from sqlalchemy import Table, Column, Integer, String, Enum, Date, DECIMAL, ForeignKey, TIMESTAMP, Text, UniqueConstraint, Index
 from sqlalchemy.sql import func
 from database import metadata
 
@@ -35,6 +35,7 @@ usuarios = Table(
     Column("contrasena", String(255), nullable=False),
     Column("rol", Enum(RolEnum), default=RolEnum.vendedor),
     Column("fecha_creacion", TIMESTAMP, server_default=func.now()),
+    Column("token_version", Integer, nullable=False, default=0, server_default="0"),  # Se incrementa para invalidar tokens
 )
 
 sedes = Table(
@@ -70,6 +71,23 @@ vehiculos = Table(
     Column("cliente_empeno_nombre", String(100)),
     Column("cliente_empeno_telefono", String(20)),
     Column("cliente_empeno_documento", String(20)),
+    # Saldo del empeño en el último abono (vacío si no hay abonos): capital e interés
+    # pendientes, meses de interés ya liquidados y total abonado
+    Column("saldo_capital", DECIMAL(15, 2), nullable=True),
+    Column("saldo_interes", DECIMAL(15, 2), nullable=True),
+    Column("meses_liquidados", Integer, nullable=True),
+    Column("total_abonado", DECIMAL(15, 2), nullable=False, server_default="0"),
+    Column("fecha_ultimo_abono", Date, nullable=True),
+    # Sube en cada escritura; es el ETag del registro (If-Match en las actualizaciones)
+    Column("version", Integer, nullable=False, server_default="1"),
+    Index("ix_vehiculos_destacado", "destacado"),
+    # Combinaciones de filtros más usadas en el listado y el catálogo
+    Index("ix_vehiculos_estado_sede", "estado", "sede_id"),
+    Index("ix_vehiculos_estado_precio", "estado", "precio_venta"),
+    Index("ix_vehiculos_marca_modelo", "marca", "modelo"),
+    Index("ix_vehiculos_catalogo", "visible_catalogo", "estado"),
+    Index("ix_vehiculos_soat", "soat_vencimiento"),
+    Index("ix_vehiculos_tecno", "tecno_vencimiento"),
 )
 
 mantenimientos = Table(
@@ -97,6 +115,15 @@ articulos_valor = Table(
     Column("cliente_nombre", String(100)),
     Column("cliente_telefono", String(20)),
     Column("cliente_documento", String(20)),
+    # Saldo del empeño en el último abono (vacío si no hay abonos): capital e interés
+    # pendientes, meses de interés ya liquidados y total abonado
+    Column("saldo_capital", DECIMAL(15, 2), nullable=True),
+    Column("saldo_interes", DECIMAL(15, 2), nullable=True),
+    Column("meses_liquidados", Integer, nullable=True),
+    Column("total_abonado", DECIMAL(15, 2), nullable=False, server_default="0"),
+    Column("fecha_ultimo_abono", Date, nullable=True),
+    # Sube en cada escritura; es el ETag del registro (If-Match en las actualizaciones)
+    Column("version", Integer, nullable=False, server_default="1"),
 )
 
 vehiculos_media = Table(
@@ -105,7 +132,11 @@ vehiculos_media = Table(
     Column("id", Integer, primary_key=True, autoincrement=True),
     Column("vehiculo_id", Integer, ForeignKey("vehiculos.id")),
     Column("archivo", String(255), nullable=False),  # Ruta o nombre del archivo (imagen o video)
-    Column("archivo_data", Text, nullable=True),  # Para almacenar archivo en base64 si se desea
+    Column("archivo_data", Text, nullable=True),  # Legado: base64, se vacía con migrate_media_blobs.py
+    Column("sha256", String(64), nullable=True, index=True),  # Hash del contenido (clave en el almacenamiento)
+    Column("ruta", String(255), nullable=True),  # Ruta del blob dentro del almacenamiento de media
+    Column("tamano", Integer, nullable=True),  # Tamaño en bytes
+    Column("mime", String(100), nullable=True),  # Content-Type original
     Column("tipo", String(20), nullable=False),  # 'imagen' o 'video'
     Column("es_principal", Integer, default=0),  # 1 para principal, 0 para secundaria
     Column("titulo", String(100), nullable=True),  # Título descriptivo (especialmente útil para videos)
@@ -118,10 +149,28 @@ articulos_imagenes = Table(
     Column("id", Integer, primary_key=True, autoincrement=True),
     Column("articulo_id", Integer, ForeignKey("articulos_valor.id")),
     Column("imagen", String(255), nullable=False),  # Ruta o nombre del archivo de imagen
-    Column("imagen_data", String, nullable=True),  # Para almacenar imagen en base64 o similar si se desea
+    Column("imagen_data", String, nullable=True),  # Legado: base64, se vacía con migrate_media_blobs.py
+    Column("sha256", String(64), nullable=True, index=True),  # Hash del contenido (clave en el almacenamiento)
+    Column("ruta", String(255), nullable=True),  # Ruta del blob dentro del almacenamiento de media
+    Column("tamano", Integer, nullable=True),  # Tamaño en bytes
+    Column("mime", String(100), nullable=True),  # Content-Type original
     Column("es_principal", Integer, default=0),  # 1 para principal, 0 para secundaria
 )
 
+media_variantes = Table(
+    "media_variantes",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("sha256_origen", String(64), nullable=False, index=True),  # Hash del archivo original
+    Column("variante", String(20), nullable=False),  # 'thumb', 'card' o 'detail'
+    Column("formato", String(10), nullable=False),  # 'webp' o 'jpeg'
+    Column("sha256", String(64), nullable=False),
+    Column("ruta", String(255), nullable=False),
+    Column("tamano", Integer, nullable=False),
+    Column("mime", String(100), nullable=False),
+    UniqueConstraint("sha256_origen", "variante", "formato"),
+)
+
 transacciones = Table(
     "transacciones",
     metadata,
@@ -139,4 +188,36 @@ transacciones = Table(
     Column("cliente_documento", String(20), nullable=True),
     Column("observaciones", Text, nullable=True),
     Column("fecha_transaccion", TIMESTAMP, server_default=func.now()),
+    # Respaldo de la paginación por cursor (fecha_transaccion, id)
+    Index("ix_transacciones_fecha_id", "fecha_transaccion", "id"),
+)
+
+# Resumen diario de transacciones, mantenido al crear/editar/eliminar transacciones
+transacciones_diarias = Table(
+    "transacciones_diarias",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("fecha", Date, nullable=False),
+    Column("sede_id", Integer, ForeignKey("sedes.id"), nullable=False),
+    Column("usuario_id", Integer, ForeignKey("usuarios.id"), nullable=False),
+    Column("tipo", Enum(TipoTransaccionEnum), nullable=False),
+    Column("cantidad", Integer, nullable=False, default=0),
+    Column("total_ventas", DECIMAL(17, 2), nullable=False, default=0),
+    Column("total_ganancias", DECIMAL(17, 2), nullable=False, default=0),
+    UniqueConstraint("fecha", "sede_id", "usuario_id", "tipo"),
+)
+
+# Abonos a empeños (artículos o vehículos). Solo se agregan filas; el saldo
+# vigente se guarda en la fila del empeño
+abonos = Table(
+    "abonos",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("articulo_id", Integer, ForeignKey("articulos_valor.id"), nullable=True, index=True),
+    Column("vehiculo_id", Integer, ForeignKey("vehiculos.id"), nullable=True, index=True),
+    Column("monto", DECIMAL(15, 2), nullable=False),
+    Column("interes_pagado", DECIMAL(15, 2), nullable=False),
+    Column("capital_pagado", DECIMAL(15, 2), nullable=False),
+    Column("saldo_resultante", DECIMAL(15, 2), nullable=False),
+    Column("fecha", TIMESTAMP, server_default=func.now()),
 )
@@ -0,0 +1,104 @@
+"""
+Mantenimiento de la tabla transacciones_diarias (resumen por fecha, sede,
+usuario y tipo). Los endpoints de transacciones la actualizan dentro de la
+misma transacción de base de datos; este archivo también sirve como comando
+para reconstruirla desde cero:
+
+    python rollup_transacciones.py
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import select, func, insert, delete
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from database import database, engine
+from models import transacciones, transacciones_diarias
+
+# INSERT con la cláusula de upsert propia de cada motor
+_insert = {
+    "mysql": mysql.insert,
+    "mariadb": mysql.insert,
+    "postgresql": postgresql.insert,
+}.get(engine.dialect.name, sqlite.insert)
+
+
+def _fecha(valor) -> date:
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return datetime.fromisoformat(str(valor)).date()
+
+
+async def aplicar_transaccion(transaccion, signo: int = 1):
+    """
+    Suma (signo=1) o resta (signo=-1) una transacción del resumen diario.
+    Debe llamarse dentro de la misma database.transaction() que modifica la fila.
+    """
+    tabla = transacciones_diarias
+    precio_venta = Decimal(str(transaccion["precio_venta"] or 0)) * signo
+    ganancia = Decimal(str(transaccion["ganancia"] or 0)) * signo
+
+    # Upsert atómico sobre la clave única (fecha, sede, usuario, tipo): con
+    # SELECT y luego UPDATE/INSERT dos transacciones del mismo día podían leer
+    # "no existe" a la vez y la segunda fallaba al insertar
+    query = _insert(tabla).values(
+        fecha=_fecha(transaccion["fecha_transaccion"]),
+        sede_id=transaccion["sede_id"],
+        usuario_id=transaccion["usuario_id"],
+        tipo=transaccion["tipo"],
+        cantidad=signo,
+        total_ventas=precio_venta,
+        total_ganancias=ganancia
+    )
+    if _insert is mysql.insert:
+        nuevos = query.inserted
+        query = query.on_duplicate_key_update(
+            cantidad=tabla.c.cantidad + nuevos.cantidad,
+            total_ventas=tabla.c.total_ventas + nuevos.total_ventas,
+            total_ganancias=tabla.c.total_ganancias + nuevos.total_ganancias
+        )
+    else:
+        nuevos = query.excluded
+        query = query.on_conflict_do_update(
+            index_elements=[tabla.c.fecha, tabla.c.sede_id, tabla.c.usuario_id, tabla.c.tipo],
+            set_={
+                "cantidad": tabla.c.cantidad + nuevos.cantidad,
+                "total_ventas": tabla.c.total_ventas + nuevos.total_ventas,
+                "total_ganancias": tabla.c.total_ganancias + nuevos.total_ganancias,
+            }
+        )
+    await database.execute(query)
+
+async def aplicar_transaccion_por_id(transaccion_id: int, signo: int = 1):
+    """Lee la transacción (con la fecha asignada por la base) y la aplica al resumen"""
+    row = await database.fetch_one(transacciones.select().where(transacciones.c.id == transaccion_id))
+    if row is not None:
+        await aplicar_transaccion(row, signo)
+
+
+def reconstruir(conn):
+    """Recalcula todo el resumen a partir de la tabla transacciones"""
+    fecha = func.date(transacciones.c.fecha_transaccion)
+    agregados = select(
+        fecha,
+        transacciones.c.sede_id,
+        transacciones.c.usuario_id,
+        transacciones.c.tipo,
+        func.count(),
+        func.coalesce(func.sum(transacciones.c.precio_venta), 0),
+        func.coalesce(func.sum(transacciones.c.ganancia), 0),
+    ).group_by(fecha, transacciones.c.sede_id, transacciones.c.usuario_id, transacciones.c.tipo)
+
+    conn.execute(delete(transacciones_diarias))
+    conn.execute(insert(transacciones_diarias).from_select(
+        ["fecha", "sede_id", "usuario_id", "tipo", "cantidad", "total_ventas", "total_ganancias"],
+        agregados
+    ))
+
+
+if __name__ == "__main__":
+    transacciones_diarias.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        reconstruir(conn)
+        total = conn.execute(select(func.count()).select_from(transacciones_diarias)).scalar()
+    print(f"Resumen diario reconstruido: {total} filas.")
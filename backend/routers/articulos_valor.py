@@ -1,10 +1,18 @@
-from fastapi import APIRouter, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, status, Query, UploadFile, File, Form, Request, Response, BackgroundTasks
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import date, datetime
-import base64
+from sqlalchemy import select, func
 from database import database
 from models import articulos_valor, articulos_imagenes, EstadoArticuloEnum
+from media_storage import save_upload, release_blob, blob_response, legacy_response, url_versionada
+from media_variants import VARIANTES, crear_variantes_seguro, obtener_variante, formato_preferido
+from intereses import calcular_interes, agregar_intereses
+from cache import empenos_cache
+from abonos import registrar_abono, listar_abonos
+from exportacion import validar_formato, respuesta_exportacion, en_lotes
+from routers.usuarios import get_current_user
+from versiones import versiones_if_match, verificar_version, actualizar_con_version, agregar_etag
 
 router = APIRouter()
 
@@ -33,83 +41,88 @@ class ArticuloValorOut(ArticuloValorBase):
     valor_actual: Optional[float] = None
     meses_transcurridos: Optional[int] = None
     interes_acumulado: Optional[float] = None
+    total_abonado: Optional[float] = None
+    fecha_ultimo_abono: Optional[date] = None
+    version: Optional[int] = None
 
 class ImagenArticuloOut(BaseModel):
     id: int
     articulo_id: int
     imagen: str
-    imagen_data: Optional[str] = None
+    url: str  # Ruta del endpoint que sirve el archivo binario
+    mime: Optional[str] = None
+    tamano: Optional[int] = None
     es_principal: bool
 
-def calcular_interes(valor_empeno: float, interes_porcentaje: float, fecha_registro: date) -> dict:
-    """
-    Calcula el interés mensual sobre el valor del empeño
-    El interés se aplica cada 32 días (aproximadamente un mes)
-    El valor ingresado es lo que se le presta al cliente, el interés se suma desde el inicio
-    """
-    if not valor_empeno or not interes_porcentaje or not fecha_registro:
-        return {
-            "valor_actual": valor_empeno or 0,
-            "meses_transcurridos": 0,
-            "interes_acumulado": 0
-        }
-    
-    # Calcular días transcurridos desde el registro
-    fecha_actual = datetime.now().date()
-    dias_transcurridos = (fecha_actual - fecha_registro).days
-    
-    # Calcular meses (cada 32 días) - mínimo 1 mes desde la creación
-    meses_transcurridos = max(1, (dias_transcurridos // 32) + 1)
-    
-    # Calcular interés acumulado (siempre sobre el valor del empeño)
-    interes_acumulado = valor_empeno * (interes_porcentaje / 100) * meses_transcurridos
-    
-    # Valor actual = valor del empeño + interés acumulado
-    valor_actual = valor_empeno + interes_acumulado
-    
-    return {
-        "valor_actual": round(valor_actual, 2),
-        "meses_transcurridos": meses_transcurridos,
-        "interes_acumulado": round(interes_acumulado, 2)
-    }
+def imagen_url(articulo_id: int, imagen_id: int, sha256: Optional[str] = None) -> str:
+    return url_versionada(f"/articulos_valor/{articulo_id}/imagenes/{imagen_id}/raw", sha256)
 
 @router.post("/", response_model=ArticuloValorOut, status_code=status.HTTP_201_CREATED)
-async def create_articulo_valor(articulo: ArticuloValorCreate):
+async def create_articulo_valor(articulo: ArticuloValorCreate, response: Response):
     query = articulos_valor.insert().values(**articulo.dict())
     articulo_id = await database.execute(query)
+    empenos_cache.bump()
+    # La versión inicial la pone la base; se devuelve con su ETag para poder usar If-Match
+    version = await database.fetch_val(select(articulos_valor.c.version).where(articulos_valor.c.id == articulo_id))
     
     # Calcular interés para la respuesta
-    calculo_interes = calcular_interes(articulo.valor, articulo.interes_porcentaje or 0, articulo.fecha_registro)
+    calculo_interes = calcular_interes(articulo.valor, articulo.interes_porcentaje, articulo.fecha_registro, "articulo")
     
-    return {
+    creado = {
         **articulo.dict(), 
         "id": articulo_id,
+        "version": version,
         **calculo_interes
     }
+    agregar_etag(response, "articulo", creado)
+    return creado
 
 @router.get("/", response_model=List[ArticuloValorOut])
-async def read_articulos_valor():
+async def read_articulos_valor(
+    estado: Optional[EstadoArticuloEnum] = None,
+    sede_id: Optional[int] = None
+):
     query = articulos_valor.select()
+    if estado is not None:
+        query = query.where(articulos_valor.c.estado == estado)
+    if sede_id is not None:
+        query = query.where(articulos_valor.c.sede_id == sede_id)
     result = await database.fetch_all(query)
     
-    # Agregar cálculo de interés a cada artículo
-    articulos_con_interes = []
-    for articulo in result:
-        calculo_interes = calcular_interes(
-            articulo.valor, 
-            articulo.interes_porcentaje or 0, 
-            articulo.fecha_registro
-        )
-        
-        articulos_con_interes.append({
-            **dict(articulo),
-            **calculo_interes
-        })
+    # Intereses de todos los artículos en una sola pasada, con la misma fecha de corte
+    return agregar_intereses(result, "articulo", "valor", "interes_porcentaje", "fecha_registro")
+
+# Columnas de la exportación: las de la tabla más el interés a la fecha
+COLUMNAS_EXPORTACION = [c.name for c in articulos_valor.columns] + ["meses_transcurridos", "interes_acumulado", "valor_actual"]
+
+@router.get("/export")
+async def exportar_articulos_valor(
+    formato: str = Query("csv", alias="format", description="csv o ndjson"),
+    estado: Optional[EstadoArticuloEnum] = None,
+    sede_id: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Exporta los artículos de valor con el interés a la fecha en CSV o NDJSON.
+    Las filas se leen y se envían por lotes; el interés se calcula por lote.
+    """
+    validar_formato(formato)
+    query = articulos_valor.select().order_by(articulos_valor.c.id)
+    if estado is not None:
+        query = query.where(articulos_valor.c.estado == estado)
+    if sede_id is not None:
+        query = query.where(articulos_valor.c.sede_id == sede_id)
+    hoy = date.today()
     
-    return articulos_con_interes
+    async def filas():
+        async for lote in en_lotes(database.iterate(query)):
+            for fila in agregar_intereses(lote, "articulo", "valor", "interes_porcentaje", "fecha_registro", hoy):
+                yield fila
+    
+    return respuesta_exportacion(filas(), COLUMNAS_EXPORTACION, formato, "articulos_valor")
 
 @router.get("/{articulo_id}", response_model=ArticuloValorOut)
-async def read_articulo_valor(articulo_id: int):
+async def read_articulo_valor(articulo_id: int, response: Response):
     query = articulos_valor.select().where(articulos_valor.c.id == articulo_id)
     articulo = await database.fetch_one(query)
     if articulo is None:
@@ -117,10 +130,15 @@ async def read_articulo_valor(articulo_id: int):
     
     # Calcular interés
     calculo_interes = calcular_interes(
-        articulo.valor, 
-        articulo.interes_porcentaje or 0, 
-        articulo.fecha_registro
+        articulo.valor,
+        articulo.interes_porcentaje,
+        articulo.fecha_registro,
+        "articulo",
+        saldo_capital=articulo.saldo_capital,
+        saldo_interes=articulo.saldo_interes,
+        meses_liquidados=articulo.meses_liquidados
     )
+    agregar_etag(response, "articulo", articulo)
     
     return {
         **dict(articulo),
@@ -128,19 +146,29 @@ async def read_articulo_valor(articulo_id: int):
     }
 
 @router.put("/{articulo_id}", response_model=ArticuloValorOut)
-async def update_articulo_valor(articulo_id: int, articulo: ArticuloValorUpdate):
-    query = articulos_valor.update().where(articulos_valor.c.id == articulo_id).values(**articulo.dict(exclude_unset=True))
-    await database.execute(query)
+async def update_articulo_valor(articulo_id: int, articulo: ArticuloValorUpdate, request: Request, response: Response):
+    """
+    Actualiza el artículo. Con If-Match (ETag del GET) solo se guarda si nadie
+    lo modificó desde entonces; si no, responde 412.
+    """
+    versiones = versiones_if_match(request, "articulo", articulo_id)
+    await actualizar_con_version("articulo", articulo_id, versiones, articulo.dict(exclude_unset=True))
+    empenos_cache.bump()
     updated = await database.fetch_one(articulos_valor.select().where(articulos_valor.c.id == articulo_id))
     if updated is None:
         raise HTTPException(status_code=404, detail="Artículo no encontrado")
     
     # Calcular interés
     calculo_interes = calcular_interes(
-        updated.valor, 
-        updated.interes_porcentaje or 0, 
-        updated.fecha_registro
+        updated.valor,
+        updated.interes_porcentaje,
+        updated.fecha_registro,
+        "articulo",
+        saldo_capital=updated.saldo_capital,
+        saldo_interes=updated.saldo_interes,
+        meses_liquidados=updated.meses_liquidados
     )
+    agregar_etag(response, "articulo", updated)
     
     return {
         **dict(updated),
@@ -149,8 +177,17 @@ async def update_articulo_valor(articulo_id: int, articulo: ArticuloValorUpdate)
 
 @router.delete("/{articulo_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_articulo_valor(articulo_id: int):
-    query = articulos_valor.delete().where(articulos_valor.c.id == articulo_id)
-    await database.execute(query)
+    async with database.transaction():
+        imagenes = await database.fetch_all(
+            select(articulos_imagenes.c.ruta).where(articulos_imagenes.c.articulo_id == articulo_id)
+        )
+        await database.execute(articulos_imagenes.delete().where(articulos_imagenes.c.articulo_id == articulo_id))
+        await database.execute(articulos_valor.delete().where(articulos_valor.c.id == articulo_id))
+    empenos_cache.bump()
+    
+    # Liberar los blobs (y sus variantes) que ya no use ningún otro registro
+    for ruta in {row["ruta"] for row in imagenes}:
+        await release_blob(ruta)
     return
 
 # Endpoint específico para obtener artículos empeñados con intereses
@@ -162,25 +199,12 @@ async def get_empenos_activos():
     query = articulos_valor.select().where(articulos_valor.c.estado == EstadoArticuloEnum.empeño)
     result = await database.fetch_all(query)
     
-    # Agregar cálculo de interés a cada artículo
-    empenos_con_interes = []
-    for articulo in result:
-        calculo_interes = calcular_interes(
-            articulo.valor, 
-            articulo.interes_porcentaje or 0, 
-            articulo.fecha_registro
-        )
-        
-        empenos_con_interes.append({
-            **dict(articulo),
-            **calculo_interes
-        })
-    
-    return empenos_con_interes
+    # Intereses de todos los artículos en una sola pasada, con la misma fecha de corte
+    return agregar_intereses(result, "articulo", "valor", "interes_porcentaje", "fecha_registro")
 
 # Endpoint para realizar abono a un empeño
 @router.patch("/{articulo_id}/abono")
-async def realizar_abono(articulo_id: int, monto_abono: float):
+async def realizar_abono(articulo_id: int, monto_abono: float, request: Request):
     """
     Registra un abono al empeño. Si el abono cubre el valor actual, cambia el estado a recuperado.
     """
@@ -189,59 +213,57 @@ async def realizar_abono(articulo_id: int, monto_abono: float):
     articulo = await database.fetch_one(query)
     if articulo is None:
         raise HTTPException(status_code=404, detail="Artículo no encontrado")
+    versiones = versiones_if_match(request, "articulo", articulo_id)
+    verificar_version(articulo, versiones)
     
     if articulo.estado != EstadoArticuloEnum.empeño:
         raise HTTPException(status_code=400, detail="El artículo no está en estado de empeño")
     
-    # Calcular valor actual con intereses
-    calculo_interes = calcular_interes(
-        articulo.valor, 
-        articulo.interes_porcentaje or 0, 
-        articulo.fecha_registro
-    )
+    if monto_abono <= 0:
+        raise HTTPException(status_code=400, detail="El monto del abono debe ser mayor a 0")
     
-    valor_actual = calculo_interes["valor_actual"]
+    # Si el abono cubre el valor actual, el artículo pasa a recuperado
+    resultado = await registrar_abono(
+        articulo, "articulo", monto_abono, {"estado": EstadoArticuloEnum.recuperado}, versiones
+    )
+    empenos_cache.bump()
     
-    if monto_abono >= valor_actual:
-        # Abono completo - cambiar estado a recuperado
-        update_query = articulos_valor.update().where(
-            articulos_valor.c.id == articulo_id
-        ).values(estado=EstadoArticuloEnum.recuperado)
-        await database.execute(update_query)
-        
+    if resultado["recuperado"]:
         return {
             "mensaje": "Empeño recuperado completamente",
-            "valor_actual": valor_actual,
-            "monto_abono": monto_abono,
-            "cambio": monto_abono - valor_actual,
-            "estado": "recuperado"
-        }
-    else:
-        # Abono parcial - por ahora solo informamos, no modificamos el valor
-        return {
-            "mensaje": "Abono parcial registrado",
-            "valor_actual": valor_actual,
-            "monto_abono": monto_abono,
-            "saldo_pendiente": valor_actual - monto_abono,
-            "estado": "empeño"
+            "estado": "recuperado",
+            **resultado
         }
+    return {
+        "mensaje": "Abono parcial registrado",
+        "estado": "empeño",
+        **resultado
+    }
+
+@router.get("/{articulo_id}/abonos", response_model=List[dict])
+async def get_abonos_articulo(articulo_id: int):
+    return await listar_abonos("articulo", articulo_id)
 
 # Endpoints para imágenes de artículos
 @router.post("/{articulo_id}/imagenes", response_model=ImagenArticuloOut, status_code=status.HTTP_201_CREATED)
 async def upload_imagen_articulo(
     articulo_id: int,
+    background_tasks: BackgroundTasks,
     imagen: UploadFile = File(...),
     es_principal: bool = Form(False)
 ):
+    # Verificar que sea una imagen
+    if not imagen.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="Solo se permiten archivos de imagen")
+
     # Verificar que el artículo existe
     articulo_query = articulos_valor.select().where(articulos_valor.c.id == articulo_id)
     articulo = await database.fetch_one(articulo_query)
     if articulo is None:
         raise HTTPException(status_code=404, detail="Artículo no encontrado")
     
-    # Leer y convertir imagen a base64
-    imagen_data = await imagen.read()
-    imagen_base64 = base64.b64encode(imagen_data).decode('utf-8')
+    # Copiar la imagen al almacenamiento de media por bloques (sin cargarla en memoria)
+    blob = await save_upload(imagen, 'imagen')
     
     # Si es principal, desmarcar otras imágenes principales del mismo artículo
     if es_principal:
@@ -251,50 +273,112 @@ async def upload_imagen_articulo(
         await database.execute(update_query)
     else:
         # Si no se especifica como principal, verificar si es la primera imagen
-        count_query = articulos_imagenes.select().where(articulos_imagenes.c.articulo_id == articulo_id)
-        existing_images = await database.fetch_all(count_query)
-        if len(existing_images) == 0:
+        count_query = select(func.count()).select_from(articulos_imagenes).where(articulos_imagenes.c.articulo_id == articulo_id)
+        if await database.fetch_val(count_query) == 0:
             es_principal = True  # Primera imagen es automáticamente principal
     
     # Insertar nueva imagen
     query = articulos_imagenes.insert().values(
         articulo_id=articulo_id,
         imagen=imagen.filename,
-        imagen_data=imagen_base64,
+        sha256=blob["sha256"],
+        ruta=blob["ruta"],
+        tamano=blob["tamano"],
+        mime=imagen.content_type,
         es_principal=1 if es_principal else 0
     )
     imagen_id = await database.execute(query)
     
+    # Generar miniaturas y variantes WebP/JPEG en el pool de procesos, después de responder
+    background_tasks.add_task(crear_variantes_seguro, blob["sha256"], blob["ruta"])
+    
     return {
         "id": imagen_id,
         "articulo_id": articulo_id,
         "imagen": imagen.filename,
+        "url": imagen_url(articulo_id, imagen_id, blob["sha256"]),
+        "mime": imagen.content_type,
+        "tamano": blob["tamano"],
         "es_principal": es_principal
     }
 
 @router.get("/{articulo_id}/imagenes", response_model=List[ImagenArticuloOut])
 async def get_imagenes_articulo(articulo_id: int):
-    query = articulos_imagenes.select().where(articulos_imagenes.c.articulo_id == articulo_id)
+    # Solo metadatos: el contenido se descarga aparte desde la url de cada imagen
+    query = select(
+        articulos_imagenes.c.id,
+        articulos_imagenes.c.articulo_id,
+        articulos_imagenes.c.imagen,
+        articulos_imagenes.c.mime,
+        articulos_imagenes.c.tamano,
+        articulos_imagenes.c.sha256,
+        articulos_imagenes.c.es_principal,
+    ).where(articulos_imagenes.c.articulo_id == articulo_id)
     result = await database.fetch_all(query)
     
-    # Convertir el resultado para incluir imagen_data
     imagenes = []
     for row in result:
         imagenes.append({
             "id": row.id,
             "articulo_id": row.articulo_id,
             "imagen": row.imagen,
-            "imagen_data": row.imagen_data,
+            "url": imagen_url(row.articulo_id, row.id, row.sha256),
+            "mime": row.mime,
+            "tamano": row.tamano,
             "es_principal": bool(row.es_principal)
         })
     
     return imagenes
 
-@router.delete("/{articulo_id}/imagenes/{imagen_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_imagen_articulo(articulo_id: int, imagen_id: int):
-    query = articulos_imagenes.delete().where(
-        (articulos_imagenes.c.id == imagen_id) & 
+@router.get("/{articulo_id}/imagenes/{imagen_id}/raw")
+async def get_imagen_raw_articulo(
+    articulo_id: int,
+    imagen_id: int,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    size: str = Query("original", description="original, thumb, card o detail")
+):
+    """
+    Sirve la imagen binaria con su Content-Type y ETag fuerte; la caché es inmutable
+    solo si la URL lleva ?v=<sha256> de la imagen (como las que devuelven los listados).
+    Responde 304 si el cliente ya tiene la versión actual (If-None-Match).
+    size elige una variante (WebP si el navegador lo acepta, si no JPEG); mientras
+    la variante se genera se sirve el original, sin caché inmutable.
+    """
+    if size != "original" and size not in VARIANTES:
+        raise HTTPException(status_code=400, detail=f"Tamaño no soportado. Opciones: original, {', '.join(VARIANTES)}")
+    
+    query = articulos_imagenes.select().where(
+        (articulos_imagenes.c.id == imagen_id) &
         (articulos_imagenes.c.articulo_id == articulo_id)
     )
+    imagen = await database.fetch_one(query)
+    if imagen is None:
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+    
+    if imagen.ruta and size != "original":
+        formato = formato_preferido(request.headers.get("accept"))
+        variante = await obtener_variante(imagen.sha256, imagen.ruta, size, formato, background_tasks)
+        if variante is not None:
+            return blob_response(request, variante.sha256, variante.ruta, variante.mime, variante.tamano,
+                                 vary="Accept", version=imagen.sha256)
+    
+    if imagen.ruta:
+        mime = imagen.mime or "application/octet-stream"
+        return blob_response(request, imagen.sha256, imagen.ruta, mime, imagen.tamano,
+                             inmutable=size == "original")
+    if imagen.imagen_data:
+        return legacy_response(request, imagen.imagen_data, imagen.mime or "image/jpeg")
+    raise HTTPException(status_code=404, detail="Imagen no encontrada")
+
+@router.delete("/{articulo_id}/imagenes/{imagen_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_imagen_articulo(articulo_id: int, imagen_id: int):
+    condicion = (articulos_imagenes.c.id == imagen_id) & (articulos_imagenes.c.articulo_id == articulo_id)
+    imagen = await database.fetch_one(articulos_imagenes.select().where(condicion))
+    query = articulos_imagenes.delete().where(condicion)
     await database.execute(query)
+    
+    # Liberar el blob si ya no lo usa ningún otro registro
+    if imagen is not None:
+        await release_blob(imagen.ruta)
     return
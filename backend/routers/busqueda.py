@@ -0,0 +1,120 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Optional
+from pydantic import BaseModel
+import re
+from sqlalchemy import select, and_, or_
+from database import database, engine
+from models import vehiculos, articulos_valor, transacciones
+from routers.usuarios import get_current_user
+from busqueda_fts import TABLA_FTS, FUENTES, TIPOS_POR_CODIGO
+
+router = APIRouter()
+
+TABLAS = {
+    "vehiculo": vehiculos,
+    "articulo": articulos_valor,
+    "transaccion": transacciones,
+}
+
+class ResultadoBusqueda(BaseModel):
+    tipo: str  # 'vehiculo', 'articulo' o 'transaccion'
+    id: int
+    titulo: str
+    detalle: str
+    score: Optional[float] = None  # Menor es más relevante (bm25); vacío con LIKE
+
+_fts_disponible = None
+
+async def fts_disponible() -> bool:
+    """El índice FTS5 solo existe en SQLite; en MySQL se busca con LIKE"""
+    global _fts_disponible
+    if _fts_disponible is None:
+        if engine.dialect.name != "sqlite":
+            _fts_disponible = False
+        else:
+            query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nombre"
+            _fts_disponible = await database.fetch_one(query, {"nombre": TABLA_FTS}) is not None
+    return _fts_disponible
+
+def terminos(q: str) -> List[str]:
+    return re.findall(r"\w+", q)
+
+async def buscar_fts(palabras: List[str], tipo: Optional[str], limit: int, usuario_id: Optional[int]):
+    # Cada palabra entre comillas (sin sintaxis FTS del usuario) y con * para buscar por prefijo
+    expresion = " ".join(f'"{palabra}"*' for palabra in palabras)
+    sql = (
+        f"SELECT rowid, titulo, detalle, bm25({TABLA_FTS}, 10.0, 1.0) AS score "
+        f"FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH :expresion"
+    )
+    valores = {"expresion": expresion, "limit": limit}
+    if tipo:
+        sql += " AND (rowid & 3) = :codigo"
+        valores["codigo"] = FUENTES[tipo][0]
+    if usuario_id is not None:
+        # Solo las transacciones del usuario; se filtra antes del LIMIT para no perder resultados
+        sql += (
+            " AND ((rowid & 3) != :codigo_transaccion OR (rowid >> 2) IN "
+            "(SELECT id FROM transacciones WHERE usuario_id = :usuario_id))"
+        )
+        valores["codigo_transaccion"] = FUENTES["transaccion"][0]
+        valores["usuario_id"] = usuario_id
+    sql += " ORDER BY score LIMIT :limit"
+
+    rows = await database.fetch_all(sql, valores)
+    return [
+        {
+            "tipo": TIPOS_POR_CODIGO[row["rowid"] % 4],
+            "id": row["rowid"] // 4,
+            "titulo": row["titulo"],
+            "detalle": row["detalle"],
+            "score": row["score"],
+        }
+        for row in rows
+    ]
+
+async def buscar_like(palabras: List[str], tipo: Optional[str], limit: int, usuario_id: Optional[int]):
+    resultados = []
+    for nombre, (_, _, columnas_titulo, columnas_detalle) in FUENTES.items():
+        if tipo and tipo != nombre:
+            continue
+        tabla = TABLAS[nombre]
+        columnas = [tabla.c[columna] for columna in columnas_titulo + columnas_detalle]
+        # Cada palabra debe aparecer en alguna de las columnas
+        condicion = and_(*[or_(*[columna.like(f"%{palabra}%") for columna in columnas]) for palabra in palabras])
+        if nombre == "transaccion" and usuario_id is not None:
+            condicion = condicion & (tabla.c.usuario_id == usuario_id)
+        query = select(tabla.c.id, *columnas).where(condicion).order_by(tabla.c.id.desc()).limit(limit)
+        for row in await database.fetch_all(query):
+            resultados.append({
+                "tipo": nombre,
+                "id": row["id"],
+                "titulo": " ".join(row[c] for c in columnas_titulo if row[c]),
+                "detalle": " ".join(row[c] for c in columnas_detalle if row[c]),
+                "score": None,
+            })
+    return resultados[:limit]
+
+@router.get("/", response_model=List[ResultadoBusqueda])
+async def buscar(
+    q: str = Query(..., min_length=1),
+    tipo: Optional[str] = Query(None, description="vehiculo, articulo o transaccion"),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Búsqueda unificada en vehículos (marca, modelo, placa, color), artículos de
+    valor (descripción y cliente) y transacciones (cliente y observaciones).
+    Cada palabra se busca por prefijo y los resultados vienen ordenados por relevancia.
+    """
+    if tipo is not None and tipo not in FUENTES:
+        raise HTTPException(status_code=400, detail=f"Tipo no soportado. Opciones: {', '.join(FUENTES)}")
+    palabras = terminos(q)
+    if not palabras:
+        return []
+
+    # Los vendedores solo ven sus propias transacciones, igual que en el listado
+    usuario_id = current_user["id"] if current_user["rol"] == "vendedor" else None
+
+    if await fts_disponible():
+        return await buscar_fts(palabras, tipo, limit, usuario_id)
+    return await buscar_like(palabras, tipo, limit, usuario_id)
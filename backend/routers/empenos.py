@@ -0,0 +1,155 @@
+from fastapi import APIRouter, Depends, Query
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import select
+from database import database
+from models import articulos_valor, vehiculos, EstadoArticuloEnum, EstadoVehiculoEnum
+from routers.usuarios import get_current_user
+from intereses import DIAS_POR_MES, calcular_portafolio
+from cache import empenos_cache
+
+router = APIRouter()
+
+# Rangos de antigüedad en meses de 32 días: (nombre, desde, hasta)
+RANGOS_ANTIGUEDAD = [
+    ("0-1", 0, 1),
+    ("1-3", 1, 3),
+    ("3-6", 3, 6),
+    ("6+", 6, None),
+]
+
+async def cargar_cartera() -> dict:
+    """Empeños activos de artículos y vehículos, solo con las columnas necesarias"""
+    consultas = {
+        "articulo": select(
+            articulos_valor.c.sede_id,
+            articulos_valor.c.valor.label("valor"),
+            articulos_valor.c.interes_porcentaje,
+            articulos_valor.c.fecha_registro.label("fecha"),
+            articulos_valor.c.saldo_capital,
+            articulos_valor.c.saldo_interes,
+            articulos_valor.c.meses_liquidados,
+        ).where(
+            (articulos_valor.c.estado == EstadoArticuloEnum.empeño) &
+            articulos_valor.c.valor.isnot(None) &
+            articulos_valor.c.fecha_registro.isnot(None)
+        ),
+        "vehiculo": select(
+            vehiculos.c.sede_id,
+            vehiculos.c.valor_empeno.label("valor"),
+            vehiculos.c.interes_porcentaje,
+            vehiculos.c.fecha_empeno.label("fecha"),
+            vehiculos.c.saldo_capital,
+            vehiculos.c.saldo_interes,
+            vehiculos.c.meses_liquidados,
+        ).where(
+            (vehiculos.c.estado == EstadoVehiculoEnum.empeño) &
+            vehiculos.c.valor_empeno.isnot(None) &
+            vehiculos.c.fecha_empeno.isnot(None)
+        ),
+    }
+    return {tipo: await database.fetch_all(query) for tipo, query in consultas.items()}
+
+def fechas_proyeccion(hoy: date, horizonte: int) -> list:
+    """Hoy, cada fin de mes dentro del horizonte y el último día del horizonte"""
+    fin = hoy + timedelta(days=horizonte)
+    fechas = {hoy, fin}
+    inicio_mes = hoy.replace(day=1)
+    while True:
+        inicio_mes = (inicio_mes + timedelta(days=32)).replace(day=1)
+        fin_mes = inicio_mes - timedelta(days=1)
+        if fin_mes > fin:
+            break
+        if fin_mes >= hoy:
+            fechas.add(fin_mes)
+    return sorted(fechas)
+
+def totales(indices, cantidad_grupos: int, prestado, interes) -> list:
+    """Suma por grupo (sede o rango) con np.bincount"""
+    cantidad = np.bincount(indices, minlength=cantidad_grupos)
+    valor_prestado = np.bincount(indices, weights=prestado, minlength=cantidad_grupos)
+    interes_acumulado = np.bincount(indices, weights=interes, minlength=cantidad_grupos)
+    return [
+        {
+            "cantidad": int(cantidad[i]),
+            "valor_prestado": round(float(valor_prestado[i]), 2),
+            "interes_acumulado": round(float(interes_acumulado[i]), 2),
+            "valor_total": round(float(valor_prestado[i] + interes_acumulado[i]), 2),
+        }
+        for i in range(cantidad_grupos)
+    ]
+
+def calcular_proyeccion(cartera: dict, hoy: date, horizonte: int) -> dict:
+    filas = [(tipo, fila) for tipo, filas_tipo in cartera.items() for fila in filas_tipo]
+    sedes = np.array([fila["sede_id"] or 0 for _, fila in filas], dtype=np.int64)
+    # Capital pendiente: lo prestado menos lo abonado a capital
+    prestado = np.array([
+        float(fila["saldo_capital"] if fila["saldo_capital"] is not None else fila["valor"])
+        for _, fila in filas
+    ], dtype=np.float64)
+    dias = np.array([(hoy - fila["fecha"]).days for _, fila in filas], dtype=np.int64)
+    sede_ids, indice_sede = np.unique(sedes, return_inverse=True)
+    sin_grupo = np.zeros(len(filas), dtype=np.int64)
+
+    def interes_a(fecha: date):
+        """Interés de toda la cartera a una fecha, en el mismo orden que filas"""
+        partes = [
+            calcular_portafolio(
+                [fila["valor"] for fila in filas_tipo],
+                [fila["interes_porcentaje"] for fila in filas_tipo],
+                [fila["fecha"] for fila in filas_tipo],
+                tipo,
+                fecha,
+                [fila["saldo_capital"] for fila in filas_tipo],
+                [fila["saldo_interes"] for fila in filas_tipo],
+                [fila["meses_liquidados"] for fila in filas_tipo]
+            )[1]
+            for tipo, filas_tipo in cartera.items()
+        ]
+        return np.concatenate(partes) if partes else np.zeros(0)
+
+    proyeccion = []
+    for fecha in fechas_proyeccion(hoy, horizonte):
+        interes = interes_a(fecha)
+        if fecha == hoy:
+            interes_hoy = interes
+        por_sede = totales(indice_sede, len(sede_ids), prestado, interes)
+        proyeccion.append({
+            "fecha": fecha,
+            "total": totales(sin_grupo, 1, prestado, interes)[0],
+            "sedes": [{"sede_id": int(sede_id) or None, **datos} for sede_id, datos in zip(sede_ids, por_sede)],
+        })
+
+    # Antigüedad a la fecha de corte, con el interés acumulado a hoy
+    limites = [desde for _, desde, _ in RANGOS_ANTIGUEDAD[1:]]
+    indice_rango = np.digitize(dias / DIAS_POR_MES, limites)
+    por_rango = totales(indice_rango, len(RANGOS_ANTIGUEDAD), prestado, interes_hoy)
+    antiguedad = [
+        {"rango": nombre, "meses_desde": desde, "meses_hasta": hasta, **datos}
+        for (nombre, desde, hasta), datos in zip(RANGOS_ANTIGUEDAD, por_rango)
+    ]
+
+    return {
+        "fecha_corte": hoy,
+        "horizonte": horizonte,
+        "proyeccion": proyeccion,
+        "antiguedad": antiguedad,
+    }
+
+@router.get("/proyeccion")
+async def get_proyeccion_empenos(
+    horizonte: int = Query(30, ge=1, le=365, description="Días hacia adelante"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Proyección del interés acumulado de la cartera de empeños (artículos y
+    vehículos) por sede, hoy, en cada fin de mes y al final del horizonte, más
+    los empeños agrupados por antigüedad. Se calcula una vez por día y se
+    recalcula cuando cambia algún empeño.
+    """
+    hoy = date.today()
+
+    async def calcular():
+        return calcular_proyeccion(await cargar_cartera(), hoy, horizonte)
+
+    return await empenos_cache.get((hoy, horizonte), calcular)
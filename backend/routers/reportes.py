@@ -0,0 +1,204 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+from datetime import date
+from sqlalchemy import select, func
+from database import database
+from models import vehiculos, articulos_valor, mantenimientos, transacciones_diarias, EstadoVehiculoEnum, EstadoArticuloEnum
+from routers.usuarios import get_current_user
+from cache import reportes_cache
+
+router = APIRouter()
+
+def monto(valor) -> float:
+    return round(float(valor or 0), 2)
+
+def texto(valor):
+    """Los Enum llegan como objeto o como texto según el driver"""
+    return getattr(valor, "value", valor)
+
+async def inventario_por_estado(sede_id: Optional[int]) -> dict:
+    """Cantidad y valor de vehículos y artículos agrupados por sede y estado"""
+    query_vehiculos = select(
+        vehiculos.c.sede_id,
+        vehiculos.c.estado,
+        func.count().label("cantidad"),
+        func.sum(vehiculos.c.precio_compra).label("valor_compra"),
+        func.sum(vehiculos.c.precio_venta).label("valor_venta"),
+    ).group_by(vehiculos.c.sede_id, vehiculos.c.estado).order_by(vehiculos.c.sede_id, vehiculos.c.estado)
+    query_articulos = select(
+        articulos_valor.c.sede_id,
+        articulos_valor.c.estado,
+        func.count().label("cantidad"),
+        func.sum(articulos_valor.c.valor).label("valor"),
+    ).group_by(articulos_valor.c.sede_id, articulos_valor.c.estado).order_by(articulos_valor.c.sede_id, articulos_valor.c.estado)
+    if sede_id is not None:
+        query_vehiculos = query_vehiculos.where(vehiculos.c.sede_id == sede_id)
+        query_articulos = query_articulos.where(articulos_valor.c.sede_id == sede_id)
+
+    return {
+        "vehiculos": [
+            {
+                "sede_id": row["sede_id"],
+                "estado": texto(row["estado"]),
+                "cantidad": row["cantidad"],
+                "valor_compra": monto(row["valor_compra"]),
+                "valor_venta": monto(row["valor_venta"]),
+            }
+            for row in await database.fetch_all(query_vehiculos)
+        ],
+        "articulos": [
+            {
+                "sede_id": row["sede_id"],
+                "estado": texto(row["estado"]),
+                "cantidad": row["cantidad"],
+                "valor": monto(row["valor"]),
+            }
+            for row in await database.fetch_all(query_articulos)
+        ],
+    }
+
+async def mantenimientos_por_mes(sede_id: Optional[int], desde: Optional[date], hasta: Optional[date]) -> list:
+    """Costo de mantenimiento por vehículo y mes de servicio"""
+    # 'YYYY-MM' de la fecha; strftime/DATE_FORMAT llevan '%', que databases no escapa en SQLite
+    mes = func.substr(mantenimientos.c.fecha_servicio, 1, 7)
+    query = select(
+        mantenimientos.c.vehiculo_id,
+        vehiculos.c.marca,
+        vehiculos.c.modelo,
+        vehiculos.c.placa,
+        mes.label("mes"),
+        func.count().label("cantidad"),
+        func.sum(mantenimientos.c.costo).label("costo"),
+    ).select_from(
+        mantenimientos.outerjoin(vehiculos, vehiculos.c.id == mantenimientos.c.vehiculo_id)
+    ).group_by(
+        mantenimientos.c.vehiculo_id, vehiculos.c.marca, vehiculos.c.modelo, vehiculos.c.placa, mes
+    ).order_by(mes, mantenimientos.c.vehiculo_id)
+    if sede_id is not None:
+        query = query.where(vehiculos.c.sede_id == sede_id)
+    if desde:
+        query = query.where(mantenimientos.c.fecha_servicio >= desde)
+    if hasta:
+        query = query.where(mantenimientos.c.fecha_servicio <= hasta)
+
+    return [
+        {
+            "vehiculo_id": row["vehiculo_id"],
+            "marca": row["marca"],
+            "modelo": row["modelo"],
+            "placa": row["placa"],
+            "mes": row["mes"],
+            "cantidad": row["cantidad"],
+            "costo": monto(row["costo"]),
+        }
+        for row in await database.fetch_all(query)
+    ]
+
+async def cartera_empenos(sede_id: Optional[int]) -> list:
+    """Totales de los empeños activos por tipo y sede (capital prestado, pendiente y abonado)"""
+    resultado = []
+    consultas = {
+        "articulo": (articulos_valor, articulos_valor.c.valor, EstadoArticuloEnum.empeño),
+        "vehiculo": (vehiculos, vehiculos.c.valor_empeno, EstadoVehiculoEnum.empeño),
+    }
+    for tipo, (tabla, columna_valor, estado) in consultas.items():
+        query = select(
+            tabla.c.sede_id,
+            func.count().label("cantidad"),
+            func.sum(columna_valor).label("valor_prestado"),
+            func.sum(func.coalesce(tabla.c.saldo_capital, columna_valor)).label("saldo_capital"),
+            func.sum(tabla.c.total_abonado).label("total_abonado"),
+        ).where(tabla.c.estado == estado).group_by(tabla.c.sede_id).order_by(tabla.c.sede_id)
+        if sede_id is not None:
+            query = query.where(tabla.c.sede_id == sede_id)
+        for row in await database.fetch_all(query):
+            resultado.append({
+                "tipo": tipo,
+                "sede_id": row["sede_id"],
+                "cantidad": row["cantidad"],
+                "valor_prestado": monto(row["valor_prestado"]),
+                "saldo_capital": monto(row["saldo_capital"]),
+                "total_abonado": monto(row["total_abonado"]),
+            })
+    return resultado
+
+async def ventas_por_tipo(sede_id: Optional[int], desde: Optional[date], hasta: Optional[date], current_user: dict) -> list:
+    """Ventas y ganancias del período, leídas del resumen diario de transacciones"""
+    query = select(
+        transacciones_diarias.c.tipo,
+        func.sum(transacciones_diarias.c.cantidad).label("cantidad"),
+        func.sum(transacciones_diarias.c.total_ventas).label("total_ventas"),
+        func.sum(transacciones_diarias.c.total_ganancias).label("total_ganancias"),
+    ).group_by(transacciones_diarias.c.tipo).order_by(transacciones_diarias.c.tipo)
+    if sede_id is not None:
+        query = query.where(transacciones_diarias.c.sede_id == sede_id)
+    if desde:
+        query = query.where(transacciones_diarias.c.fecha >= desde)
+    if hasta:
+        query = query.where(transacciones_diarias.c.fecha <= hasta)
+    # Igual que en las estadísticas: el vendedor solo ve sus propias ventas
+    if current_user["rol"] == "vendedor":
+        query = query.where(transacciones_diarias.c.usuario_id == current_user["id"])
+
+    return [
+        {
+            "tipo": texto(row["tipo"]),
+            "cantidad": int(row["cantidad"] or 0),
+            "total_ventas": monto(row["total_ventas"]),
+            "total_ganancias": monto(row["total_ganancias"]),
+        }
+        for row in await database.fetch_all(query)
+    ]
+
+async def calcular_resumen(sede_id: Optional[int], desde: Optional[date], hasta: Optional[date], current_user: dict) -> dict:
+    inventario = await inventario_por_estado(sede_id)
+    mantenimiento = await mantenimientos_por_mes(sede_id, desde, hasta)
+    empenos = await cartera_empenos(sede_id)
+    ventas = await ventas_por_tipo(sede_id, desde, hasta, current_user)
+
+    costo_mantenimientos = monto(sum(fila["costo"] for fila in mantenimiento))
+    ingresos = monto(sum(fila["total_ventas"] for fila in ventas if fila["tipo"] != "empeño_vehiculo"))
+    ganancia_bruta = monto(sum(fila["total_ganancias"] for fila in ventas))
+    return {
+        "filtros": {"sede_id": sede_id, "desde": desde, "hasta": hasta},
+        "totales": {
+            "valor_inventario": monto(
+                sum(f["valor_venta"] for f in inventario["vehiculos"] if f["estado"] == "disponible") +
+                sum(f["valor"] for f in inventario["articulos"] if f["estado"] == "disponible")
+            ),
+            "ingresos_ventas": ingresos,
+            "ganancia_bruta": ganancia_bruta,
+            "costo_mantenimientos": costo_mantenimientos,
+            "ganancia_neta": monto(ganancia_bruta - costo_mantenimientos),
+            "capital_empenado": monto(sum(f["saldo_capital"] for f in empenos)),
+        },
+        "inventario": inventario,
+        "mantenimientos": mantenimiento,
+        "empenos": empenos,
+        "ventas": ventas,
+    }
+
+@router.get("/resumen")
+async def get_resumen(
+    sede_id: Optional[int] = Query(None),
+    desde: Optional[date] = Query(None),
+    hasta: Optional[date] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Agregados para la pantalla de reportes, calculados con GROUP BY en la base:
+    inventario por sede y estado, costo de mantenimiento por vehículo y mes,
+    cartera de empeños activos y ventas del período (resumen diario). El rango
+    desde/hasta (inclusivo) aplica a mantenimientos y ventas; inventario y
+    empeños son el estado actual. Se guarda en caché unos segundos por filtros.
+    """
+    if desde and hasta and desde > hasta:
+        raise HTTPException(status_code=400, detail="La fecha 'desde' no puede ser posterior a 'hasta'")
+
+    # Las ventas del vendedor dependen del usuario, el resto de la clave son los filtros
+    alcance = current_user["id"] if current_user["rol"] == "vendedor" else None
+
+    async def calcular():
+        return await calcular_resumen(sede_id, desde, hasta, current_user)
+
+    return await reportes_cache.get((sede_id, desde, hasta, alcance), calcular)
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, status
 from typing import List
 from pydantic import BaseModel
 from database import database
 from models import sedes
+from cache import sedes_cache
 
 router = APIRouter()
 
@@ -20,6 +21,12 @@ class SedeUpdate(SedeBase):
 class SedeOut(SedeBase):
     id: int
 
+async def get_sedes_cached() -> list:
+    """Todas las sedes, servidas desde memoria hasta que cambie alguna"""
+    async def cargar():
+        return [dict(row) for row in await database.fetch_all(sedes.select())]
+    return await sedes_cache.get("todas", cargar)
+
 @router.post("/", response_model=SedeOut, status_code=status.HTTP_201_CREATED)
 async def create_sede(sede: SedeCreate):
     query = sedes.insert().values(
@@ -28,18 +35,16 @@ async def create_sede(sede: SedeCreate):
         telefono=sede.telefono
     )
     sede_id = await database.execute(query)
+    sedes_cache.invalidate()
     return {**sede.dict(), "id": sede_id}
 
 @router.get("/", response_model=List[SedeOut])
 async def read_sedes():
-    query = sedes.select()
-    result = await database.fetch_all(query)
-    return result
+    return await get_sedes_cached()
 
 @router.get("/{sede_id}", response_model=SedeOut)
 async def read_sede(sede_id: int):
-    query = sedes.select().where(sedes.c.id == sede_id)
-    sede = await database.fetch_one(query)
+    sede = next((s for s in await get_sedes_cached() if s["id"] == sede_id), None)
     if sede is None:
         raise HTTPException(status_code=404, detail="Sede no encontrada")
     return sede
@@ -52,10 +57,12 @@ async def update_sede(sede_id: int, sede: SedeUpdate):
         telefono=sede.telefono
     )
     await database.execute(query)
+    sedes_cache.invalidate()
     return {**sede.dict(), "id": sede_id}
 
 @router.delete("/{sede_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_sede(sede_id: int):
     query = sedes.delete().where(sedes.c.id == sede_id)
     await database.execute(query)
+    sedes_cache.invalidate()
     return
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response, Query
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta
 from decimal import Decimal
-from database import database
-from models import transacciones, vehiculos, articulos_valor, TipoTransaccionEnum, EstadoVehiculoEnum, EstadoArticuloEnum
-from routers.usuarios import get_current_user
+import base64
+import json
+from sqlalchemy import select, func, literal, cast, String, and_, or_
+from database import database, execute_rowcount
+from models import transacciones, transacciones_diarias, vehiculos, articulos_valor, TipoTransaccionEnum, EstadoVehiculoEnum, EstadoArticuloEnum
+from routers.usuarios import get_current_user, get_usuarios_nombres
+from rollup_transacciones import aplicar_transaccion, aplicar_transaccion_por_id
+from cache import inventario_cache, empenos_cache
+from exportacion import validar_formato, respuesta_exportacion
 
 router = APIRouter()
 
@@ -40,6 +46,66 @@ class TransaccionResponse(BaseModel):
     articulo_info: Optional[str] = None
     usuario_nombre: Optional[str] = None
 
+def encode_cursor(fecha: str, transaccion_id: int) -> str:
+    """
+    Cursor opaco con la posición (fecha_transaccion, id) de la última fila entregada.
+    La fecha va tal como está guardada (con sus fracciones de segundo, si las tiene).
+    """
+    data = json.dumps({"f": fecha, "id": transaccion_id})
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        datetime.fromisoformat(data["f"])
+        return data["f"], int(data["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+# Estado que exige y deja cada tipo de transacción:
+# tipo -> (tabla, columna de la transacción, estado requerido, estado nuevo)
+CAMBIOS_ESTADO = {
+    "venta_vehiculo": (vehiculos, "vehiculo_id", "disponible", "vendido"),
+    "venta_articulo": (articulos_valor, "articulo_id", "disponible", "vendido"),
+    "recuperacion_empeño": (articulos_valor, "articulo_id", "empeño", "recuperado"),
+}
+
+async def cambiar_estado(tipo: str, datos) -> bool:
+    """
+    Aplica el cambio de estado del bien con un UPDATE condicionado al estado
+    requerido, dentro de la transacción en curso. Devuelve False si el bien ya
+    no estaba en ese estado (por ejemplo, otro vendedor lo vendió primero).
+    """
+    if tipo not in CAMBIOS_ESTADO:
+        return True
+    tabla, columna, requerido, nuevo = CAMBIOS_ESTADO[tipo]
+    if not datos[columna]:
+        return True
+    query = tabla.update().where(
+        (tabla.c.id == datos[columna]) & (tabla.c.estado == requerido)
+    ).values(estado=nuevo, version=tabla.c.version + 1)
+    return await execute_rowcount(query) == 1
+
+async def revertir_estado(tipo: str, datos):
+    """Devuelve el bien al estado anterior, solo si sigue en el estado que dejó la transacción"""
+    if tipo not in CAMBIOS_ESTADO:
+        return
+    tabla, columna, anterior, actual = CAMBIOS_ESTADO[tipo]
+    if not datos[columna]:
+        return
+    query = tabla.update().where(
+        (tabla.c.id == datos[columna]) & (tabla.c.estado == actual)
+    ).values(estado=anterior, version=tabla.c.version + 1)
+    await execute_rowcount(query)
+
+def error_estado(tipo: str) -> HTTPException:
+    mensajes = {
+        "venta_vehiculo": "El vehículo no está disponible para venta",
+        "venta_articulo": "Solo se pueden vender artículos disponibles",
+        "recuperacion_empeño": "Solo se pueden recuperar artículos que estén en empeño",
+    }
+    return HTTPException(status_code=400, detail=mensajes[tipo])
+
 @router.post("/", response_model=dict)
 async def crear_transaccion(transaccion: TransaccionCreate, current_user: dict = Depends(get_current_user)):
     # Validar que se proporcione vehiculo_id o articulo_id según el tipo
@@ -117,27 +183,19 @@ async def crear_transaccion(transaccion: TransaccionCreate, current_user: dict =
         observaciones=transaccion.observaciones
     )
     
-    transaccion_id = await database.execute(insert_query)
+    # Cambio de estado, inserción y resumen diario en una sola transacción (un solo commit).
+    # El UPDATE condicionado al estado evita que dos ventas simultáneas del mismo bien
+    # pasen las dos: la segunda no modifica filas y se revierte todo.
+    async with database.transaction():
+        if not await cambiar_estado(transaccion.tipo, transaccion.dict()):
+            raise error_estado(transaccion.tipo)
+        transaccion_id = await database.execute(insert_query)
+        await aplicar_transaccion_por_id(transaccion_id)
     
-    # Actualizar estado del vehículo o artículo
     if transaccion.vehiculo_id and transaccion.tipo == "venta_vehiculo":
-        update_vehiculo = vehiculos.update().where(
-            vehiculos.c.id == transaccion.vehiculo_id
-        ).values(estado="vendido")
-        await database.execute(update_vehiculo)
-    
+        inventario_cache.bump()
     if transaccion.articulo_id:
-        nuevo_estado = None
-        if transaccion.tipo == "venta_articulo":
-            nuevo_estado = "vendido"
-        elif transaccion.tipo == "recuperacion_empeño":
-            nuevo_estado = "recuperado"  # El cliente pagó y se llevó el artículo
-        
-        if nuevo_estado:
-            update_articulo = articulos_valor.update().where(
-                articulos_valor.c.id == transaccion.articulo_id
-            ).values(estado=nuevo_estado)
-            await database.execute(update_articulo)
+        empenos_cache.bump()
     
     return {
         "message": "Transacción registrada exitosamente",
@@ -145,17 +203,25 @@ async def crear_transaccion(transaccion: TransaccionCreate, current_user: dict =
         "ganancia": ganancia
     }
 
-@router.get("/", response_model=List[dict])
-async def obtener_transacciones(
-    skip: int = 0, 
-    limit: int = 100,
-    tipo: Optional[str] = None,
-    sede_id: Optional[int] = None,
-    usuario_id: Optional[int] = None,
-    current_user: dict = Depends(get_current_user)
-):
-    # Construir query básica
-    query = transacciones.select()
+def consulta_transacciones(tipo: Optional[str], sede_id: Optional[int], usuario_id: Optional[int], current_user: dict):
+    """
+    Consulta base del listado y la exportación, con los filtros y el alcance por rol.
+    Una sola consulta: los datos de vehículo y artículo llegan por LEFT JOIN,
+    los nombres de usuario salen del caché en memoria.
+    """
+    query = select(
+        transacciones,
+        vehiculos.c.id.label("vehiculo_encontrado"),
+        vehiculos.c.marca.label("vehiculo_marca"),
+        vehiculos.c.modelo.label("vehiculo_modelo"),
+        vehiculos.c.placa.label("vehiculo_placa"),
+        articulos_valor.c.id.label("articulo_encontrado"),
+        articulos_valor.c.descripcion.label("articulo_descripcion"),
+    ).select_from(
+        transacciones
+        .outerjoin(vehiculos, vehiculos.c.id == transacciones.c.vehiculo_id)
+        .outerjoin(articulos_valor, articulos_valor.c.id == transacciones.c.articulo_id)
+    )
     
     # Aplicar filtros
     if tipo:
@@ -172,39 +238,106 @@ async def obtener_transacciones(
     if current_user["rol"] == "vendedor":
         query = query.where(transacciones.c.usuario_id == current_user["id"])
     
-    # Ordenar y paginar
-    query = query.order_by(transacciones.c.fecha_transaccion.desc()).offset(skip).limit(limit)
+    return query
+
+def formatear_transaccion(row, usuarios_nombres: dict) -> dict:
+    transaccion_dict = dict(row)
+    transaccion_dict.pop("fecha_cursor", None)
+    vehiculo_encontrado = transaccion_dict.pop("vehiculo_encontrado")
+    marca = transaccion_dict.pop("vehiculo_marca")
+    modelo = transaccion_dict.pop("vehiculo_modelo")
+    placa = transaccion_dict.pop("vehiculo_placa")
+    articulo_encontrado = transaccion_dict.pop("articulo_encontrado")
+    descripcion = transaccion_dict.pop("articulo_descripcion")
+    
+    if vehiculo_encontrado is not None:
+        transaccion_dict["vehiculo_info"] = f"{marca} {modelo} - {placa}"
+    
+    if articulo_encontrado is not None:
+        transaccion_dict["articulo_info"] = descripcion
+    
+    usuario_nombre = usuarios_nombres.get(transaccion_dict["usuario_id"])
+    if usuario_nombre is not None:
+        transaccion_dict["usuario_nombre"] = usuario_nombre
+    
+    return transaccion_dict
+
+@router.get("/", response_model=List[dict])
+async def obtener_transacciones(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    tipo: Optional[str] = None,
+    sede_id: Optional[int] = None,
+    usuario_id: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Lista las transacciones de la más reciente a la más antigua.
+    Con cursor (el valor del encabezado X-Next-Cursor de la página anterior) se
+    pagina por (fecha_transaccion, id), con costo constante en páginas profundas y
+    sin filas repetidas si entran ventas nuevas. skip/limit siguen funcionando.
+    """
+    # La fecha del cursor se toma como texto del valor guardado, sin perder precisión
+    query = consulta_transacciones(tipo, sede_id, usuario_id, current_user).add_columns(
+        cast(transacciones.c.fecha_transaccion, String).label("fecha_cursor")
+    )
+    
+    if cursor:
+        # Se compara contra el valor guardado con la misma precisión con que se leyó
+        fecha_cursor, id_cursor = decode_cursor(cursor)
+        fecha_cursor = literal(fecha_cursor, String)
+        query = query.where(or_(
+            transacciones.c.fecha_transaccion < fecha_cursor,
+            and_(transacciones.c.fecha_transaccion == fecha_cursor, transacciones.c.id < id_cursor)
+        ))
+    
+    # Ordenar y paginar (se pide una fila extra para saber si hay página siguiente)
+    query = query.order_by(transacciones.c.fecha_transaccion.desc(), transacciones.c.id.desc())
+    if not cursor:
+        query = query.offset(skip)
+    query = query.limit(limit + 1)
     
     result = await database.fetch_all(query)
+    usuarios_nombres = await get_usuarios_nombres()
+    if len(result) > limit:
+        result = result[:limit]
+        ultima = result[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(ultima["fecha_cursor"], ultima["id"])
     
-    # Convertir a lista de diccionarios
-    transacciones_list = []
-    for row in result:
-        transaccion_dict = dict(row)
-        
-        # Obtener información adicional del vehículo o artículo
-        if transaccion_dict["vehiculo_id"]:
-            vehiculo_query = vehiculos.select().where(vehiculos.c.id == transaccion_dict["vehiculo_id"])
-            vehiculo = await database.fetch_one(vehiculo_query)
-            if vehiculo:
-                transaccion_dict["vehiculo_info"] = f"{vehiculo['marca']} {vehiculo['modelo']} - {vehiculo['placa']}"
-        
-        if transaccion_dict["articulo_id"]:
-            articulo_query = articulos_valor.select().where(articulos_valor.c.id == transaccion_dict["articulo_id"])
-            articulo = await database.fetch_one(articulo_query)
-            if articulo:
-                transaccion_dict["articulo_info"] = articulo["descripcion"]
-        
-        # Obtener nombre del usuario
-        from models import usuarios
-        usuario_query = usuarios.select().where(usuarios.c.id == transaccion_dict["usuario_id"])
-        usuario = await database.fetch_one(usuario_query)
-        if usuario:
-            transaccion_dict["usuario_nombre"] = usuario["nombre"]
-        
-        transacciones_list.append(transaccion_dict)
+    return [formatear_transaccion(row, usuarios_nombres) for row in result]
+
+# Columnas de la exportación, en orden
+COLUMNAS_EXPORTACION = [c.name for c in transacciones.columns] + ["vehiculo_info", "articulo_info", "usuario_nombre"]
+
+@router.get("/export")
+async def exportar_transacciones(
+    formato: str = Query("csv", alias="format", description="csv o ndjson"),
+    tipo: Optional[str] = None,
+    sede_id: Optional[int] = None,
+    usuario_id: Optional[int] = None,
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Exporta las transacciones (con los mismos filtros y alcance por rol que el
+    listado, más un rango de fechas inclusivo) en CSV o NDJSON. Las filas se
+    envían a medida que se leen de la base, sin límite de cantidad.
+    """
+    validar_formato(formato)
+    query = consulta_transacciones(tipo, sede_id, usuario_id, current_user)
+    if fecha_inicio:
+        query = query.where(transacciones.c.fecha_transaccion >= datetime.combine(fecha_inicio, time.min))
+    if fecha_fin:
+        query = query.where(transacciones.c.fecha_transaccion < datetime.combine(fecha_fin + timedelta(days=1), time.min))
+    query = query.order_by(transacciones.c.fecha_transaccion.desc(), transacciones.c.id.desc())
     
-    return transacciones_list
+    # Los nombres se cargan antes de empezar a leer las filas
+    usuarios_nombres = await get_usuarios_nombres()
+    filas = (formatear_transaccion(row, usuarios_nombres) async for row in database.iterate(query))
+    return respuesta_exportacion(filas, COLUMNAS_EXPORTACION, formato, "transacciones")
 
 @router.get("/estadisticas")
 async def obtener_estadisticas_transacciones(
@@ -213,58 +346,57 @@ async def obtener_estadisticas_transacciones(
     sede_id: Optional[int] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    # Construir query básica
-    query = transacciones.select()
+    # Agregados leídos del resumen diario: el costo depende de los días del rango,
+    # no de la cantidad de transacciones. Las fechas son inclusivas (día completo).
+    query = select(
+        transacciones_diarias.c.tipo,
+        func.sum(transacciones_diarias.c.cantidad).label("cantidad"),
+        func.coalesce(func.sum(transacciones_diarias.c.total_ventas), 0).label("total_ventas"),
+        func.coalesce(func.sum(transacciones_diarias.c.total_ganancias), 0).label("total_ganancias"),
+    ).group_by(transacciones_diarias.c.tipo).order_by(transacciones_diarias.c.tipo)
     
     # Aplicar filtros
     if fecha_inicio:
-        query = query.where(transacciones.c.fecha_transaccion >= fecha_inicio)
+        query = query.where(transacciones_diarias.c.fecha >= fecha_inicio)
     
     if fecha_fin:
-        query = query.where(transacciones.c.fecha_transaccion <= fecha_fin)
+        query = query.where(transacciones_diarias.c.fecha <= fecha_fin)
     
     if sede_id:
-        query = query.where(transacciones.c.sede_id == sede_id)
+        query = query.where(transacciones_diarias.c.sede_id == sede_id)
     
     if current_user["rol"] == "vendedor":
-        query = query.where(transacciones.c.usuario_id == current_user["id"])
+        query = query.where(transacciones_diarias.c.usuario_id == current_user["id"])
     
     result = await database.fetch_all(query)
     
-    # Calcular estadísticas básicas
-    total_transacciones = len(result)
-    total_ventas = sum(float(row["precio_venta"]) for row in result)
-    total_ganancias = sum(float(row["ganancia"]) if row["ganancia"] else 0 for row in result)
-    ganancia_promedio = total_ganancias / total_transacciones if total_transacciones > 0 else 0
-    
     # Agrupar por tipo
-    por_tipo = {}
+    por_tipo = []
     for row in result:
-        tipo = row["tipo"]
-        if tipo not in por_tipo:
-            por_tipo[tipo] = {
-                "tipo": tipo,
-                "cantidad": 0,
-                "total_ventas": 0,
-                "total_ganancias": 0,
-                "ganancia_promedio": 0
-            }
-        
-        por_tipo[tipo]["cantidad"] += 1
-        por_tipo[tipo]["total_ventas"] += float(row["precio_venta"])
-        por_tipo[tipo]["total_ganancias"] += float(row["ganancia"]) if row["ganancia"] else 0
-    
-    # Calcular promedio por tipo
-    for tipo_data in por_tipo.values():
-        if tipo_data["cantidad"] > 0:
-            tipo_data["ganancia_promedio"] = tipo_data["total_ganancias"] / tipo_data["cantidad"]
+        cantidad = int(row["cantidad"])
+        if cantidad == 0:
+            continue
+        total_ganancias = float(row["total_ganancias"])
+        por_tipo.append({
+            "tipo": row["tipo"],
+            "cantidad": cantidad,
+            "total_ventas": float(row["total_ventas"]),
+            "total_ganancias": total_ganancias,
+            "ganancia_promedio": total_ganancias / cantidad
+        })
+    
+    # Totales generales a partir de los pocos grupos por tipo
+    total_transacciones = sum(tipo_data["cantidad"] for tipo_data in por_tipo)
+    total_ventas = sum(tipo_data["total_ventas"] for tipo_data in por_tipo)
+    total_ganancias = sum(tipo_data["total_ganancias"] for tipo_data in por_tipo)
+    ganancia_promedio = total_ganancias / total_transacciones if total_transacciones > 0 else 0
     
     return {
         "total_transacciones": total_transacciones,
         "total_ventas": total_ventas,
         "total_ganancias": total_ganancias,
         "ganancia_promedio": ganancia_promedio,
-        "por_tipo": list(por_tipo.values())
+        "por_tipo": por_tipo
     }
 
 @router.put("/{transaccion_id}", response_model=dict)
@@ -284,7 +416,7 @@ async def editar_transaccion(transaccion_id: int, transaccion: TransaccionCreate
     if transaccion.tipo in ["venta_vehiculo"] and not transaccion.vehiculo_id:
         raise HTTPException(status_code=400, detail="vehiculo_id es requerido para ventas de vehículos")
     
-    if transaccion.tipo in ["venta_articulo", "empeño_articulo", "recuperacion_empeño"] and not transaccion.articulo_id:
+    if transaccion.tipo in ["venta_articulo", "recuperacion_empeño"] and not transaccion.articulo_id:
         raise HTTPException(status_code=400, detail="articulo_id es requerido para transacciones de artículos")
     
     # Obtener información del vehículo o artículo
@@ -331,7 +463,30 @@ async def editar_transaccion(transaccion_id: int, transaccion: TransaccionCreate
         observaciones=transaccion.observaciones
     )
     
-    await database.execute(update_query)
+    # Si cambió el bien o el tipo, se revierte el estado del anterior y se aplica al
+    # nuevo con el mismo UPDATE condicionado; todo en una sola transacción junto con
+    # el reemplazo de la fila en el resumen diario
+    nuevos_datos = transaccion.dict()
+    cambia_bien = any(
+        existing_transaccion[campo] != nuevos_datos[campo]
+        for campo in ("tipo", "vehiculo_id", "articulo_id")
+    )
+    async with database.transaction():
+        if cambia_bien:
+            await revertir_estado(existing_transaccion["tipo"], existing_transaccion)
+            if not await cambiar_estado(transaccion.tipo, nuevos_datos):
+                raise error_estado(transaccion.tipo)
+        await aplicar_transaccion(existing_transaccion, -1)
+        await database.execute(update_query)
+        await aplicar_transaccion_por_id(transaccion_id)
+    
+    if cambia_bien:
+        # El bien anterior y el nuevo pudieron cambiar de estado
+        bienes = (existing_transaccion, nuevos_datos)
+        if any(datos["vehiculo_id"] for datos in bienes):
+            inventario_cache.bump()
+        if any(datos["articulo_id"] for datos in bienes):
+            empenos_cache.bump()
     
     return {
         "message": "Transacción actualizada exitosamente",
@@ -352,32 +507,19 @@ async def eliminar_transaccion(transaccion_id: int, current_user: dict = Depends
     if not existing_transaccion:
         raise HTTPException(status_code=404, detail="Transacción no encontrada")
     
-    # Revertir el estado del vehículo o artículo si es necesario
-    if existing_transaccion["vehiculo_id"] and existing_transaccion["tipo"] == "venta_vehiculo":
-        # Revertir vehículo a disponible
-        update_vehiculo = vehiculos.update().where(
-            vehiculos.c.id == existing_transaccion["vehiculo_id"]
-        ).values(estado="disponible")
-        await database.execute(update_vehiculo)
+    async with database.transaction():
+        # Revertir el estado del vehículo o artículo si sigue como lo dejó la transacción
+        await revertir_estado(existing_transaccion["tipo"], existing_transaccion)
+        
+        # Eliminar la transacción
+        delete_query = transacciones.delete().where(transacciones.c.id == transaccion_id)
+        await database.execute(delete_query)
+        await aplicar_transaccion(existing_transaccion, -1)
     
+    if existing_transaccion["vehiculo_id"] and existing_transaccion["tipo"] == "venta_vehiculo":
+        inventario_cache.bump()
     if existing_transaccion["articulo_id"]:
-        # Determinar el estado anterior del artículo
-        estado_anterior = "disponible"  # Por defecto
-        if existing_transaccion["tipo"] == "venta_articulo":
-            estado_anterior = "disponible"  # Revertir a disponible
-        elif existing_transaccion["tipo"] == "empeño_articulo":
-            estado_anterior = "disponible"  # Revertir a disponible
-        elif existing_transaccion["tipo"] == "recuperacion_empeño":
-            estado_anterior = "empeño"  # Revertir a empeño
-        
-        update_articulo = articulos_valor.update().where(
-            articulos_valor.c.id == existing_transaccion["articulo_id"]
-        ).values(estado=estado_anterior)
-        await database.execute(update_articulo)
-    
-    # Eliminar la transacción
-    delete_query = transacciones.delete().where(transacciones.c.id == transaccion_id)
-    await database.execute(delete_query)
+        empenos_cache.bump()
     
     return {
         "message": "Transacción eliminada exitosamente",
@@ -1,19 +1,40 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from pydantic import BaseModel, EmailStr
 from typing import List
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import bcrypt
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from sqlalchemy import select, func
 from database import database
 from models import usuarios, RolEnum
+from cache import usuarios_nombres_cache, caches
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 SECRET_KEY = "your_secret_key_here"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# bcrypt tarda ~100-300 ms por llamada: se ejecuta en hilos propios para no frenar el event loop
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+password_metricas = {
+    "tareas": 0,
+    "pendientes": 0,
+    "espera_total_ms": 0.0,
+    "espera_max_ms": 0.0,
+    "ejecucion_total_ms": 0.0,
+}
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="usuarios/token")
 
+# Versión vigente de los tokens de cada usuario (id -> token_version).
+# Editar o eliminar un usuario incrementa su versión e invalida sus tokens al instante.
+token_versions = {}
+
 router = APIRouter()
 
 class UserBase(BaseModel):
@@ -41,6 +62,31 @@ def get_password_hash(password: str) -> str:
     salt = bcrypt.gensalt()
     return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
+async def run_password_task(func, *args):
+    """
+    Ejecuta una operación de bcrypt en el pool acotado (como mucho PASSWORD_WORKERS
+    a la vez) y registra cuánto esperó en cola y cuánto tardó.
+    """
+    def tarea():
+        inicio = time.perf_counter()
+        resultado = func(*args)
+        return resultado, inicio, time.perf_counter()
+
+    encolado = time.perf_counter()
+    password_metricas["pendientes"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        resultado, inicio, fin = await loop.run_in_executor(password_executor, tarea)
+    finally:
+        password_metricas["pendientes"] -= 1
+
+    espera_ms = (inicio - encolado) * 1000
+    password_metricas["tareas"] += 1
+    password_metricas["espera_total_ms"] += espera_ms
+    password_metricas["espera_max_ms"] = max(password_metricas["espera_max_ms"], espera_ms)
+    password_metricas["ejecucion_total_ms"] += (fin - inicio) * 1000
+    return resultado
+
 async def get_user_by_email(email: str):
     query = usuarios.select().where(usuarios.c.correo == email)
     user = await database.fetch_one(query)
@@ -50,10 +96,32 @@ async def authenticate_user(email: str, password: str):
     user = await get_user_by_email(email)
     if not user:
         return False
-    if not verify_password(password, user["contrasena"]):
+    if not await run_password_task(verify_password, password, user["contrasena"]):
         return False
     return user
 
+async def load_token_versions():
+    rows = await database.fetch_all(select(usuarios.c.id, usuarios.c.token_version))
+    token_versions.clear()
+    token_versions.update({row["id"]: row["token_version"] or 0 for row in rows})
+
+async def get_token_version(user_id: int):
+    version = token_versions.get(user_id)
+    if version is None:
+        # Usuario creado después de cargar el mapa
+        query = select(func.coalesce(usuarios.c.token_version, 0)).where(usuarios.c.id == user_id)
+        version = await database.fetch_val(query)
+        if version is not None:
+            token_versions[user_id] = version
+    return version
+
+async def get_usuarios_nombres() -> dict:
+    """Mapa id -> nombre de los usuarios, servido desde memoria"""
+    async def cargar():
+        rows = await database.fetch_all(select(usuarios.c.id, usuarios.c.nombre))
+        return {row["id"]: row["nombre"] for row in rows}
+    return await usuarios_nombres_cache.get("todos", cargar)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -74,24 +142,41 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = await get_user_by_email(email)
-    if user is None:
+    
+    user_id = payload.get("id")
+    if user_id is None:
+        # Tokens emitidos antes de incluir los datos del usuario en los claims
+        user = await get_user_by_email(email)
+        if user is None:
+            raise credentials_exception
+        return user
+    
+    # Los datos del usuario vienen en el token: no hace falta consultar la base
+    if payload.get("ver") != await get_token_version(user_id):
         raise credentials_exception
-    return user
+    return {
+        "id": user_id,
+        "correo": email,
+        "nombre": payload.get("nombre"),
+        "rol": payload.get("rol"),
+    }
 
 @router.post("/register", response_model=UserOut)
 async def register_user(user: UserCreate):
     existing_user = await get_user_by_email(user.correo)
     if existing_user:
         raise HTTPException(status_code=400, detail="Correo ya registrado")
-    hashed_password = get_password_hash(user.contrasena)
+    hashed_password = await run_password_task(get_password_hash, user.contrasena)
     query = usuarios.insert().values(
         nombre=user.nombre,
         correo=user.correo,
         contrasena=hashed_password,
-        rol=user.rol
+        rol=user.rol,
+        token_version=0
     )
     user_id = await database.execute(query)
+    token_versions[user_id] = 0
+    usuarios_nombres_cache.invalidate()
     return {**user.dict(), "id": user_id, "fecha_creacion": datetime.utcnow()}
 
 @router.post("/token", response_model=Token)
@@ -103,12 +188,41 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             detail="Correo o contraseña incorrectos",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data={"sub": user["correo"]})
+    rol = user["rol"]
+    access_token = create_access_token(data={
+        "sub": user["correo"],
+        "id": user["id"],
+        "nombre": user["nombre"],
+        "rol": rol.value if isinstance(rol, RolEnum) else rol,
+        "ver": user["token_version"] or 0,
+    })
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserOut)
 async def read_users_me(current_user: dict = Depends(get_current_user)):
-    return current_user
+    # fecha_creacion no viaja en el token
+    user = await database.fetch_one(usuarios.select().where(usuarios.c.id == current_user["id"]))
+    if user is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    return user
+
+@router.get("/metricas/password")
+async def get_password_metricas(current_user: dict = Depends(get_current_user)):
+    if current_user["rol"] != "administrador":
+        raise HTTPException(status_code=403, detail="No tienes permisos para ver métricas")
+    tareas = password_metricas["tareas"]
+    return {
+        **password_metricas,
+        "workers": PASSWORD_WORKERS,
+        "espera_promedio_ms": password_metricas["espera_total_ms"] / tareas if tareas else 0,
+        "ejecucion_promedio_ms": password_metricas["ejecucion_total_ms"] / tareas if tareas else 0,
+    }
+
+@router.get("/metricas/cache")
+async def get_cache_metricas(current_user: dict = Depends(get_current_user)):
+    if current_user["rol"] != "administrador":
+        raise HTTPException(status_code=403, detail="No tienes permisos para ver métricas")
+    return [cache.stats() for cache in caches]
 
 @router.get("/", response_model=List[UserOut])
 async def get_users(current_user: dict = Depends(get_current_user)):
@@ -123,8 +237,18 @@ async def update_user(user_id: int, user_data: dict, current_user: dict = Depend
     if current_user["rol"] != "administrador":
         raise HTTPException(status_code=403, detail="No tienes permisos para editar usuarios")
     
-    query = usuarios.update().where(usuarios.c.id == user_id).values(**user_data)
+    user_data = {k: v for k, v in user_data.items() if k not in ("id", "token_version")}
+    if user_data.get("contrasena"):
+        user_data["contrasena"] = await run_password_task(get_password_hash, user_data["contrasena"])
+    
+    # Invalidar los tokens emitidos con los datos anteriores (rol, nombre, contraseña)
+    query = usuarios.update().where(usuarios.c.id == user_id).values(
+        **user_data,
+        token_version=func.coalesce(usuarios.c.token_version, 0) + 1
+    )
     await database.execute(query)
+    token_versions.pop(user_id, None)
+    usuarios_nombres_cache.invalidate()
     return {"message": "Usuario actualizado exitosamente"}
 
 @router.delete("/{user_id}")
@@ -134,4 +258,6 @@ async def delete_user(user_id: int, current_user: dict = Depends(get_current_use
     
     query = usuarios.delete().where(usuarios.c.id == user_id)
     await database.execute(query)
+    token_versions.pop(user_id, None)
+    usuarios_nombres_cache.invalidate()
     return {"message": "Usuario eliminado exitosamente"}
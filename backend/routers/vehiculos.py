@@ -1,10 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, status, Query, UploadFile, File, Form, Request, Response, BackgroundTasks
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from datetime import date, datetime
 import base64
-from database import database
+import csv
+import io
+import json
+from sqlalchemy import select, func, and_, or_
+from database import database, execute_rowcount, insertar_filas
 from models import vehiculos, vehiculos_media, transacciones, EstadoVehiculoEnum, TipoTransaccionEnum
+from media_storage import save_upload, release_blob, blob_response, legacy_response, etag_matches, url_versionada
+from cache import inventario_cache, empenos_cache
+from rollup_transacciones import aplicar_transaccion_por_id
+from media_variants import VARIANTES, crear_variantes_seguro, obtener_variante, formato_preferido
+from intereses import calcular_portafolio
+from versiones import MENSAJE_CONFLICTO, versiones_if_match, verificar_version, condicion_version, actualizar_con_version, agregar_etag
+from exportacion import validar_formato, respuesta_exportacion
+from routers.usuarios import get_current_user
+from abonos import SALDO_INICIAL, estado_cuenta, registrar_abono, listar_abonos
 
 router = APIRouter()
 
@@ -31,13 +44,19 @@ class VehiculoUpdate(VehiculoBase):
 class VehiculoOut(VehiculoBase):
     id: int
     destacado: Optional[bool] = False
+    version: Optional[int] = None
+
+class VehiculoCatalogoOut(VehiculoOut):
+    imagen_principal_url: Optional[str] = None
 
 class MediaOut(BaseModel):
     id: int
     vehiculo_id: int
     archivo: str
-    archivo_data: Optional[str] = None
+    url: str  # Ruta del endpoint que sirve el archivo binario
     tipo: str  # 'imagen' o 'video'
+    mime: Optional[str] = None
+    tamano: Optional[int] = None
     es_principal: bool
     titulo: Optional[str] = None
     orden: int
@@ -47,15 +66,38 @@ class ImagenOut(BaseModel):
     id: int
     vehiculo_id: int
     imagen: str
-    imagen_data: Optional[str] = None
+    url: str
     es_principal: bool
 
+def media_url(vehiculo_id: int, media_id: int, sha256: Optional[str] = None, size: Optional[str] = None) -> str:
+    return url_versionada(f"/vehiculos/{vehiculo_id}/media/{media_id}/raw", sha256, size=size)
+
+# Columnas de metadatos: los listados nunca leen el contenido de los archivos
+MEDIA_COLUMNS = [
+    vehiculos_media.c.id,
+    vehiculos_media.c.vehiculo_id,
+    vehiculos_media.c.archivo,
+    vehiculos_media.c.tipo,
+    vehiculos_media.c.mime,
+    vehiculos_media.c.tamano,
+    vehiculos_media.c.sha256,
+    vehiculos_media.c.es_principal,
+    vehiculos_media.c.titulo,
+    vehiculos_media.c.orden,
+]
+
 @router.post("/", response_model=VehiculoOut, status_code=status.HTTP_201_CREATED)
-async def create_vehiculo(vehiculo: VehiculoCreate):
+async def create_vehiculo(vehiculo: VehiculoCreate, response: Response):
     try:
         query = vehiculos.insert().values(**vehiculo.dict())
         vehiculo_id = await database.execute(query)
-        return {**vehiculo.dict(), "id": vehiculo_id}
+        inventario_cache.bump()
+        empenos_cache.bump()
+        # La versión inicial la pone la base; se devuelve con su ETag para poder usar If-Match
+        version = await database.fetch_val(select(vehiculos.c.version).where(vehiculos.c.id == vehiculo_id))
+        creado = {**vehiculo.dict(), "id": vehiculo_id, "version": version}
+        agregar_etag(response, "vehiculo", creado)
+        return creado
     except Exception as e:
         if "Duplicate entry" in str(e) and "placa" in str(e):
             raise HTTPException(
@@ -68,54 +110,411 @@ async def create_vehiculo(vehiculo: VehiculoCreate):
                 detail=f"Error al crear el vehículo: {str(e)}"
             )
 
-@router.get("/", response_model=List[VehiculoOut])
-async def read_vehiculos(
+# Carga masiva: filas por transacción y máximo de filas por solicitud
+BULK_LOTE = 500
+BULK_MAX_FILAS = 5000
+
+def leer_filas_bulk(contenido: bytes, content_type: str) -> List[dict]:
+    """Filas de un CSV (con encabezados) o de un arreglo JSON de objetos"""
+    try:
+        if "csv" in content_type:
+            lector = csv.DictReader(io.StringIO(contenido.decode("utf-8-sig")))
+            # Las celdas vacías se omiten para que apliquen los valores por defecto
+            return [{k.strip(): v.strip() for k, v in fila.items() if k and v and v.strip()} for fila in lector]
+        filas = json.loads(contenido)
+    except (UnicodeDecodeError, ValueError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"No se pudo leer el archivo: {str(e)}")
+    if not isinstance(filas, list) or not all(isinstance(fila, dict) for fila in filas):
+        raise HTTPException(status_code=400, detail="Se esperaba un arreglo JSON de vehículos")
+    return filas
+
+async def placas_existentes(placas: List[str]) -> set:
+    existentes = set()
+    for i in range(0, len(placas), BULK_LOTE):
+        query = select(vehiculos.c.placa).where(vehiculos.c.placa.in_(placas[i:i + BULK_LOTE]))
+        existentes.update(row["placa"] for row in await database.fetch_all(query))
+    return existentes
+
+@router.post("/bulk", response_model=dict)
+async def create_vehiculos_bulk(request: Request):
+    """
+    Carga masiva de vehículos desde un CSV (Content-Type text/csv, con los
+    nombres de campo de VehiculoCreate como encabezados) o un arreglo JSON.
+    Cada fila se valida por separado; las válidas se insertan por lotes, cada
+    lote en su propia transacción. Devuelve el resultado de cada fila (el id
+    solo se informa para las filas con placa).
+    """
+    filas = leer_filas_bulk(await request.body(), request.headers.get("content-type", ""))
+    if len(filas) > BULK_MAX_FILAS:
+        raise HTTPException(status_code=400, detail=f"Máximo {BULK_MAX_FILAS} vehículos por carga")
+
+    reporte = []
+    validos = []  # (posición en el reporte, vehículo)
+    for numero, fila in enumerate(filas, start=1):
+        try:
+            vehiculo = VehiculoCreate(**fila)
+        except ValidationError as e:
+            errores = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+            reporte.append({"fila": numero, "ok": False, "placa": fila.get("placa"), "error": errores})
+            continue
+        reporte.append({"fila": numero, "ok": True, "placa": vehiculo.placa, "id": None})
+        validos.append((len(reporte) - 1, vehiculo))
+
+    # Placas repetidas en la base o dentro del mismo archivo, con una sola consulta
+    existentes = await placas_existentes([v.placa for _, v in validos if v.placa])
+    vistas = set()
+    por_insertar = []
+    for posicion, vehiculo in validos:
+        if vehiculo.placa in existentes or vehiculo.placa in vistas:
+            reporte[posicion].update(ok=False, error=f"Ya existe un vehículo con la placa '{vehiculo.placa}'")
+            continue
+        if vehiculo.placa:
+            vistas.add(vehiculo.placa)
+        por_insertar.append((posicion, vehiculo))
+
+    insertados = 0
+    for i in range(0, len(por_insertar), BULK_LOTE):
+        lote = por_insertar[i:i + BULK_LOTE]
+        try:
+            async with database.transaction():
+                await insertar_filas(vehiculos, [v.dict() for _, v in lote])
+        except Exception as e:
+            for posicion, _ in lote:
+                reporte[posicion].update(ok=False, error=f"Error al crear el vehículo: {str(e)}")
+            continue
+        insertados += len(lote)
+        placas = [v.placa for _, v in lote if v.placa]
+        if placas:
+            query = select(vehiculos.c.id, vehiculos.c.placa).where(vehiculos.c.placa.in_(placas))
+            ids = {row["placa"]: row["id"] for row in await database.fetch_all(query)}
+            for posicion, vehiculo in lote:
+                reporte[posicion]["id"] = ids.get(vehiculo.placa)
+
+    if insertados:
+        inventario_cache.bump()
+        empenos_cache.bump()
+
+    return {
+        "total": len(filas),
+        "insertados": insertados,
+        "errores": len(filas) - insertados,
+        "filas": reporte,
+    }
+
+# Ordenamientos del listado: (columna, descendente). El id desempata y permite paginar por cursor
+ORDEN_VEHICULOS = {
+    "id": (vehiculos.c.id, False),
+    "recientes": (vehiculos.c.id, True),
+    "precio_asc": (vehiculos.c.precio_venta, False),
+    "precio_desc": (vehiculos.c.precio_venta, True),
+    "marca": (vehiculos.c.marca, False),
+    "soat": (vehiculos.c.soat_vencimiento, False),
+    "tecno": (vehiculos.c.tecno_vencimiento, False),
+}
+
+def encode_cursor(orden: str, valor, vehiculo_id: int) -> str:
+    """Cursor opaco con la posición (valor de orden, id) del último vehículo entregado"""
+    data = json.dumps({"o": orden, "v": None if valor is None else str(valor), "id": vehiculo_id})
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str, orden: str):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if data["o"] != orden:
+            raise ValueError("El cursor pertenece a otro orden")
+        valor = data["v"]
+        if valor is not None:
+            tipo = ORDEN_VEHICULOS[orden][0].type.python_type
+            valor = date.fromisoformat(valor) if tipo is date else tipo(valor)
+        return valor, int(data["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def condicion_cursor(columna, descendente: bool, valor, ultimo_id: int):
+    """
+    Filas que van después de (valor, ultimo_id). SQLite y MySQL ordenan los NULL
+    primero en ASC y al final en DESC, por eso se tratan aparte.
+    """
+    if descendente:
+        if valor is None:
+            return and_(columna.is_(None), vehiculos.c.id < ultimo_id)
+        return or_(columna < valor, columna.is_(None), and_(columna == valor, vehiculos.c.id < ultimo_id))
+    if valor is None:
+        return or_(columna.isnot(None), and_(columna.is_(None), vehiculos.c.id > ultimo_id))
+    return or_(columna > valor, and_(columna == valor, vehiculos.c.id > ultimo_id))
+
+def filtros_vehiculos(
     sede_id: Optional[int] = Query(None),
-    estado: Optional[EstadoVehiculoEnum] = Query(None)
-):
-    query = vehiculos.select()
+    estado: Optional[EstadoVehiculoEnum] = Query(None),
+    marca: Optional[str] = Query(None),
+    modelo: Optional[str] = Query(None),
+    cilindraje: Optional[str] = Query(None),
+    color: Optional[str] = Query(None),
+    precio_min: Optional[float] = Query(None, ge=0),
+    precio_max: Optional[float] = Query(None, ge=0),
+    soat_desde: Optional[date] = Query(None),
+    soat_hasta: Optional[date] = Query(None),
+    tecno_desde: Optional[date] = Query(None),
+    tecno_hasta: Optional[date] = Query(None),
+    q: Optional[str] = Query(None, description="Texto libre en marca, modelo, placa o color")
+) -> list:
+    """Condiciones de los filtros del listado y la exportación de vehículos"""
+    condiciones = []
     if sede_id is not None:
-        query = query.where(vehiculos.c.sede_id == sede_id)
+        condiciones.append(vehiculos.c.sede_id == sede_id)
     if estado is not None:
-        query = query.where(vehiculos.c.estado == estado)
-    result = await database.fetch_all(query)
+        condiciones.append(vehiculos.c.estado == estado)
+    if marca:
+        condiciones.append(vehiculos.c.marca == marca)
+    if modelo:
+        condiciones.append(vehiculos.c.modelo == modelo)
+    if cilindraje:
+        condiciones.append(vehiculos.c.cilindraje == cilindraje)
+    if color:
+        condiciones.append(vehiculos.c.color == color)
+    if precio_min is not None:
+        condiciones.append(vehiculos.c.precio_venta >= precio_min)
+    if precio_max is not None:
+        condiciones.append(vehiculos.c.precio_venta <= precio_max)
+    if soat_desde is not None:
+        condiciones.append(vehiculos.c.soat_vencimiento >= soat_desde)
+    if soat_hasta is not None:
+        condiciones.append(vehiculos.c.soat_vencimiento <= soat_hasta)
+    if tecno_desde is not None:
+        condiciones.append(vehiculos.c.tecno_vencimiento >= tecno_desde)
+    if tecno_hasta is not None:
+        condiciones.append(vehiculos.c.tecno_vencimiento <= tecno_hasta)
+    if q:
+        patron = f"%{q.strip()}%"
+        condiciones.append(or_(
+            vehiculos.c.marca.like(patron),
+            vehiculos.c.modelo.like(patron),
+            vehiculos.c.placa.like(patron),
+            vehiculos.c.color.like(patron)
+        ))
+    return condiciones
+
+def validar_orden(orden: str):
+    if orden not in ORDEN_VEHICULOS:
+        raise HTTPException(status_code=400, detail=f"Orden no soportado. Opciones: {', '.join(ORDEN_VEHICULOS)}")
+
+def ordenar_vehiculos(query, orden: str):
+    columna, descendente = ORDEN_VEHICULOS[orden]
+    if descendente:
+        return query.order_by(columna.desc(), vehiculos.c.id.desc())
+    return query.order_by(columna.asc(), vehiculos.c.id.asc())
+
+@router.get("/", response_model=List[VehiculoOut])
+async def read_vehiculos(
+    response: Response,
+    condiciones: list = Depends(filtros_vehiculos),
+    orden: str = Query("id"),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = Query(None)
+):
+    """
+    Lista vehículos filtrados y ordenados en la base de datos.
+    El total que cumple los filtros va en el encabezado X-Total-Count. Con limit,
+    el encabezado X-Next-Cursor trae el cursor de la página siguiente. Sin limit
+    se devuelven todos los resultados, como antes.
+    """
+    validar_orden(orden)
+    
+    total = await database.fetch_val(select(func.count()).select_from(vehiculos).where(and_(True, *condiciones)))
+    response.headers["X-Total-Count"] = str(total)
+    
+    columna, descendente = ORDEN_VEHICULOS[orden]
+    query = vehiculos.select().where(and_(True, *condiciones))
+    if cursor:
+        valor, ultimo_id = decode_cursor(cursor, orden)
+        query = query.where(condicion_cursor(columna, descendente, valor, ultimo_id))
+    query = ordenar_vehiculos(query, orden)
+    
+    if limit is None:
+        return await database.fetch_all(query)
+    
+    # Se pide una fila extra para saber si hay página siguiente
+    result = await database.fetch_all(query.limit(limit + 1))
+    if len(result) > limit:
+        result = result[:limit]
+        ultima = result[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(orden, ultima[columna.name], ultima.id)
     return result
 
+@router.get("/export")
+async def exportar_vehiculos(
+    formato: str = Query("csv", alias="format", description="csv o ndjson"),
+    condiciones: list = Depends(filtros_vehiculos),
+    orden: str = Query("id"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Exporta los vehículos que cumplen los filtros del listado en CSV o NDJSON.
+    Las filas se envían a medida que se leen de la base.
+    """
+    validar_formato(formato)
+    validar_orden(orden)
+    query = ordenar_vehiculos(vehiculos.select().where(and_(True, *condiciones)), orden)
+    filas = (dict(row) async for row in database.iterate(query))
+    return respuesta_exportacion(filas, [c.name for c in vehiculos.columns], formato, "vehiculos")
+
+# Máximo de vehículos destacados en la página de inicio
+MAX_DESTACADOS = 6
+
+@router.get("/destacados", response_model=List[VehiculoCatalogoOut])
+async def get_vehiculos_destacados(request: Request, response: Response):
+    """
+    Vehículos destacados, visibles y disponibles con la url de su imagen principal.
+    La lista se calcula una vez por versión del inventario y se sirve desde memoria.
+    """
+    etag = f'"destacados-{inventario_cache.version}"'
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    destacados, _ = await inventario_cache.get(
+        ("destacados",),
+        lambda: consultar_catalogo_publico("principal_media", "id", 0, MAX_DESTACADOS, solo_destacados=True)
+    )
+    response.headers.update(headers)
+    return destacados
+
 @router.get("/{vehiculo_id}", response_model=VehiculoOut)
-async def read_vehiculo(vehiculo_id: int):
+async def read_vehiculo(vehiculo_id: int, response: Response):
     query = vehiculos.select().where(vehiculos.c.id == vehiculo_id)
     vehiculo = await database.fetch_one(query)
     if vehiculo is None:
         raise HTTPException(status_code=404, detail="Vehículo no encontrado")
+    agregar_etag(response, "vehiculo", vehiculo)
     return vehiculo
 
 @router.put("/{vehiculo_id}", response_model=VehiculoOut)
-async def update_vehiculo(vehiculo_id: int, vehiculo: VehiculoUpdate):
-    query = vehiculos.update().where(vehiculos.c.id == vehiculo_id).values(**vehiculo.dict(exclude_unset=True))
-    await database.execute(query)
+async def update_vehiculo(vehiculo_id: int, vehiculo: VehiculoUpdate, request: Request, response: Response):
+    """
+    Actualiza el vehículo. Con If-Match (ETag del GET) solo se guarda si nadie
+    lo modificó desde entonces; si no, responde 412.
+    """
+    versiones = versiones_if_match(request, "vehiculo", vehiculo_id)
+    await actualizar_con_version("vehiculo", vehiculo_id, versiones, vehiculo.dict(exclude_unset=True))
+    inventario_cache.bump()
+    empenos_cache.bump()
     updated = await database.fetch_one(vehiculos.select().where(vehiculos.c.id == vehiculo_id))
     if updated is None:
         raise HTTPException(status_code=404, detail="Vehículo no encontrado")
+    agregar_etag(response, "vehiculo", updated)
     return updated
 
 @router.delete("/{vehiculo_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_vehiculo(vehiculo_id: int):
-    query = vehiculos.delete().where(vehiculos.c.id == vehiculo_id)
-    await database.execute(query)
+    async with database.transaction():
+        media = await database.fetch_all(
+            select(vehiculos_media.c.ruta).where(vehiculos_media.c.vehiculo_id == vehiculo_id)
+        )
+        await database.execute(vehiculos_media.delete().where(vehiculos_media.c.vehiculo_id == vehiculo_id))
+        await database.execute(vehiculos.delete().where(vehiculos.c.id == vehiculo_id))
+    inventario_cache.bump()
+    empenos_cache.bump()
+    
+    # Liberar los blobs (y sus variantes) que ya no use ningún otro registro
+    for ruta in {row["ruta"] for row in media}:
+        await release_blob(ruta)
     return
 
+# Ordenamientos permitidos en el catálogo público
+ORDEN_CATALOGO = {
+    "id": [vehiculos.c.id],
+    "recientes": [vehiculos.c.id.desc()],
+    "precio_asc": [vehiculos.c.precio_venta.asc(), vehiculos.c.id],
+    "precio_desc": [vehiculos.c.precio_venta.desc(), vehiculos.c.id],
+    "marca": [vehiculos.c.marca, vehiculos.c.modelo, vehiculos.c.id],
+}
+
 # Endpoint específico para obtener vehículos visibles en el catálogo público
-@router.get("/catalogo/publico", response_model=List[VehiculoOut])
-async def get_vehiculos_catalogo_publico():
+@router.get("/catalogo/publico", response_model=List[VehiculoCatalogoOut])
+async def get_vehiculos_catalogo_publico(
+    request: Request,
+    response: Response,
+    include: Optional[str] = Query(None, description="Usar 'principal_media' para incluir la url de la imagen principal"),
+    orden: str = Query("id"),
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=200)
+):
     """
-    Obtiene solo los vehículos que están disponibles y visibles en el catálogo público
+    Obtiene solo los vehículos que están disponibles y visibles en el catálogo público.
+    Con include=principal_media la imagen principal se obtiene en la misma consulta.
+    El total de vehículos (sin paginar) se devuelve en el encabezado X-Total-Count.
+    La respuesta se guarda en memoria hasta la siguiente escritura de vehículos
+    y lleva un ETag con la versión del inventario para responder 304.
     """
-    query = vehiculos.select().where(
+    if include not in (None, "principal_media"):
+        raise HTTPException(status_code=400, detail="Valor de include no soportado")
+    if orden not in ORDEN_CATALOGO:
+        raise HTTPException(status_code=400, detail=f"Orden no soportado. Opciones: {', '.join(ORDEN_CATALOGO)}")
+    
+    etag = f'"catalogo-{inventario_cache.version}"'
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    catalogo, total = await inventario_cache.get(
+        ("catalogo", include, orden, skip, limit),
+        lambda: consultar_catalogo_publico(include, orden, skip, limit)
+    )
+    response.headers.update(headers)
+    response.headers["X-Total-Count"] = str(total)
+    return catalogo
+
+async def consultar_catalogo_publico(include: Optional[str], orden: str, skip: int, limit: Optional[int],
+                                     solo_destacados: bool = False):
+    """Consulta el catálogo público y devuelve (vehículos, total sin paginar)"""
+    condicion = (
         (vehiculos.c.estado == EstadoVehiculoEnum.disponible) &
         (vehiculos.c.visible_catalogo == 1)
     )
+    if solo_destacados:
+        condicion = condicion & (vehiculos.c.destacado == 1)
+    
+    if include == "principal_media":
+        # Una imagen principal por vehículo (la de menor id si hubiera varias marcadas)
+        principal = (
+            select(
+                vehiculos_media.c.vehiculo_id,
+                func.min(vehiculos_media.c.id).label("media_id")
+            )
+            .where((vehiculos_media.c.es_principal == 1) & (vehiculos_media.c.tipo == "imagen"))
+            .group_by(vehiculos_media.c.vehiculo_id)
+            .subquery()
+        )
+        # El hash va en la URL para que el navegador pueda cachear la imagen como inmutable
+        media_principal = vehiculos_media.alias("media_principal")
+        query = select(vehiculos, principal.c.media_id, media_principal.c.sha256.label("media_sha256")).select_from(
+            vehiculos
+            .outerjoin(principal, principal.c.vehiculo_id == vehiculos.c.id)
+            .outerjoin(media_principal, media_principal.c.id == principal.c.media_id)
+        )
+    else:
+        query = select(vehiculos)
+    
+    query = query.where(condicion).order_by(*ORDEN_CATALOGO[orden]).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    
     result = await database.fetch_all(query)
-    return result
+    
+    if skip or limit is not None:
+        total = await database.fetch_val(select(func.count()).select_from(vehiculos).where(condicion))
+    else:
+        total = len(result)
+    
+    catalogo = []
+    for row in result:
+        vehiculo = dict(row)
+        media_id = vehiculo.pop("media_id", None)
+        media_sha256 = vehiculo.pop("media_sha256", None)
+        vehiculo["imagen_principal_url"] = media_url(row.id, media_id, media_sha256, size="card") if media_id else None
+        catalogo.append(vehiculo)
+    
+    return catalogo, total
 
 # Endpoint para destacar/quitar destacado
 @router.patch("/{vehiculo_id}/destacar", response_model=VehiculoOut)
@@ -126,23 +525,32 @@ async def toggle_destacado_vehiculo(vehiculo_id: int):
     if vehiculo is None:
         raise HTTPException(status_code=404, detail="Vehículo no encontrado")
     
-    # Si se va a destacar, verificar que no haya más de 6 destacados
-    if not vehiculo.destacado:
-        count_query = vehiculos.select().where(vehiculos.c.destacado == 1)
-        destacados = await database.fetch_all(count_query)
-        if len(destacados) >= 6:
-            raise HTTPException(
-                status_code=400, 
-                detail="No se pueden destacar más de 6 vehículos. Quita el destacado de otro vehículo primero."
-            )
-    
-    # Cambiar el estado de destacado
-    nuevo_destacado = 0 if vehiculo.destacado else 1
-    update_query = vehiculos.update().where(vehiculos.c.id == vehiculo_id).values(destacado=nuevo_destacado)
+    if vehiculo.destacado:
+        update_query = vehiculos.update().where(vehiculos.c.id == vehiculo_id).values(
+            destacado=0, version=vehiculos.c.version + 1
+        )
+    else:
+        # Destacar solo si hay cupo: el conteo va dentro del mismo UPDATE para que
+        # dos solicitudes simultáneas no superen el límite. La tabla derivada
+        # evita el error de MySQL al consultar la tabla que se está actualizando.
+        destacados_actuales = select(func.count()).select_from(
+            select(vehiculos.c.id).where(vehiculos.c.destacado == 1).subquery()
+        ).scalar_subquery()
+        update_query = vehiculos.update().where(
+            (vehiculos.c.id == vehiculo_id) &
+            (func.coalesce(vehiculos.c.destacado, 0) == 0) &
+            (destacados_actuales < MAX_DESTACADOS)
+        ).values(destacado=1, version=vehiculos.c.version + 1)
     await database.execute(update_query)
     
     # Obtener el vehículo actualizado
     updated = await database.fetch_one(vehiculos.select().where(vehiculos.c.id == vehiculo_id))
+    if not vehiculo.destacado and (updated is None or not updated.destacado):
+        raise HTTPException(
+            status_code=400, 
+            detail=f"No se pueden destacar más de {MAX_DESTACADOS} vehículos. Quita el destacado de otro vehículo primero."
+        )
+    inventario_cache.bump()
     return updated
 
 # Endpoint para cambiar visibilidad en catálogo
@@ -159,8 +567,11 @@ async def toggle_visibilidad_catalogo(vehiculo_id: int):
     
     # Cambiar el estado de visibilidad
     nueva_visibilidad = 0 if vehiculo.visible_catalogo else 1
-    update_query = vehiculos.update().where(vehiculos.c.id == vehiculo_id).values(visible_catalogo=nueva_visibilidad)
+    update_query = vehiculos.update().where(vehiculos.c.id == vehiculo_id).values(
+        visible_catalogo=nueva_visibilidad, version=vehiculos.c.version + 1
+    )
     await database.execute(update_query)
+    inventario_cache.bump()
     
     # Obtener el vehículo actualizado
     updated = await database.fetch_one(vehiculos.select().where(vehiculos.c.id == vehiculo_id))
@@ -170,6 +581,7 @@ async def toggle_visibilidad_catalogo(vehiculo_id: int):
 @router.post("/{vehiculo_id}/media", response_model=MediaOut, status_code=status.HTTP_201_CREATED)
 async def upload_media_vehiculo(
     vehiculo_id: int,
+    background_tasks: BackgroundTasks,
     archivo: UploadFile = File(...),
     es_principal: bool = Form(False),
     titulo: Optional[str] = Form(None),
@@ -190,9 +602,8 @@ async def upload_media_vehiculo(
     else:
         raise HTTPException(status_code=400, detail="Tipo de archivo no soportado. Solo se permiten imágenes y videos.")
     
-    # Leer y convertir archivo a base64
-    archivo_data = await archivo.read()
-    archivo_base64 = base64.b64encode(archivo_data).decode('utf-8')
+    # Copiar el archivo al almacenamiento de media por bloques (sin cargarlo en memoria)
+    blob = await save_upload(archivo, tipo)
     
     # Si es principal, desmarcar otros archivos principales del mismo vehículo
     if es_principal:
@@ -202,28 +613,38 @@ async def upload_media_vehiculo(
         await database.execute(update_query)
     else:
         # Si no se especifica como principal, verificar si es el primer archivo
-        count_query = vehiculos_media.select().where(vehiculos_media.c.vehiculo_id == vehiculo_id)
-        existing_media = await database.fetch_all(count_query)
-        if len(existing_media) == 0:
+        count_query = select(func.count()).select_from(vehiculos_media).where(vehiculos_media.c.vehiculo_id == vehiculo_id)
+        if await database.fetch_val(count_query) == 0:
             es_principal = True  # Primer archivo es automáticamente principal
     
     # Insertar nuevo archivo
     query = vehiculos_media.insert().values(
         vehiculo_id=vehiculo_id,
         archivo=archivo.filename,
-        archivo_data=archivo_base64,
+        sha256=blob["sha256"],
+        ruta=blob["ruta"],
+        tamano=blob["tamano"],
+        mime=content_type,
         tipo=tipo,
         es_principal=1 if es_principal else 0,
         titulo=titulo,
         orden=orden
     )
     media_id = await database.execute(query)
+    inventario_cache.bump()  # La imagen principal del catálogo puede haber cambiado
+    
+    # Generar miniaturas y variantes WebP/JPEG en el pool de procesos, después de responder
+    if tipo == 'imagen':
+        background_tasks.add_task(crear_variantes_seguro, blob["sha256"], blob["ruta"])
     
     return {
         "id": media_id,
         "vehiculo_id": vehiculo_id,
         "archivo": archivo.filename,
+        "url": media_url(vehiculo_id, media_id, blob["sha256"]),
         "tipo": tipo,
+        "mime": content_type,
+        "tamano": blob["tamano"],
         "es_principal": es_principal,
         "titulo": titulo,
         "orden": orden
@@ -231,7 +652,7 @@ async def upload_media_vehiculo(
 
 @router.get("/{vehiculo_id}/media", response_model=List[MediaOut])
 async def get_media_vehiculo(vehiculo_id: int, tipo: Optional[str] = Query(None)):
-    query = vehiculos_media.select().where(vehiculos_media.c.vehiculo_id == vehiculo_id)
+    query = select(*MEDIA_COLUMNS).where(vehiculos_media.c.vehiculo_id == vehiculo_id)
     if tipo:
         query = query.where(vehiculos_media.c.tipo == tipo)
     query = query.order_by(vehiculos_media.c.orden, vehiculos_media.c.id)
@@ -245,8 +666,10 @@ async def get_media_vehiculo(vehiculo_id: int, tipo: Optional[str] = Query(None)
             "id": row.id,
             "vehiculo_id": row.vehiculo_id,
             "archivo": row.archivo,
-            "archivo_data": row.archivo_data,
+            "url": media_url(row.vehiculo_id, row.id, row.sha256),
             "tipo": row.tipo,
+            "mime": row.mime,
+            "tamano": row.tamano,
             "es_principal": bool(row.es_principal),
             "titulo": row.titulo,
             "orden": row.orden
@@ -254,10 +677,53 @@ async def get_media_vehiculo(vehiculo_id: int, tipo: Optional[str] = Query(None)
     
     return media_list
 
+@router.get("/{vehiculo_id}/media/{media_id}/raw")
+async def get_media_raw_vehiculo(
+    vehiculo_id: int,
+    media_id: int,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    size: str = Query("original", description="original, thumb, card o detail")
+):
+    """
+    Sirve el archivo binario con su Content-Type y ETag fuerte; la caché es inmutable
+    solo si la URL lleva ?v=<sha256> del archivo (como las que devuelven los listados).
+    Responde 304 si el cliente ya tiene la versión actual (If-None-Match).
+    Para imágenes, size elige una variante (WebP si el navegador lo acepta, si no JPEG);
+    mientras la variante se genera se sirve el original, sin caché inmutable.
+    """
+    if size != "original" and size not in VARIANTES:
+        raise HTTPException(status_code=400, detail=f"Tamaño no soportado. Opciones: original, {', '.join(VARIANTES)}")
+    
+    query = vehiculos_media.select().where(
+        (vehiculos_media.c.id == media_id) &
+        (vehiculos_media.c.vehiculo_id == vehiculo_id)
+    )
+    media = await database.fetch_one(query)
+    if media is None:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    
+    if media.ruta and media.tipo == "imagen" and size != "original":
+        formato = formato_preferido(request.headers.get("accept"))
+        variante = await obtener_variante(media.sha256, media.ruta, size, formato, background_tasks)
+        if variante is not None:
+            return blob_response(request, variante.sha256, variante.ruta, variante.mime, variante.tamano,
+                                 vary="Accept", version=media.sha256)
+    
+    if media.ruta:
+        mime = media.mime or "application/octet-stream"
+        return blob_response(request, media.sha256, media.ruta, mime, media.tamano,
+                             inmutable=size == "original" or media.tipo != "imagen")
+    if media.archivo_data:
+        mime = media.mime or ("video/mp4" if media.tipo == "video" else "image/jpeg")
+        return legacy_response(request, media.archivo_data, mime)
+    raise HTTPException(status_code=404, detail="Archivo no encontrado")
+
 # Mantener compatibilidad con endpoints de imágenes
 @router.post("/{vehiculo_id}/imagenes", response_model=ImagenOut, status_code=status.HTTP_201_CREATED)
 async def upload_imagen_vehiculo(
     vehiculo_id: int,
+    background_tasks: BackgroundTasks,
     imagen: UploadFile = File(...),
     es_principal: bool = Form(False)
 ):
@@ -266,13 +732,13 @@ async def upload_imagen_vehiculo(
         raise HTTPException(status_code=400, detail="Solo se permiten archivos de imagen")
     
     # Usar el endpoint de media
-    media_result = await upload_media_vehiculo(vehiculo_id, imagen, es_principal, None, 0)
+    media_result = await upload_media_vehiculo(vehiculo_id, background_tasks, imagen, es_principal, None, 0)
     
     return {
         "id": media_result["id"],
         "vehiculo_id": media_result["vehiculo_id"],
         "imagen": media_result["archivo"],
-        "imagen_data": None,  # No incluir datos por compatibilidad
+        "url": media_result["url"],
         "es_principal": media_result["es_principal"]
     }
 
@@ -288,7 +754,7 @@ async def get_imagenes_vehiculo(vehiculo_id: int):
             "id": media["id"],
             "vehiculo_id": media["vehiculo_id"],
             "imagen": media["archivo"],
-            "imagen_data": media["archivo_data"],
+            "url": media["url"],
             "es_principal": media["es_principal"]
         })
     
@@ -298,6 +764,7 @@ async def get_imagenes_vehiculo(vehiculo_id: int):
 @router.post("/{vehiculo_id}/videos", response_model=MediaOut, status_code=status.HTTP_201_CREATED)
 async def upload_video_vehiculo(
     vehiculo_id: int,
+    background_tasks: BackgroundTasks,
     video: UploadFile = File(...),
     titulo: Optional[str] = Form(None),
     orden: int = Form(0)
@@ -307,7 +774,7 @@ async def upload_video_vehiculo(
         raise HTTPException(status_code=400, detail="Solo se permiten archivos de video")
     
     # Usar el endpoint de media
-    return await upload_media_vehiculo(vehiculo_id, video, False, titulo, orden)
+    return await upload_media_vehiculo(vehiculo_id, background_tasks, video, False, titulo, orden)
 
 @router.get("/{vehiculo_id}/videos", response_model=List[MediaOut])
 async def get_videos_vehiculo(vehiculo_id: int):
@@ -315,11 +782,15 @@ async def get_videos_vehiculo(vehiculo_id: int):
 
 @router.delete("/{vehiculo_id}/media/{media_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_media_vehiculo(vehiculo_id: int, media_id: int):
-    query = vehiculos_media.delete().where(
-        (vehiculos_media.c.id == media_id) & 
-        (vehiculos_media.c.vehiculo_id == vehiculo_id)
-    )
+    condicion = (vehiculos_media.c.id == media_id) & (vehiculos_media.c.vehiculo_id == vehiculo_id)
+    media = await database.fetch_one(vehiculos_media.select().where(condicion))
+    query = vehiculos_media.delete().where(condicion)
     await database.execute(query)
+    inventario_cache.bump()
+    
+    # Liberar el blob si ya no lo usa ningún otro registro
+    if media is not None:
+        await release_blob(media.ruta)
     return
 
 # Mantener compatibilidad con endpoint de eliminación de imágenes
@@ -351,31 +822,16 @@ class VehiculoEmpenoOut(BaseModel):
     meses_transcurridos: int
     interes_acumulado: float
 
-def calcular_interes_vehiculo(fecha_empeno: date, valor_empeno: float, interes_porcentaje: float):
-    """Calcula el interés acumulado de un vehículo empeñado"""
-    if interes_porcentaje <= 0:
-        return 0, 0, valor_empeno
-    
-    fecha_actual = datetime.now().date()
-    dias_transcurridos = (fecha_actual - fecha_empeno).days
-    
-    # Calcular meses (cada 32 días = 1 mes), mínimo 1 mes
-    meses_transcurridos = max(1, dias_transcurridos // 32)
-    
-    # Calcular interés acumulado
-    interes_acumulado = valor_empeno * (interes_porcentaje / 100) * meses_transcurridos
-    valor_actual = valor_empeno + interes_acumulado
-    
-    return meses_transcurridos, interes_acumulado, valor_actual
-
 # Endpoint para empeñar un vehículo
 @router.post("/{vehiculo_id}/empenar", response_model=dict)
-async def empenar_vehiculo(vehiculo_id: int, empeno_data: VehiculoEmpenoCreate):
+async def empenar_vehiculo(vehiculo_id: int, empeno_data: VehiculoEmpenoCreate, request: Request):
     # Verificar que el vehículo existe y está disponible
     vehiculo_query = vehiculos.select().where(vehiculos.c.id == vehiculo_id)
     vehiculo = await database.fetch_one(vehiculo_query)
     if vehiculo is None:
         raise HTTPException(status_code=404, detail="Vehículo no encontrado")
+    versiones = versiones_if_match(request, "vehiculo", vehiculo_id)
+    verificar_version(vehiculo, versiones)
     
     if vehiculo.estado != EstadoVehiculoEnum.disponible:
         raise HTTPException(
@@ -386,32 +842,48 @@ async def empenar_vehiculo(vehiculo_id: int, empeno_data: VehiculoEmpenoCreate):
     try:
         # Actualizar el vehículo con los datos del empeño
         fecha_empeno = datetime.now().date()
-        update_vehiculo_query = vehiculos.update().where(vehiculos.c.id == vehiculo_id).values(
+        # Condicionado al estado (y a la versión de If-Match): si otro usuario lo
+        # vendió, empeñó o editó mientras tanto no se modifica
+        update_vehiculo_query = vehiculos.update().where(
+            (vehiculos.c.id == vehiculo_id) &
+            (vehiculos.c.estado == EstadoVehiculoEnum.disponible) &
+            condicion_version(vehiculos, versiones)
+        ).values(
             estado=EstadoVehiculoEnum.empeño,
             fecha_empeno=fecha_empeno,
             valor_empeno=empeno_data.valor_empeno,
             interes_porcentaje=empeno_data.interes_porcentaje,
             cliente_empeno_nombre=empeno_data.cliente_nombre,
             cliente_empeno_telefono=empeno_data.cliente_telefono,
-            cliente_empeno_documento=empeno_data.cliente_documento
-        )
-        await database.execute(update_vehiculo_query)
-        
-        # Crear la transacción
-        transaccion_query = transacciones.insert().values(
-            tipo=TipoTransaccionEnum.empeño_vehiculo,
-            vehiculo_id=vehiculo_id,
-            usuario_id=empeno_data.usuario_id,
-            sede_id=empeno_data.sede_id,
-            precio_venta=empeno_data.valor_empeno,  # En empeños, precio_venta es el valor prestado
-            precio_compra=vehiculo.precio_compra,
-            ganancia=0,  # En empeños no hay ganancia inmediata
-            cliente_nombre=empeno_data.cliente_nombre,
-            cliente_telefono=empeno_data.cliente_telefono,
-            cliente_documento=empeno_data.cliente_documento,
-            observaciones=empeno_data.observaciones
+            cliente_empeno_documento=empeno_data.cliente_documento,
+            version=vehiculos.c.version + 1,
+            **SALDO_INICIAL
         )
-        transaccion_id = await database.execute(transaccion_query)
+        # Empeño, transacción y resumen diario en una sola transacción de base de datos
+        async with database.transaction():
+            if await execute_rowcount(update_vehiculo_query) == 0:
+                if versiones is not None:
+                    raise HTTPException(status_code=412, detail=MENSAJE_CONFLICTO)
+                raise HTTPException(status_code=400, detail="El vehículo no está disponible para empeño")
+            
+            # Crear la transacción
+            transaccion_query = transacciones.insert().values(
+                tipo=TipoTransaccionEnum.empeño_vehiculo,
+                vehiculo_id=vehiculo_id,
+                usuario_id=empeno_data.usuario_id,
+                sede_id=empeno_data.sede_id,
+                precio_venta=empeno_data.valor_empeno,  # En empeños, precio_venta es el valor prestado
+                precio_compra=vehiculo.precio_compra,
+                ganancia=0,  # En empeños no hay ganancia inmediata
+                cliente_nombre=empeno_data.cliente_nombre,
+                cliente_telefono=empeno_data.cliente_telefono,
+                cliente_documento=empeno_data.cliente_documento,
+                observaciones=empeno_data.observaciones
+            )
+            transaccion_id = await database.execute(transaccion_query)
+            await aplicar_transaccion_por_id(transaccion_id)
+        inventario_cache.bump()
+        empenos_cache.bump()
         
         return {
             "mensaje": "Vehículo empeñado exitosamente",
@@ -422,6 +894,8 @@ async def empenar_vehiculo(vehiculo_id: int, empeno_data: VehiculoEmpenoCreate):
             "cliente": empeno_data.cliente_nombre
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al empeñar el vehículo: {str(e)}")
 
@@ -429,97 +903,101 @@ async def empenar_vehiculo(vehiculo_id: int, empeno_data: VehiculoEmpenoCreate):
 @router.get("/empenos/activos", response_model=List[dict])
 async def get_vehiculos_empenos_activos():
     query = vehiculos.select().where(vehiculos.c.estado == EstadoVehiculoEnum.empeño)
-    vehiculos_empeno = await database.fetch_all(query)
+    vehiculos_empeno = [
+        vehiculo for vehiculo in await database.fetch_all(query)
+        if vehiculo.fecha_empeno and vehiculo.valor_empeno
+    ]
+    
+    # Intereses de todos los empeños en una sola pasada, con la misma fecha de corte
+    meses, intereses, valores_actuales = calcular_portafolio(
+        [vehiculo.valor_empeno for vehiculo in vehiculos_empeno],
+        [vehiculo.interes_porcentaje for vehiculo in vehiculos_empeno],
+        [vehiculo.fecha_empeno for vehiculo in vehiculos_empeno],
+        "vehiculo",
+        saldos_capital=[vehiculo.saldo_capital for vehiculo in vehiculos_empeno],
+        saldos_interes=[vehiculo.saldo_interes for vehiculo in vehiculos_empeno],
+        meses_liquidados=[vehiculo.meses_liquidados for vehiculo in vehiculos_empeno]
+    )
     
     result = []
-    for vehiculo in vehiculos_empeno:
-        if vehiculo.fecha_empeno and vehiculo.valor_empeno:
-            meses_transcurridos, interes_acumulado, valor_actual = calcular_interes_vehiculo(
-                vehiculo.fecha_empeno, 
-                float(vehiculo.valor_empeno), 
-                float(vehiculo.interes_porcentaje or 0)
-            )
-            
-            result.append({
-                "id": vehiculo.id,
-                "marca": vehiculo.marca,
-                "modelo": vehiculo.modelo,
-                "placa": vehiculo.placa,
-                "valor_empeno": float(vehiculo.valor_empeno),
-                "interes_porcentaje": float(vehiculo.interes_porcentaje or 0),
-                "fecha_empeno": vehiculo.fecha_empeno,
-                "cliente_nombre": vehiculo.cliente_empeno_nombre,
-                "cliente_telefono": vehiculo.cliente_empeno_telefono,
-                "cliente_documento": vehiculo.cliente_empeno_documento,
-                "meses_transcurridos": meses_transcurridos,
-                "interes_acumulado": interes_acumulado,
-                "valor_actual": valor_actual,
-                "sede_id": vehiculo.sede_id
-            })
+    for vehiculo, meses_transcurridos, interes_acumulado, valor_actual in zip(
+        vehiculos_empeno, meses.tolist(), intereses.tolist(), valores_actuales.tolist()
+    ):
+        result.append({
+            "id": vehiculo.id,
+            "marca": vehiculo.marca,
+            "modelo": vehiculo.modelo,
+            "placa": vehiculo.placa,
+            "valor_empeno": float(vehiculo.valor_empeno),
+            "interes_porcentaje": float(vehiculo.interes_porcentaje or 0),
+            "fecha_empeno": vehiculo.fecha_empeno,
+            "cliente_nombre": vehiculo.cliente_empeno_nombre,
+            "cliente_telefono": vehiculo.cliente_empeno_telefono,
+            "cliente_documento": vehiculo.cliente_empeno_documento,
+            "meses_transcurridos": meses_transcurridos,
+            "interes_acumulado": interes_acumulado,
+            "valor_actual": valor_actual,
+            "total_abonado": float(vehiculo.total_abonado or 0),
+            "fecha_ultimo_abono": vehiculo.fecha_ultimo_abono,
+            "sede_id": vehiculo.sede_id
+        })
     
     return result
 
 # Endpoint para realizar abono a un vehículo empeñado
 @router.patch("/{vehiculo_id}/abono")
-async def realizar_abono_vehiculo(vehiculo_id: int, monto_abono: float = Query(...)):
+async def realizar_abono_vehiculo(vehiculo_id: int, request: Request, monto_abono: float = Query(...)):
     # Verificar que el vehículo existe y está empeñado
     vehiculo_query = vehiculos.select().where(vehiculos.c.id == vehiculo_id)
     vehiculo = await database.fetch_one(vehiculo_query)
     if vehiculo is None:
         raise HTTPException(status_code=404, detail="Vehículo no encontrado")
     
+    versiones = versiones_if_match(request, "vehiculo", vehiculo_id)
+    verificar_version(vehiculo, versiones)
+    
     if vehiculo.estado != EstadoVehiculoEnum.empeño:
         raise HTTPException(status_code=400, detail="El vehículo no está en estado de empeño")
     
     if not vehiculo.fecha_empeno or not vehiculo.valor_empeno:
         raise HTTPException(status_code=400, detail="Datos de empeño incompletos")
     
-    # Calcular valor actual con intereses
-    meses_transcurridos, interes_acumulado, valor_actual = calcular_interes_vehiculo(
-        vehiculo.fecha_empeno, 
-        float(vehiculo.valor_empeno), 
-        float(vehiculo.interes_porcentaje or 0)
-    )
-    
     if monto_abono <= 0:
         raise HTTPException(status_code=400, detail="El monto del abono debe ser mayor a 0")
     
+    # Si el abono cubre el total, el vehículo vuelve a estar disponible sin datos de empeño
+    valores_recuperado = {
+        "estado": EstadoVehiculoEnum.disponible,
+        "fecha_empeno": None,
+        "valor_empeno": None,
+        "interes_porcentaje": 0.00,
+        "cliente_empeno_nombre": None,
+        "cliente_empeno_telefono": None,
+        "cliente_empeno_documento": None,
+        **SALDO_INICIAL
+    }
+    
     try:
-        if monto_abono >= valor_actual:
-            # Abono completo - recuperar vehículo
-            cambio = monto_abono - valor_actual
-            
-            # Cambiar estado del vehículo a disponible y limpiar datos de empeño
-            update_query = vehiculos.update().where(vehiculos.c.id == vehiculo_id).values(
-                estado=EstadoVehiculoEnum.disponible,
-                fecha_empeno=None,
-                valor_empeno=None,
-                interes_porcentaje=0.00,
-                cliente_empeno_nombre=None,
-                cliente_empeno_telefono=None,
-                cliente_empeno_documento=None
-            )
-            await database.execute(update_query)
-            
-            mensaje = f"Vehículo recuperado exitosamente. Valor total: {valor_actual:,.0f}"
-            if cambio > 0:
-                mensaje += f". Cambio: {cambio:,.0f}"
-        else:
-            # Abono parcial - mantener en empeño
-            mensaje = f"Abono parcial registrado. Pendiente: {valor_actual - monto_abono:,.0f}"
-        
-        return {
-            "mensaje": mensaje,
-            "monto_abono": monto_abono,
-            "valor_actual": valor_actual,
-            "interes_acumulado": interes_acumulado,
-            "meses_transcurridos": meses_transcurridos,
-            "cambio": max(0, monto_abono - valor_actual),
-            "recuperado": monto_abono >= valor_actual
-        }
-        
+        resultado = await registrar_abono(vehiculo, "vehiculo", monto_abono, valores_recuperado, versiones)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error procesando el abono: {str(e)}")
+    
+    empenos_cache.bump()
+    if resultado["recuperado"]:
+        inventario_cache.bump()
+        mensaje = f"Vehículo recuperado exitosamente. Valor total: {resultado['valor_actual']:,.0f}"
+        if resultado["cambio"] > 0:
+            mensaje += f". Cambio: {resultado['cambio']:,.0f}"
+    else:
+        mensaje = f"Abono parcial registrado. Pendiente: {resultado['saldo_pendiente']:,.0f}"
+    
+    return {"mensaje": mensaje, **resultado}
+
+@router.get("/{vehiculo_id}/abonos", response_model=List[dict])
+async def get_abonos_vehiculo(vehiculo_id: int):
+    return await listar_abonos("vehiculo", vehiculo_id)
 
 # Endpoint para obtener un vehículo empeñado específico con cálculo de intereses
 @router.get("/{vehiculo_id}/empeno", response_model=dict)
@@ -535,11 +1013,7 @@ async def get_vehiculo_empeno(vehiculo_id: int):
     if not vehiculo.fecha_empeno or not vehiculo.valor_empeno:
         raise HTTPException(status_code=400, detail="Datos de empeño incompletos")
     
-    meses_transcurridos, interes_acumulado, valor_actual = calcular_interes_vehiculo(
-        vehiculo.fecha_empeno, 
-        float(vehiculo.valor_empeno), 
-        float(vehiculo.interes_porcentaje or 0)
-    )
+    cuenta = estado_cuenta(vehiculo, "vehiculo")
     
     return {
         "id": vehiculo.id,
@@ -552,8 +1026,11 @@ async def get_vehiculo_empeno(vehiculo_id: int):
         "cliente_nombre": vehiculo.cliente_empeno_nombre,
         "cliente_telefono": vehiculo.cliente_empeno_telefono,
         "cliente_documento": vehiculo.cliente_empeno_documento,
-        "meses_transcurridos": meses_transcurridos,
-        "interes_acumulado": interes_acumulado,
-        "valor_actual": valor_actual,
+        "meses_transcurridos": cuenta["meses_transcurridos"],
+        "interes_acumulado": cuenta["interes_acumulado"],
+        "valor_actual": cuenta["valor_actual"],
+        "saldo_capital": cuenta["saldo_capital"],
+        "total_abonado": cuenta["total_abonado"],
+        "fecha_ultimo_abono": cuenta["fecha_ultimo_abono"],
         "sede_id": vehiculo.sede_id
     }
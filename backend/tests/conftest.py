@@ -0,0 +1,120 @@
+"""
+Configuración común de las pruebas: base SQLite temporal (con el índice FTS5),
+carpeta de media temporal y un TestClient compartido. Cada prueba empieza con
+las tablas, los archivos y los cachés vacíos.
+
+    cd backend && python -m pytest -q
+"""
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp(prefix="jerosmotos_test_")
+MEDIA_ROOT = os.path.join(TMP, "media")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP, 'test.db')}"
+os.environ["MEDIA_ROOT"] = MEDIA_ROOT
+sys.path.insert(0, BACKEND)
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from database import engine, metadata  # noqa: E402
+from busqueda_fts import crear_indice  # noqa: E402
+from cache import caches, VersionedCache  # noqa: E402
+from routers import busqueda, usuarios  # noqa: E402
+import media_variants  # noqa: E402
+import main  # noqa: E402
+
+metadata.create_all(engine)
+with engine.begin() as conn:
+    crear_indice(conn)
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    with TestClient(main.app) as cl:
+        yield cl
+    engine.dispose()
+    shutil.rmtree(TMP, ignore_errors=True)
+
+
+@pytest.fixture
+def cliente(app_client):
+    """TestClient sobre una base vacía, sin sesión iniciada ni cachés de pruebas anteriores"""
+    with engine.begin() as conn:
+        for tabla in reversed(metadata.sorted_tables):
+            conn.execute(tabla.delete())
+    for nombre in os.listdir(MEDIA_ROOT):
+        shutil.rmtree(os.path.join(MEDIA_ROOT, nombre), ignore_errors=True)
+    for cache in caches:
+        cache.bump() if isinstance(cache, VersionedCache) else cache.invalidate()
+    usuarios.token_versions.clear()
+    busqueda._fts_disponible = None
+    media_variants._fallidas.clear()
+    app_client.headers.pop("Authorization", None)
+    return app_client
+
+
+@pytest.fixture
+def crear_usuario(cliente):
+    """Registra un usuario y devuelve (encabezados con su token, id)"""
+    def crear(rol: str = "administrador", correo: str = "admin@test.com", nombre: str = "Admin"):
+        respuesta = cliente.post("/usuarios/register", json={
+            "nombre": nombre, "correo": correo, "contrasena": "x", "rol": rol
+        })
+        assert respuesta.status_code in (200, 201), respuesta.text
+        token = cliente.post("/usuarios/token", data={"username": correo, "password": "x"}).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}, respuesta.json()["id"]
+    return crear
+
+
+@pytest.fixture
+def admin(crear_usuario):
+    """Encabezados de un administrador"""
+    return crear_usuario()[0]
+
+
+@pytest.fixture
+def sede(cliente):
+    """Id de una sede creada para la prueba"""
+    respuesta = cliente.post("/sedes/", json={"nombre": "Sede", "direccion": "Calle 1", "telefono": "1"})
+    assert respuesta.status_code in (200, 201), respuesta.text
+    return respuesta.json()["id"]
+
+
+@pytest.fixture
+def png():
+    """Genera una imagen PNG de prueba"""
+    from PIL import Image
+
+    def generar(color: str = "red", tamano: int = 800) -> bytes:
+        salida = io.BytesIO()
+        Image.new("RGB", (tamano, tamano), color).save(salida, "PNG")
+        return salida.getvalue()
+    return generar
+
+
+@pytest.fixture
+def crear_vehiculo(cliente, sede):
+    """Crea un vehículo disponible en la sede de la prueba y devuelve su JSON"""
+    def crear(placa: str = "ABC123", **campos):
+        datos = {"marca": "Yamaha", "modelo": "FZ", "placa": placa, "sede_id": sede,
+                 "precio_compra": 8000000, "precio_venta": 10000000, **campos}
+        respuesta = cliente.post("/vehiculos/", json=datos)
+        assert respuesta.status_code == 201, respuesta.text
+        return respuesta.json()
+    return crear
+
+
+@pytest.fixture
+def crear_articulo(cliente, sede):
+    """Crea un artículo empeñado en la sede de la prueba y devuelve su JSON"""
+    def crear(descripcion: str = "Reloj", **campos):
+        datos = {"descripcion": descripcion, "valor": 1000000, "sede_id": sede,
+                 "fecha_registro": "2024-01-01", **campos}
+        respuesta = cliente.post("/articulos_valor/", json=datos)
+        assert respuesta.status_code == 201, respuesta.text
+        return respuesta.json()
+    return crear
@@ -0,0 +1,61 @@
+"""
+Abonos a empeños: cada abono queda en la tabla abonos con el saldo resultante,
+la fila del empeño guarda el saldo vigente y lo que exceda la deuda no se
+registra (se devuelve como cambio y el empeño queda recuperado).
+"""
+from datetime import date, timedelta
+
+
+def abonar(cliente, articulo_id: int, monto: float):
+    return cliente.patch(f"/articulos_valor/{articulo_id}/abono", params={"monto_abono": monto})
+
+
+def test_saldo_acumulado_de_los_abonos(cliente, crear_articulo):
+    # 40 días -> 2 meses al 5%: debe 1.000.000 + 100.000
+    articulo = crear_articulo(valor=1000000, interes_porcentaje=5,
+                              fecha_registro=(date.today() - timedelta(days=40)).isoformat())
+
+    primero = abonar(cliente, articulo["id"], 60000).json()
+    assert (primero["interes_pagado"], primero["capital_pagado"], primero["saldo_pendiente"]) == (60000, 0, 1040000)
+    segundo = abonar(cliente, articulo["id"], 240000).json()
+    assert (segundo["interes_pagado"], segundo["capital_pagado"], segundo["saldo_pendiente"]) == (40000, 200000, 800000)
+    assert segundo["estado"] == "empeño"
+
+    abonos = cliente.get(f"/articulos_valor/{articulo['id']}/abonos").json()
+    assert [float(a["saldo_resultante"]) for a in abonos] == [1040000, 800000]
+    assert [float(a["monto"]) for a in abonos] == [60000, 240000]
+
+    # El saldo se lee de la fila, sin recorrer los abonos
+    actual = cliente.get(f"/articulos_valor/{articulo['id']}").json()
+    assert actual["total_abonado"] == 300000
+    assert actual["valor_actual"] == 800000
+    assert actual["interes_acumulado"] == 0
+    assert actual["fecha_ultimo_abono"] == date.today().isoformat()
+
+
+def test_excedente_no_se_registra_y_no_admite_mas_abonos(cliente, crear_articulo):
+    articulo = crear_articulo(valor=500000, interes_porcentaje=10, fecha_registro=date.today().isoformat())
+
+    pago = abonar(cliente, articulo["id"], 600000)
+    assert pago.status_code == 200
+    assert pago.json()["recuperado"] is True
+    assert pago.json()["cambio"] == 50000
+    assert pago.json()["saldo_pendiente"] == 0
+
+    abonos = cliente.get(f"/articulos_valor/{articulo['id']}/abonos").json()
+    assert [float(a["monto"]) for a in abonos] == [550000]
+    actual = cliente.get(f"/articulos_valor/{articulo['id']}").json()
+    assert actual["estado"] == "recuperado"
+    assert actual["total_abonado"] == 550000
+
+    rechazado = abonar(cliente, articulo["id"], 1000)
+    assert rechazado.status_code == 400
+    assert len(cliente.get(f"/articulos_valor/{articulo['id']}/abonos").json()) == 1
+
+
+def test_monto_invalido(cliente, crear_articulo):
+    articulo = crear_articulo()
+    assert abonar(cliente, articulo["id"], 0).status_code == 400
+    assert abonar(cliente, articulo["id"], -100).status_code == 400
+    assert abonar(cliente, 999, 100).status_code == 404
+    assert cliente.get(f"/articulos_valor/{articulo['id']}/abonos").json() == []
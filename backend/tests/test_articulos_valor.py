@@ -0,0 +1,38 @@
+"""
+Listado de artículos de valor con los filtros opcionales estado y sede_id,
+que usa la pantalla de reportes para traer solo las filas del detalle, y
+subida de imágenes, que rechaza otros tipos de archivo antes de escribir en disco.
+"""
+import os
+
+from media_storage import MEDIA_ROOT
+
+
+def test_filtros_de_estado_y_sede(cliente, crear_articulo, sede):
+    otra_sede = cliente.post("/sedes/", json={"nombre": "Norte", "direccion": "Calle 2", "telefono": "2"}).json()["id"]
+    vendido = crear_articulo("Reloj", estado="vendido")
+    crear_articulo("Cadena")
+    vendido_norte = crear_articulo("Anillo", estado="vendido", sede_id=otra_sede)
+
+    def ids(**params):
+        respuesta = cliente.get("/articulos_valor/", params=params)
+        assert respuesta.status_code == 200
+        return sorted(a["id"] for a in respuesta.json())
+
+    assert len(ids()) == 3
+    assert ids(estado="vendido") == sorted([vendido["id"], vendido_norte["id"]])
+    assert ids(estado="vendido", sede_id=sede) == [vendido["id"]]
+    assert ids(sede_id=otra_sede) == [vendido_norte["id"]]
+    assert ids(estado="recuperado") == []
+    assert cliente.get("/articulos_valor/", params={"estado": "perdido"}).status_code == 422
+
+
+def test_subida_de_imagen_rechaza_otros_tipos(cliente, crear_articulo):
+    articulo = crear_articulo()
+    respuesta = cliente.post(
+        f"/articulos_valor/{articulo['id']}/imagenes",
+        files={"imagen": ("notas.txt", b"no es una imagen", "text/plain")},
+    )
+    assert respuesta.status_code == 400
+    assert os.listdir(MEDIA_ROOT) == []
+    assert cliente.get(f"/articulos_valor/{articulo['id']}/imagenes").json() == []
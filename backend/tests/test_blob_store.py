@@ -0,0 +1,92 @@
+"""
+Almacenamiento de media direccionado por contenido: los archivos se guardan en
+ab/cd/<sha256>, las subidas idénticas comparten blob y el blob se borra cuando
+ya ningún vehículo ni artículo lo referencia.
+"""
+import hashlib
+import os
+
+from database import database
+from media_storage import storage
+from models import vehiculos_media, articulos_imagenes, media_variantes
+
+
+def archivos_en_media():
+    return sorted(
+        os.path.relpath(os.path.join(carpeta, nombre), storage.root).replace(os.sep, "/")
+        for carpeta, _, nombres in os.walk(storage.root)
+        for nombre in nombres
+        if ".tmp" not in carpeta
+    )
+
+
+def subir_vehiculo(cliente, vehiculo_id: int, contenido: bytes):
+    respuesta = cliente.post(f"/vehiculos/{vehiculo_id}/imagenes",
+                             files={"imagen": ("foto.png", contenido, "image/png")})
+    assert respuesta.status_code == 201, respuesta.text
+
+
+def subir_articulo(cliente, articulo_id: int, contenido: bytes):
+    respuesta = cliente.post(f"/articulos_valor/{articulo_id}/imagenes",
+                             files={"imagen": ("foto.png", contenido, "image/png")})
+    assert respuesta.status_code == 201, respuesta.text
+
+
+def test_blob_se_guarda_por_sha256(cliente, crear_vehiculo, png):
+    contenido = png()
+    sha256 = hashlib.sha256(contenido).hexdigest()
+    vehiculo = crear_vehiculo()
+    subir_vehiculo(cliente, vehiculo["id"], contenido)
+
+    fila = cliente.portal.call(database.fetch_one, vehiculos_media.select())
+    assert fila.sha256 == sha256
+    assert fila.ruta == f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+    with open(os.path.join(storage.root, *fila.ruta.split("/")), "rb") as f:
+        assert f.read() == contenido
+
+
+def test_subidas_identicas_comparten_blob(cliente, crear_vehiculo, crear_articulo, png):
+    contenido = png()
+    primero, segundo = crear_vehiculo("AAA111"), crear_vehiculo("BBB222")
+    subir_vehiculo(cliente, primero["id"], contenido)
+    antes = archivos_en_media()
+
+    subir_vehiculo(cliente, segundo["id"], contenido)
+    subir_articulo(cliente, crear_articulo()["id"], contenido)
+
+    assert archivos_en_media() == antes
+    rutas = {fila.ruta for fila in cliente.portal.call(database.fetch_all, vehiculos_media.select())}
+    rutas |= {fila.ruta for fila in cliente.portal.call(database.fetch_all, articulos_imagenes.select())}
+    assert len(rutas) == 1
+
+
+def test_borrar_vehiculo_libera_blob_y_variantes(cliente, crear_vehiculo, png):
+    vehiculo = crear_vehiculo()
+    subir_vehiculo(cliente, vehiculo["id"], png())
+    assert cliente.portal.call(database.fetch_all, media_variantes.select())
+
+    assert cliente.delete(f"/vehiculos/{vehiculo['id']}").status_code == 204
+    assert archivos_en_media() == []
+    assert cliente.portal.call(database.fetch_all, media_variantes.select()) == []
+
+
+def test_borrar_articulo_libera_blob(cliente, crear_articulo, png):
+    articulo = crear_articulo()
+    subir_articulo(cliente, articulo["id"], png())
+
+    assert cliente.delete(f"/articulos_valor/{articulo['id']}").status_code == 204
+    assert archivos_en_media() == []
+
+
+def test_blob_compartido_se_conserva_hasta_el_ultimo_registro(cliente, crear_vehiculo, crear_articulo, png):
+    contenido = png()
+    vehiculo, articulo = crear_vehiculo(), crear_articulo()
+    subir_vehiculo(cliente, vehiculo["id"], contenido)
+    subir_articulo(cliente, articulo["id"], contenido)
+    blobs = archivos_en_media()
+
+    cliente.delete(f"/vehiculos/{vehiculo['id']}")
+    assert archivos_en_media() == blobs
+
+    cliente.delete(f"/articulos_valor/{articulo['id']}")
+    assert archivos_en_media() == []
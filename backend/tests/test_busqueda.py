@@ -0,0 +1,65 @@
+"""
+Búsqueda con el índice FTS5: los triggers lo mantienen al día, el filtro de
+vendedor se aplica antes del LIMIT y el texto del usuario nunca se interpreta
+como sintaxis FTS.
+"""
+from database import engine
+from models import sedes, transacciones
+
+
+def buscar(cliente, encabezados, q: str, **params):
+    respuesta = cliente.get("/buscar/", params={"q": q, **params}, headers=encabezados)
+    assert respuesta.status_code == 200, respuesta.text
+    return [(r["tipo"], r["id"]) for r in respuesta.json()]
+
+
+def test_triggers_sincronizan_el_indice(cliente, admin, crear_vehiculo, crear_articulo):
+    vehiculo = crear_vehiculo("XYZ123", color="Verde")
+    articulo = crear_articulo("Cadena de oro", cliente_nombre="Ana Pérez")
+    assert buscar(cliente, admin, "xyz") == [("vehiculo", vehiculo["id"])]
+    assert buscar(cliente, admin, "cadena") == [("articulo", articulo["id"])]
+
+    cliente.put(f"/vehiculos/{vehiculo['id']}", json={"placa": "QWE987"})
+    assert buscar(cliente, admin, "xyz") == []
+    assert buscar(cliente, admin, "qwe987 verde") == [("vehiculo", vehiculo["id"])]
+
+    cliente.delete(f"/vehiculos/{vehiculo['id']}")
+    cliente.delete(f"/articulos_valor/{articulo['id']}")
+    assert buscar(cliente, admin, "qwe987") == []
+    assert buscar(cliente, admin, "cadena") == []
+
+
+def test_busqueda_por_prefijo_y_sin_tildes(cliente, admin, crear_articulo):
+    articulo = crear_articulo("Televisor", cliente_nombre="José Pérez")
+    assert buscar(cliente, admin, "perez") == [("articulo", articulo["id"])]
+    assert buscar(cliente, admin, "telev jos") == [("articulo", articulo["id"])]
+    assert buscar(cliente, admin, "televisor", tipo="vehiculo") == []
+
+
+def test_filtro_de_vendedor_antes_del_limit(cliente, crear_usuario):
+    _, admin_id = crear_usuario()
+    vendedor, vendedor_id = crear_usuario("vendedor", "vendedor@test.com", "Vendedor")
+    with engine.begin() as conn:
+        conn.execute(sedes.insert().values(id=1, nombre="Sede", direccion="Calle 1", telefono="1"))
+        # Muchas transacciones ajenas más relevantes que la del vendedor
+        for _ in range(30):
+            conn.execute(transacciones.insert().values(
+                tipo="venta_articulo", usuario_id=admin_id, sede_id=1, precio_venta=1000,
+                ganancia=0, cliente_nombre="Carlos Gómez"
+            ))
+        propia = conn.execute(transacciones.insert().values(
+            tipo="venta_articulo", usuario_id=vendedor_id, sede_id=1, precio_venta=1000,
+            ganancia=0, cliente_nombre="Carlos Gómez", observaciones="Pagó en efectivo con descuento especial"
+        )).inserted_primary_key[0]
+
+    assert buscar(cliente, vendedor, "carlos", limit=5) == [("transaccion", propia)]
+
+
+def test_texto_con_sintaxis_fts_no_falla(cliente, admin, crear_articulo):
+    articulo = crear_articulo('Anillo "oro" 18k')
+    for q in ['"', '*', 'anillo"', 'anillo OR', 'NEAR(anillo', 'anillo -oro', "anillo' --", 'oro)*^']:
+        buscar(cliente, admin, q)
+    assert buscar(cliente, admin, '"oro"') == [("articulo", articulo["id"])]
+    assert buscar(cliente, admin, '"') == []
+    # OR y NOT son palabras comunes, no operadores
+    assert buscar(cliente, admin, "anillo NOT oro") == []
@@ -0,0 +1,39 @@
+"""
+Catálogo público: ETag con la versión del inventario, 304 mientras no cambie
+y un ETag nuevo después de cualquier escritura de vehículos.
+"""
+from urllib.parse import parse_qs, urlsplit
+
+
+def test_catalogo_responde_304_hasta_que_cambia_el_inventario(cliente, crear_vehiculo):
+    vehiculo = crear_vehiculo()
+
+    respuesta = cliente.get("/vehiculos/catalogo/publico")
+    assert respuesta.status_code == 200
+    assert [v["id"] for v in respuesta.json()] == [vehiculo["id"]]
+    assert respuesta.headers["x-total-count"] == "1"
+    etag = respuesta.headers["etag"]
+
+    revalidada = cliente.get("/vehiculos/catalogo/publico", headers={"If-None-Match": etag})
+    assert revalidada.status_code == 304
+    assert revalidada.headers["etag"] == etag
+
+    crear_vehiculo("XYZ987")
+    cambiada = cliente.get("/vehiculos/catalogo/publico", headers={"If-None-Match": etag})
+    assert cambiada.status_code == 200
+    assert cambiada.headers["etag"] != etag
+    assert len(cambiada.json()) == 2
+
+
+def test_catalogo_con_imagen_principal(cliente, crear_vehiculo, png):
+    vehiculo = crear_vehiculo()
+    subida = cliente.post(f"/vehiculos/{vehiculo['id']}/imagenes",
+                          files={"imagen": ("foto.png", png(), "image/png")}).json()
+
+    catalogo = cliente.get("/vehiculos/catalogo/publico", params={"include": "principal_media"}).json()
+    url = urlsplit(catalogo[0]["imagen_principal_url"])
+    assert url.path == urlsplit(subida["url"]).path
+    assert parse_qs(url.query) == {"v": parse_qs(urlsplit(subida["url"]).query)["v"], "size": ["card"]}
+
+    imagen = cliente.get(catalogo[0]["imagen_principal_url"], headers={"Accept": "image/webp"})
+    assert imagen.headers["content-type"] == "image/webp"
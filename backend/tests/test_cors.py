@@ -0,0 +1,12 @@
+"""
+CORS con credenciales: los encabezados expuestos se listan uno por uno, porque
+el navegador no acepta el comodín "*" cuando la respuesta lleva credenciales.
+"""
+
+
+def test_cors_expone_los_encabezados_del_frontend(cliente):
+    respuesta = cliente.get("/ping", headers={"Origin": "http://localhost:3000"})
+    assert respuesta.headers["access-control-allow-origin"] == "http://localhost:3000"
+    assert respuesta.headers["access-control-allow-credentials"] == "true"
+    expuestos = {h.strip().lower() for h in respuesta.headers["access-control-expose-headers"].split(",")}
+    assert expuestos == {"x-next-cursor", "x-total-count", "etag"}
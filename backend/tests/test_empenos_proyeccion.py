@@ -0,0 +1,76 @@
+"""
+Proyección y antigüedad de la cartera de empeños: fechas de la proyección,
+totales por sede y rangos de antigüedad en meses de 32 días.
+"""
+from datetime import date, timedelta
+
+from routers.empenos import calcular_proyeccion, fechas_proyeccion
+
+HOY = date(2024, 1, 15)
+
+
+def empeno(sede_id, valor, porcentaje, dias, saldo_capital=None, saldo_interes=None, meses_liquidados=None):
+    return {
+        "sede_id": sede_id, "valor": valor, "interes_porcentaje": porcentaje,
+        "fecha": HOY - timedelta(days=dias), "saldo_capital": saldo_capital,
+        "saldo_interes": saldo_interes, "meses_liquidados": meses_liquidados,
+    }
+
+
+def test_fechas_de_la_proyeccion():
+    assert fechas_proyeccion(HOY, 60) == [HOY, date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 15)]
+    assert fechas_proyeccion(date(2024, 1, 31), 1) == [date(2024, 1, 31), date(2024, 2, 1)]
+
+
+def test_proyeccion_por_sede():
+    cartera = {
+        "articulo": [empeno(1, 1000000, 5, 0), empeno(2, 2000000, 10, 40)],
+        "vehiculo": [empeno(1, 5000000, 4, 10)],
+    }
+    resultado = calcular_proyeccion(cartera, HOY, 60)
+    hoy, fin_enero, fin_febrero, fin = resultado["proyeccion"]
+
+    # Artículos: mes en curso desde el primer día; vehículos: meses completos, mínimo uno
+    assert hoy["total"]["interes_acumulado"] == 50000 + 400000 + 200000
+    assert fin_febrero["fecha"] == date(2024, 2, 29)
+    assert fin_febrero["total"]["interes_acumulado"] == 100000 + 600000 + 200000
+    assert fin["total"]["interes_acumulado"] == 100000 + 800000 + 400000
+    assert fin["total"]["valor_prestado"] == 8000000
+    assert fin["total"]["valor_total"] == 9300000
+
+    sedes = {sede["sede_id"]: sede for sede in hoy["sedes"]}
+    assert sedes[1]["cantidad"] == 2
+    assert sedes[1]["valor_prestado"] == 6000000
+    assert sedes[1]["interes_acumulado"] == 250000
+    assert sedes[2]["interes_acumulado"] == 400000
+    assert sum(s["interes_acumulado"] for s in hoy["sedes"]) == hoy["total"]["interes_acumulado"]
+
+
+def test_rangos_de_antiguedad():
+    cartera = {
+        "articulo": [empeno(1, 100, 1, dias) for dias in (0, 31, 32, 95, 96, 191, 192, 500)],
+        "vehiculo": [],
+    }
+    antiguedad = {r["rango"]: r["cantidad"] for r in calcular_proyeccion(cartera, HOY, 30)["antiguedad"]}
+    assert antiguedad == {"0-1": 2, "1-3": 2, "3-6": 2, "6+": 2}
+
+
+def test_capital_pendiente_despues_de_abonos():
+    cartera = {
+        "articulo": [empeno(1, 1000000, 5, 100, saldo_capital=400000, saldo_interes=0, meses_liquidados=4)],
+        "vehiculo": [],
+    }
+    hoy, fin = calcular_proyeccion(cartera, HOY, 30)["proyeccion"][0::2]
+    assert hoy["total"]["valor_prestado"] == 400000
+    assert hoy["total"]["interes_acumulado"] == 0
+    # 130 días -> quinto mes, sobre el capital pendiente
+    assert fin["total"]["interes_acumulado"] == 20000
+
+
+def test_endpoint_sin_empenos(cliente, admin):
+    respuesta = cliente.get("/empenos/proyeccion", headers=admin, params={"horizonte": 45})
+    assert respuesta.status_code == 200
+    datos = respuesta.json()
+    assert datos["horizonte"] == 45
+    assert all(p["total"]["cantidad"] == 0 for p in datos["proyeccion"])
+    assert [r["rango"] for r in datos["antiguedad"]] == ["0-1", "1-3", "3-6", "6+"]
@@ -0,0 +1,77 @@
+"""
+Las estadísticas de transacciones salen de agregados en SQL (resumen diario);
+deben coincidir con sumar las mismas filas en Python, con y sin filtros.
+"""
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from database import engine
+from models import sedes, transacciones, TipoTransaccionEnum
+from rollup_transacciones import reconstruir
+
+TIPOS = [tipo.value for tipo in TipoTransaccionEnum]
+
+
+def sembrar(usuario_id: int, cantidad: int = 300) -> list:
+    random.seed(9)
+    inicio = datetime(2024, 1, 1)
+    filas = []
+    for _ in range(cantidad):
+        precio = random.randint(100, 20_000) * 1000 + random.choice([0, 0.25, 0.5])
+        filas.append({
+            "tipo": random.choice(TIPOS),
+            "usuario_id": usuario_id,
+            "sede_id": random.randint(1, 3),
+            "precio_venta": precio,
+            "ganancia": round(precio * random.uniform(-0.1, 0.3), 2),
+            "fecha_transaccion": inicio + timedelta(seconds=random.randint(0, 90 * 86400)),
+        })
+    with engine.begin() as conn:
+        for sede_id in (1, 2, 3):
+            conn.execute(sedes.insert().values(id=sede_id, nombre=f"Sede {sede_id}", direccion="Calle 1", telefono="1"))
+        conn.execute(transacciones.insert(), filas)
+        reconstruir(conn)
+    return filas
+
+
+def sumar(filas: list) -> dict:
+    por_tipo = {}
+    for fila in filas:
+        grupo = por_tipo.setdefault(fila["tipo"], {"cantidad": 0, "total_ventas": 0.0, "total_ganancias": 0.0})
+        grupo["cantidad"] += 1
+        grupo["total_ventas"] += fila["precio_venta"]
+        grupo["total_ganancias"] += fila["ganancia"]
+    return por_tipo
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"sede_id": 2},
+    {"fecha_inicio": "2024-02-01", "fecha_fin": "2024-02-29"},
+    {"sede_id": 3, "fecha_inicio": "2024-03-15"},
+])
+def test_estadisticas_igual_a_sumar_las_filas(cliente, crear_usuario, params):
+    encabezados, usuario_id = crear_usuario()
+    filas = sembrar(usuario_id)
+
+    desde = date.fromisoformat(params.get("fecha_inicio", "2000-01-01"))
+    hasta = date.fromisoformat(params.get("fecha_fin", "2100-01-01"))
+    seleccion = [
+        fila for fila in filas
+        if fila["sede_id"] == params.get("sede_id", fila["sede_id"])
+        and desde <= fila["fecha_transaccion"].date() <= hasta
+    ]
+    esperado = sumar(seleccion)
+
+    estadisticas = cliente.get("/transacciones/estadisticas", headers=encabezados, params=params).json()
+    assert estadisticas["total_transacciones"] == len(seleccion)
+    assert estadisticas["total_ventas"] == pytest.approx(sum(f["precio_venta"] for f in seleccion))
+    assert estadisticas["total_ganancias"] == pytest.approx(sum(f["ganancia"] for f in seleccion))
+    assert {t["tipo"] for t in estadisticas["por_tipo"]} == set(esperado)
+    for tipo in estadisticas["por_tipo"]:
+        grupo = esperado[tipo["tipo"]]
+        assert tipo["cantidad"] == grupo["cantidad"]
+        assert tipo["total_ventas"] == pytest.approx(grupo["total_ventas"])
+        assert tipo["total_ganancias"] == pytest.approx(grupo["total_ganancias"])
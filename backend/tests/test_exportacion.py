@@ -0,0 +1,112 @@
+"""
+Exportación en CSV y NDJSON: todas las filas, en bloques, con los mismos
+filtros y alcance por rol que los listados.
+"""
+import asyncio
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+
+from database import engine
+from exportacion import LOTE, respuesta_exportacion
+from models import sedes, transacciones
+from routers.transacciones import COLUMNAS_EXPORTACION
+from routers.articulos_valor import COLUMNAS_EXPORTACION as COLUMNAS_ARTICULOS
+
+TOTAL = LOTE * 2 + 37
+
+
+def sembrar(usuario_id: int, vendedor_id: int):
+    inicio = datetime(2024, 1, 1, 12, 0, 0)
+    with engine.begin() as conn:
+        conn.execute(sedes.insert().values(id=1, nombre="Sede", direccion="Calle 1", telefono="1"))
+        conn.execute(transacciones.insert(), [
+            {
+                "tipo": "venta_articulo", "usuario_id": vendedor_id if i % 10 == 0 else usuario_id,
+                "sede_id": 1, "precio_venta": 1000 + i, "ganancia": 100,
+                "cliente_nombre": "José, \"el de la moto\"" if i == 0 else f"Cliente {i}",
+                "fecha_transaccion": inicio + timedelta(hours=i),
+            }
+            for i in range(TOTAL)
+        ])
+
+
+def descargar(cliente, url: str, encabezados: dict, **params):
+    respuesta = cliente.get(url, params=params, headers=encabezados)
+    assert respuesta.status_code == 200, respuesta.text
+    return respuesta, respuesta.content.decode("utf-8")
+
+
+def test_se_envia_por_bloques():
+    async def filas():
+        for i in range(TOTAL):
+            yield {"id": i}
+
+    async def bloques(formato):
+        respuesta = respuesta_exportacion(filas(), ["id"], formato, "prueba")
+        return [bloque async for bloque in respuesta.body_iterator]
+
+    # Un bloque por cada LOTE filas (el CSV cierra con el resto del buffer)
+    assert [len(b.splitlines()) for b in asyncio.run(bloques("ndjson"))] == [LOTE, LOTE, 37]
+    assert [len(b.splitlines()) for b in asyncio.run(bloques("csv"))] == [LOTE + 1, LOTE, 37, 0]
+
+
+def test_csv_de_transacciones(cliente, crear_usuario):
+    admin, admin_id = crear_usuario()
+    _, vendedor_id = crear_usuario("vendedor", "vendedor@test.com", "Vendedor")
+    sembrar(admin_id, vendedor_id)
+
+    respuesta, texto = descargar(cliente, "/transacciones/export", admin, format="csv")
+    assert respuesta.headers["content-type"] == "text/csv; charset=utf-8"
+    assert respuesta.headers["content-disposition"] == (
+        f'attachment; filename="transacciones_{date.today().isoformat()}.csv"'
+    )
+    assert texto.startswith("\ufeff")
+
+    filas = list(csv.reader(io.StringIO(texto[1:])))
+    assert filas[0] == COLUMNAS_EXPORTACION
+    assert len(filas) == TOTAL + 1
+    por_id = {fila[0]: dict(zip(filas[0], fila)) for fila in filas[1:]}
+    assert len(por_id) == TOTAL
+    primera = min(por_id.values(), key=lambda fila: int(fila["id"]))
+    assert primera["cliente_nombre"] == "José, \"el de la moto\""
+    assert primera["vehiculo_id"] == ""
+
+
+def test_ndjson_con_filtros_y_alcance_de_vendedor(cliente, crear_usuario):
+    admin, admin_id = crear_usuario()
+    vendedor, vendedor_id = crear_usuario("vendedor", "vendedor@test.com", "Vendedor")
+    sembrar(admin_id, vendedor_id)
+
+    respuesta, texto = descargar(cliente, "/transacciones/export", admin, format="ndjson",
+                                    fecha_inicio="2024-01-02", fecha_fin="2024-01-03")
+    assert respuesta.headers["content-type"] == "application/x-ndjson"
+    filas = [json.loads(linea) for linea in texto.splitlines()]
+    # Días completos: de las 12:00 del 1 de enero, las horas 12..59
+    assert len(filas) == 48
+    assert all(fila["fecha_transaccion"][:10] in ("2024-01-02", "2024-01-03") for fila in filas)
+    assert set(filas[0]) == set(COLUMNAS_EXPORTACION)
+
+    _, texto = descargar(cliente, "/transacciones/export", vendedor, format="ndjson")
+    propias = [json.loads(linea) for linea in texto.splitlines()]
+    assert len(propias) == len(range(0, TOTAL, 10))
+    assert {fila["usuario_id"] for fila in propias} == {vendedor_id}
+
+
+def test_exportacion_de_inventario(cliente, admin, crear_vehiculo, crear_articulo):
+    crear_vehiculo("AAA111")
+    crear_vehiculo("BBB222", estado="vendido")
+    crear_articulo("Reloj", valor=1000000, interes_porcentaje=5, fecha_registro=date.today().isoformat())
+
+    _, texto = descargar(cliente, "/vehiculos/export", admin, format="ndjson", estado="disponible")
+    assert [json.loads(linea)["placa"] for linea in texto.splitlines()] == ["AAA111"]
+
+    _, texto = descargar(cliente, "/articulos_valor/export", admin, format="csv")
+    filas = list(csv.DictReader(io.StringIO(texto[1:])))
+    assert list(filas[0]) == COLUMNAS_ARTICULOS
+    assert float(filas[0]["valor_actual"]) == 1050000
+
+
+def test_formato_no_soportado(cliente, admin):
+    assert cliente.get("/transacciones/export", params={"format": "xlsx"}, headers=admin).status_code == 400
@@ -0,0 +1,76 @@
+"""
+El cálculo vectorizado de intereses debe dar lo mismo que la fórmula por fila
+con la que se calculaba antes, para artículos y vehículos.
+"""
+from datetime import date, timedelta
+
+import pytest
+
+from intereses import calcular_portafolio, calcular_interes, DIAS_POR_MES
+
+CORTE = date(2024, 6, 1)
+
+
+def interes_articulo(valor, porcentaje, fecha):
+    """Fórmula por fila de los artículos: el mes en curso se cobra desde el primer día"""
+    if not valor or not porcentaje or not fecha:
+        return 0, 0, valor or 0
+    meses = max(1, (CORTE - fecha).days // DIAS_POR_MES + 1)
+    interes = valor * (porcentaje / 100) * meses
+    return meses, round(interes, 2), round(valor + interes, 2)
+
+
+def interes_vehiculo(valor, porcentaje, fecha):
+    """Fórmula por fila de los vehículos: solo meses completos, mínimo uno"""
+    if not valor or not porcentaje or not fecha:
+        return 0, 0, valor or 0
+    meses = max(1, (CORTE - fecha).days // DIAS_POR_MES)
+    interes = valor * (porcentaje / 100) * meses
+    return meses, round(interes, 2), round(valor + interes, 2)
+
+
+PORTAFOLIO = [
+    # (valor, porcentaje, días antes del corte)
+    (1000000, 5, 0),
+    (1000000, 5, 31),
+    (1000000, 5, 32),
+    (1000000, 5, 63),
+    (1000000, 5, 64),
+    (2500000, 3.5, 400),
+    (333333, 7, 95),
+    (1000000, 0, 100),
+    (0, 5, 100),
+    (None, 5, 100),
+    (1000000, None, 100),
+    (1000000, 5, None),
+]
+
+
+@pytest.mark.parametrize("tipo, formula", [("articulo", interes_articulo), ("vehiculo", interes_vehiculo)])
+def test_portafolio_igual_a_la_formula_por_fila(tipo, formula):
+    valores = [valor for valor, _, _ in PORTAFOLIO]
+    porcentajes = [porcentaje for _, porcentaje, _ in PORTAFOLIO]
+    fechas = [CORTE - timedelta(days=dias) if dias is not None else None for _, _, dias in PORTAFOLIO]
+
+    meses, interes, valor_actual = calcular_portafolio(valores, porcentajes, fechas, tipo, CORTE)
+    for i, fila in enumerate(zip(valores, porcentajes, fechas)):
+        esperado_meses, esperado_interes, esperado_valor = formula(*fila)
+        assert meses[i] == esperado_meses, fila
+        assert interes[i] == pytest.approx(esperado_interes, abs=0.005), fila
+        assert valor_actual[i] == pytest.approx(esperado_valor, abs=0.005), fila
+
+        individual = calcular_interes(*fila, tipo, as_of=CORTE)
+        assert individual["meses_transcurridos"] == esperado_meses
+        assert individual["interes_acumulado"] == pytest.approx(esperado_interes, abs=0.005)
+
+
+def test_saldo_de_abonos_solo_cobra_los_meses_nuevos():
+    fecha = CORTE - timedelta(days=100)  # 4 meses para artículos
+    meses, interes, valor_actual = calcular_portafolio(
+        [1000000, 1000000], [5, 5], [fecha, fecha], "articulo", CORTE,
+        saldos_capital=[600000, None], saldos_interes=[20000, None], meses_liquidados=[3, None]
+    )
+    assert meses.tolist() == [4, 4]
+    # Un mes nuevo sobre el capital pendiente, más el interés que quedó sin pagar
+    assert interes.tolist() == [20000 + 600000 * 0.05, 1000000 * 0.05 * 4]
+    assert valor_actual.tolist() == [600000 + 50000, 1200000]
@@ -0,0 +1,213 @@
+"""
+Archivos de media: las URLs de los listados ya traen ?v=<sha256>, así que las
+variantes se piden agregando &size= (como hace mediaUrl en el frontend).
+"""
+import asyncio
+import hashlib
+import io
+
+from PIL import Image
+
+import media_variants
+from database import database
+from media_storage import save_bytes, CACHE_CONTROL_INMUTABLE, CACHE_CONTROL_REVALIDAR
+from models import media_variantes
+
+
+def subir_imagen(cliente, vehiculo_id: int, contenido: bytes):
+    respuesta = cliente.post(f"/vehiculos/{vehiculo_id}/imagenes",
+                             files={"imagen": ("foto.png", contenido, "image/png")})
+    assert respuesta.status_code == 201, respuesta.text
+    return respuesta.json()
+
+
+def test_url_listada_con_size_sirve_la_variante(cliente, crear_vehiculo, png):
+    vehiculo = crear_vehiculo()
+    original = png()
+    subir_imagen(cliente, vehiculo["id"], original)
+
+    url = cliente.get(f"/vehiculos/{vehiculo['id']}/imagenes").json()[0]["url"]
+    assert "?v=" in url
+
+    respuesta = cliente.get(f"{url}&size=thumb", headers={"Accept": "image/webp"})
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"] == "image/webp"
+    assert len(respuesta.content) < len(original)
+    assert max(Image.open(io.BytesIO(respuesta.content)).size) == 240
+    assert "immutable" in respuesta.headers["cache-control"]
+
+
+def test_lock_de_variantes_se_conserva_mientras_haya_quien_espere(cliente):
+    async def escenario():
+        async def esperar():
+            async with media_variants._bloqueo("abc"):
+                pass
+
+        async with media_variants._bloqueo("abc"):
+            en_espera = asyncio.create_task(esperar())
+            await asyncio.sleep(0)
+        # Al soltarlo el primero, quien espera sigue usando el mismo lock
+        assert "abc" in media_variants._locks
+        await en_espera
+        assert "abc" not in media_variants._locks
+
+    cliente.portal.call(escenario)
+
+
+def test_variantes_concurrentes_se_generan_una_vez(cliente, png):
+    blob = save_bytes(png("blue"))
+
+    async def varias():
+        await asyncio.gather(*(media_variants.crear_variantes(blob["sha256"], blob["ruta"]) for _ in range(4)))
+        return await database.fetch_all(
+            media_variantes.select().where(media_variantes.c.sha256_origen == blob["sha256"])
+        )
+
+    filas = cliente.portal.call(varias)
+    assert len(filas) == len(media_variants.VARIANTES) * len(media_variants.FORMATOS)
+
+
+def test_imagen_ilegible_sirve_el_original_sin_reintentar(cliente, crear_vehiculo, monkeypatch):
+    lecturas = []
+    original_read_bytes = media_variants.read_bytes
+    monkeypatch.setattr(media_variants, "read_bytes", lambda ruta: lecturas.append(ruta) or original_read_bytes(ruta))
+
+    vehiculo = crear_vehiculo()
+    subida = subir_imagen(cliente, vehiculo["id"], b"no es una imagen")
+    assert len(lecturas) == 1
+
+    for _ in range(2):
+        respuesta = cliente.get(f"{subida['url']}&size=thumb")
+        assert respuesta.status_code == 200
+        assert respuesta.content == b"no es una imagen"
+    assert len(lecturas) == 1
+
+
+def test_primera_peticion_sin_variante_sirve_el_original(cliente, crear_vehiculo, png):
+    vehiculo = crear_vehiculo()
+    original = png("green")
+    subida = subir_imagen(cliente, vehiculo["id"], original)
+    # Como una imagen subida antes de existir las variantes
+    cliente.portal.call(database.execute, media_variantes.delete())
+
+    primera = cliente.get(f"{subida['url']}&size=thumb", headers={"Accept": "image/webp"})
+    assert primera.content == original
+    assert primera.headers["cache-control"] == CACHE_CONTROL_REVALIDAR
+
+    # La variante se generó en segundo plano después de la primera respuesta
+    segunda = cliente.get(f"{subida['url']}&size=thumb", headers={"Accept": "image/webp"})
+    assert segunda.headers["content-type"] == "image/webp"
+    assert "immutable" in segunda.headers["cache-control"]
+
+
+def test_listado_solo_devuelve_metadatos(cliente, crear_vehiculo, png):
+    vehiculo = crear_vehiculo()
+    contenido = png()
+    subir_imagen(cliente, vehiculo["id"], contenido)
+
+    media = cliente.get(f"/vehiculos/{vehiculo['id']}/media").json()[0]
+    assert set(media) == {"id", "vehiculo_id", "archivo", "url", "tipo", "mime", "tamano",
+                          "es_principal", "titulo", "orden"}
+    assert media["tamano"] == len(contenido)
+    assert media["url"] == f"/vehiculos/{vehiculo['id']}/media/{media['id']}/raw?v={hashlib.sha256(contenido).hexdigest()}"
+
+
+def test_descarga_sirve_el_archivo_con_etag(cliente, crear_vehiculo, png):
+    vehiculo = crear_vehiculo()
+    contenido = png()
+    subida = subir_imagen(cliente, vehiculo["id"], contenido)
+
+    respuesta = cliente.get(subida["url"])
+    assert respuesta.status_code == 200
+    assert respuesta.content == contenido
+    assert respuesta.headers["content-type"] == "image/png"
+    assert respuesta.headers["etag"] == f'"{hashlib.sha256(contenido).hexdigest()}"'
+
+    revalidada = cliente.get(subida["url"], headers={"If-None-Match": respuesta.headers["etag"]})
+    assert revalidada.status_code == 304
+    assert revalidada.content == b""
+
+    distinta = cliente.get(subida["url"], headers={"If-None-Match": '"otro"'})
+    assert distinta.status_code == 200
+
+
+def test_cache_inmutable_solo_con_el_hash_del_archivo(cliente, crear_vehiculo, png):
+    vehiculo = crear_vehiculo()
+    subida = subir_imagen(cliente, vehiculo["id"], png())
+    sin_version = subida["url"].split("?")[0]
+
+    assert cliente.get(subida["url"]).headers["cache-control"] == CACHE_CONTROL_INMUTABLE
+    assert cliente.get(sin_version).headers["cache-control"] == CACHE_CONTROL_REVALIDAR
+    assert cliente.get(f"{sin_version}?v=otro").headers["cache-control"] == CACHE_CONTROL_REVALIDAR
+
+
+def test_descarga_de_imagen_de_articulo(cliente, crear_articulo, png):
+    articulo = crear_articulo()
+    contenido = png()
+    subida = cliente.post(f"/articulos_valor/{articulo['id']}/imagenes",
+                          files={"imagen": ("foto.png", contenido, "image/png")}).json()
+
+    listada = cliente.get(f"/articulos_valor/{articulo['id']}/imagenes").json()[0]
+    assert listada["url"] == subida["url"]
+    assert set(listada) == {"id", "articulo_id", "imagen", "url", "mime", "tamano", "es_principal"}
+
+    respuesta = cliente.get(listada["url"])
+    assert respuesta.content == contenido
+    assert respuesta.headers["cache-control"] == CACHE_CONTROL_INMUTABLE
+    assert cliente.get(listada["url"], headers={"If-None-Match": respuesta.headers["etag"]}).status_code == 304
+
+
+def subir_video(cliente, vehiculo_id: int, contenido: bytes):
+    respuesta = cliente.post(f"/vehiculos/{vehiculo_id}/videos",
+                             files={"video": ("video.mp4", contenido, "video/mp4")})
+    assert respuesta.status_code == 201, respuesta.text
+    return respuesta.json()
+
+
+def test_range_devuelve_206_con_el_fragmento(cliente, crear_vehiculo):
+    contenido = bytes(range(256)) * 40
+    subida = subir_video(cliente, crear_vehiculo()["id"], contenido)
+
+    respuesta = cliente.get(subida["url"], headers={"Range": "bytes=100-199"})
+    assert respuesta.status_code == 206
+    assert respuesta.content == contenido[100:200]
+    assert respuesta.headers["content-range"] == f"bytes 100-199/{len(contenido)}"
+    assert respuesta.headers["content-length"] == "100"
+    assert respuesta.headers["accept-ranges"] == "bytes"
+
+    abierto = cliente.get(subida["url"], headers={"Range": f"bytes={len(contenido) - 10}-"})
+    assert abierto.status_code == 206
+    assert abierto.content == contenido[-10:]
+
+    sufijo = cliente.get(subida["url"], headers={"Range": "bytes=-5"})
+    assert sufijo.status_code == 206
+    assert sufijo.content == contenido[-5:]
+
+
+def test_range_fuera_del_archivo_devuelve_416(cliente, crear_vehiculo):
+    contenido = b"x" * 1000
+    subida = subir_video(cliente, crear_vehiculo()["id"], contenido)
+
+    respuesta = cliente.get(subida["url"], headers={"Range": "bytes=1000-"})
+    assert respuesta.status_code == 416
+    assert respuesta.headers["content-range"] == "bytes */1000"
+
+    # Un encabezado que no se entiende (o varios rangos) se ignora
+    for rango in ("bytes=a-b", "bytes=0-1,5-6"):
+        completo = cliente.get(subida["url"], headers={"Range": rango})
+        assert completo.status_code == 200
+        assert completo.content == contenido
+
+
+def test_if_range_solo_aplica_el_rango_si_el_etag_coincide(cliente, crear_vehiculo):
+    contenido = bytes(range(256)) * 4
+    subida = subir_video(cliente, crear_vehiculo()["id"], contenido)
+    etag = cliente.get(subida["url"]).headers["etag"]
+
+    vigente = cliente.get(subida["url"], headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert vigente.status_code == 206
+    assert vigente.content == contenido[:10]
+
+    cambiado = cliente.get(subida["url"], headers={"Range": "bytes=0-9", "If-Range": '"otro"'})
+    assert cambiado.status_code == 200
+    assert cambiado.content == contenido
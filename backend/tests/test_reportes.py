@@ -0,0 +1,66 @@
+"""
+Resumen de reportes: los totales calculados con GROUP BY deben coincidir con
+los datos cargados (inventario, ventas, mantenimientos y empeños).
+"""
+from datetime import date
+
+from database import engine
+from models import mantenimientos
+
+
+def test_totales_del_resumen(cliente, crear_usuario, crear_vehiculo, crear_articulo, sede):
+    admin, admin_id = crear_usuario()
+    crear_vehiculo("AAA111", precio_compra=8000000, precio_venta=10000000)
+    vendido = crear_vehiculo("BBB222", precio_compra=9000000, precio_venta=12000000)
+    empenado = crear_vehiculo("CCC333")
+    crear_articulo("Reloj", valor=500000, estado="disponible")
+    crear_articulo("Cadena", valor=1000000, fecha_registro=date.today().isoformat(), interes_porcentaje=5)
+    abonado = crear_articulo("Anillo", valor=2000000, fecha_registro=date.today().isoformat(), interes_porcentaje=5)
+
+    assert cliente.post("/transacciones/", headers=admin, json={
+        "tipo": "venta_vehiculo", "vehiculo_id": vendido["id"], "precio_venta": 12500000
+    }).status_code == 200
+    assert cliente.post(f"/vehiculos/{empenado['id']}/empenar", json={
+        "valor_empeno": 3000000, "interes_porcentaje": 4, "cliente_nombre": "Ana",
+        "usuario_id": admin_id, "sede_id": sede
+    }).status_code == 200
+    # 100.000 de interés del primer mes y 400.000 a capital
+    assert cliente.patch(f"/articulos_valor/{abonado['id']}/abono", params={"monto_abono": 500000}).status_code == 200
+    with engine.begin() as conn:
+        conn.execute(mantenimientos.insert(), [
+            {"vehiculo_id": vendido["id"], "fecha_servicio": date(2024, 1, 10), "servicio": "Aceite", "costo": 80000},
+            {"vehiculo_id": vendido["id"], "fecha_servicio": date(2024, 1, 25), "servicio": "Frenos", "costo": 120000},
+            {"vehiculo_id": empenado["id"], "fecha_servicio": date(2024, 2, 3), "servicio": "Llantas", "costo": 300000},
+        ])
+
+    respuesta = cliente.get("/reportes/resumen", headers=admin)
+    assert respuesta.status_code == 200
+    resumen = respuesta.json()
+    assert resumen["totales"] == {
+        "valor_inventario": 10000000 + 500000,
+        "ingresos_ventas": 12500000,
+        "ganancia_bruta": 12500000 - 9000000,
+        "costo_mantenimientos": 500000,
+        "ganancia_neta": 3500000 - 500000,
+        "capital_empenado": 3000000 + 1000000 + 1600000,
+    }
+    assert [(f["vehiculo_id"], f["mes"], f["cantidad"], f["costo"]) for f in resumen["mantenimientos"]] == [
+        (vendido["id"], "2024-01", 2, 200000),
+        (empenado["id"], "2024-02", 1, 300000),
+    ]
+    empenos = {f["tipo"]: f for f in resumen["empenos"]}
+    assert empenos["articulo"]["cantidad"] == 2
+    assert empenos["articulo"]["total_abonado"] == 500000
+    assert empenos["vehiculo"]["valor_prestado"] == 3000000
+    # El empeño del vehículo es una transacción pero no un ingreso
+    assert {f["tipo"] for f in resumen["ventas"]} == {"venta_vehiculo", "empeño_vehiculo"}
+
+    febrero = cliente.get("/reportes/resumen", headers=admin,
+                          params={"desde": "2024-02-01", "hasta": "2024-02-29"}).json()
+    assert febrero["totales"]["costo_mantenimientos"] == 300000
+    assert febrero["totales"]["ingresos_ventas"] == 0
+
+
+def test_rango_invalido(cliente, admin):
+    respuesta = cliente.get("/reportes/resumen", headers=admin, params={"desde": "2024-03-01", "hasta": "2024-02-01"})
+    assert respuesta.status_code == 400
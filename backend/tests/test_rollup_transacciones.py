@@ -0,0 +1,89 @@
+"""
+Resumen diario de transacciones: después de crear, editar o eliminar debe
+coincidir con los totales calculados desde las filas, y las estadísticas
+incluyen el día completo de fecha_fin.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import select
+
+from database import engine
+from models import sedes, transacciones, transacciones_diarias
+from rollup_transacciones import reconstruir
+
+
+def resumen_guardado() -> dict:
+    with engine.connect() as conn:
+        filas = conn.execute(select(transacciones_diarias)).mappings().all()
+    return {
+        (str(f["fecha"]), f["sede_id"], f["usuario_id"], f["tipo"]):
+            (f["cantidad"], float(f["total_ventas"]), float(f["total_ganancias"]))
+        for f in filas if f["cantidad"]
+    }
+
+
+def resumen_desde_filas() -> dict:
+    esperado = defaultdict(lambda: [0, 0.0, 0.0])
+    with engine.connect() as conn:
+        for f in conn.execute(select(transacciones)).mappings():
+            clave = (str(f["fecha_transaccion"].date()), f["sede_id"], f["usuario_id"], f["tipo"])
+            esperado[clave][0] += 1
+            esperado[clave][1] += float(f["precio_venta"] or 0)
+            esperado[clave][2] += float(f["ganancia"] or 0)
+    return {clave: tuple(valores) for clave, valores in esperado.items()}
+
+
+def test_resumen_coincide_con_las_filas(cliente, admin, crear_vehiculo, crear_articulo):
+    vendidos = []
+    for i in range(3):
+        articulo = crear_articulo(f"Artículo {i}", estado="disponible", valor=100000)
+        venta = cliente.post("/transacciones/", headers=admin, json={
+            "tipo": "venta_articulo", "articulo_id": articulo["id"], "precio_venta": 150000 + i
+        })
+        assert venta.status_code == 200, venta.text
+        vendidos.append((venta.json()["id"], articulo["id"]))
+    vehiculo = crear_vehiculo()
+    assert cliente.post("/transacciones/", headers=admin, json={
+        "tipo": "venta_vehiculo", "vehiculo_id": vehiculo["id"], "precio_venta": 12000000
+    }).status_code == 200
+    assert resumen_guardado() == resumen_desde_filas()
+
+    transaccion_id, articulo_id = vendidos[0]
+    editada = cliente.put(f"/transacciones/{transaccion_id}", headers=admin, json={
+        "tipo": "venta_articulo", "articulo_id": articulo_id, "precio_venta": 400000
+    })
+    assert editada.status_code == 200, editada.text
+    assert resumen_guardado() == resumen_desde_filas()
+
+    assert cliente.delete(f"/transacciones/{vendidos[1][0]}", headers=admin).status_code == 200
+    assert resumen_guardado() == resumen_desde_filas()
+
+    estadisticas = cliente.get("/transacciones/estadisticas", headers=admin).json()
+    assert estadisticas["total_transacciones"] == 3
+    assert estadisticas["total_ventas"] == 400000 + 150002 + 12000000
+
+    # Reconstruir desde cero da el mismo resultado que el mantenimiento incremental
+    with engine.begin() as conn:
+        reconstruir(conn)
+    assert resumen_guardado() == resumen_desde_filas()
+
+
+def test_fecha_fin_incluye_el_dia_completo(cliente, crear_usuario):
+    encabezados, usuario_id = crear_usuario()
+    with engine.begin() as conn:
+        conn.execute(sedes.insert().values(id=1, nombre="Sede", direccion="Calle 1", telefono="1"))
+        for fecha, precio in ((datetime(2024, 3, 9, 23, 59, 59), 1),
+                              (datetime(2024, 3, 10, 0, 0, 0), 10),
+                              (datetime(2024, 3, 10, 23, 59, 59), 100),
+                              (datetime(2024, 3, 11, 0, 0, 0), 1000)):
+            conn.execute(transacciones.insert().values(
+                tipo="venta_articulo", usuario_id=usuario_id, sede_id=1,
+                precio_venta=precio, ganancia=0, fecha_transaccion=fecha
+            ))
+        reconstruir(conn)
+
+    estadisticas = cliente.get("/transacciones/estadisticas", headers=encabezados,
+                               params={"fecha_inicio": "2024-03-10", "fecha_fin": "2024-03-10"}).json()
+    assert estadisticas["total_transacciones"] == 2
+    assert estadisticas["total_ventas"] == 110
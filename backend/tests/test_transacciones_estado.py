@@ -0,0 +1,46 @@
+"""
+Cambios de estado de las transacciones: dos ventas simultáneas del mismo bien
+no pueden pasar las dos, y al eliminar una venta el bien vuelve a su estado.
+"""
+import asyncio
+
+from fastapi import HTTPException
+
+from database import database
+from models import transacciones
+from routers.transacciones import crear_transaccion, TransaccionCreate
+
+
+def test_ventas_simultaneas_del_mismo_vehiculo(cliente, crear_usuario, crear_vehiculo):
+    _, usuario_id = crear_usuario()
+    vehiculo = crear_vehiculo()
+    usuario = {"id": usuario_id, "rol": "administrador"}
+
+    async def vender(precio: float):
+        venta = TransaccionCreate(tipo="venta_vehiculo", vehiculo_id=vehiculo["id"], precio_venta=precio)
+        return await crear_transaccion(venta, usuario)
+
+    async def simultaneas():
+        return await asyncio.gather(*(vender(10000000 + i) for i in range(4)), return_exceptions=True)
+
+    resultados = cliente.portal.call(simultaneas)
+    exitos = [r for r in resultados if isinstance(r, dict)]
+    rechazos = [r for r in resultados if isinstance(r, HTTPException)]
+    assert len(exitos) == 1
+    assert len(rechazos) == 3
+    assert all(r.status_code == 400 for r in rechazos)
+
+    assert cliente.get(f"/vehiculos/{vehiculo['id']}").json()["estado"] == "vendido"
+    assert len(cliente.portal.call(database.fetch_all, transacciones.select())) == 1
+
+
+def test_eliminar_venta_devuelve_el_articulo_a_disponible(cliente, admin, crear_articulo):
+    articulo = crear_articulo(estado="disponible")
+    venta = cliente.post("/transacciones/", headers=admin, json={
+        "tipo": "venta_articulo", "articulo_id": articulo["id"], "precio_venta": 1500000
+    })
+    assert venta.status_code == 200, venta.text
+    assert cliente.get(f"/articulos_valor/{articulo['id']}").json()["estado"] == "vendido"
+
+    assert cliente.delete(f"/transacciones/{venta.json()['id']}", headers=admin).status_code == 200
+    assert cliente.get(f"/articulos_valor/{articulo['id']}").json()["estado"] == "disponible"
@@ -0,0 +1,112 @@
+"""
+El listado de transacciones debe hacer la misma cantidad de consultas sin
+importar cuántas filas devuelva (antes eran hasta 3 consultas extra por fila),
+y la paginación por cursor no debe saltar ni repetir filas con la misma fecha.
+
+    cd backend && python -m pytest -q tests
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from database import database, engine
+from models import sedes, vehiculos, articulos_valor, transacciones
+
+TOTAL_TRANSACCIONES = 60
+
+
+def sembrar(usuario_id: int):
+    """Transacciones de vehículos y artículos distintos, para que cada fila tenga su propio JOIN"""
+    with engine.begin() as conn:
+        conn.execute(sedes.insert().values(id=1, nombre="Sede", direccion="Calle 1", telefono="1"))
+        for i in range(1, TOTAL_TRANSACCIONES + 1):
+            conn.execute(vehiculos.insert().values(id=i, marca="Marca", modelo=str(i), placa=f"AAA{i:03d}", sede_id=1))
+            conn.execute(articulos_valor.insert().values(
+                id=i, descripcion=f"Artículo {i}", valor=100, fecha_registro=date(2024, 1, 1), sede_id=1
+            ))
+            conn.execute(transacciones.insert().values(
+                tipo="venta_vehiculo" if i % 2 else "venta_articulo",
+                vehiculo_id=i if i % 2 else None,
+                articulo_id=None if i % 2 else i,
+                usuario_id=usuario_id,
+                sede_id=1,
+                precio_venta=1000,
+                ganancia=100,
+            ))
+
+
+@pytest.fixture
+def sembrado(cliente, crear_usuario):
+    encabezados, usuario_id = crear_usuario()
+    cliente.headers.update(encabezados)
+    sembrar(usuario_id)
+    return cliente
+
+
+@pytest.fixture
+def contador(monkeypatch):
+    """Cuenta las consultas que pasan por database durante la prueba"""
+    consultas = []
+    for metodo in ("fetch_all", "fetch_one", "fetch_val", "execute", "execute_many"):
+        original = getattr(database, metodo)
+
+        def envoltura(*args, _original=original, **kwargs):
+            consultas.append(args[0] if args else kwargs.get("query"))
+            return _original(*args, **kwargs)
+
+        monkeypatch.setattr(database, metodo, envoltura)
+    return consultas
+
+
+def consultas_listado(cliente, contador, limit: int) -> int:
+    contador.clear()
+    respuesta = cliente.get("/transacciones/", params={"limit": limit})
+    assert respuesta.status_code == 200
+    filas = respuesta.json()
+    assert len(filas) == limit
+    assert all(fila.get("vehiculo_info") or fila.get("articulo_info") for fila in filas)
+    assert all(fila.get("usuario_nombre") == "Admin" for fila in filas)
+    return len(contador)
+
+
+def test_listado_con_cantidad_constante_de_consultas(sembrado, contador):
+    # La primera llamada carga el caché de nombres de usuario
+    sembrado.get("/transacciones/", params={"limit": 1})
+
+    pocas = consultas_listado(sembrado, contador, 5)
+    muchas = consultas_listado(sembrado, contador, 50)
+    assert pocas == muchas
+    assert muchas <= 2
+
+
+def test_cursor_pagina_filas_con_la_misma_fecha(cliente, crear_usuario):
+    encabezados, usuario_id = crear_usuario()
+    cliente.headers.update(encabezados)
+    # Mismo instante con fracción de segundo: el cursor no debe truncarla
+    fecha = datetime(2024, 5, 1, 10, 30, 15, 250000)
+    with engine.begin() as conn:
+        conn.execute(sedes.insert().values(id=1, nombre="Sede", direccion="Calle 1", telefono="1"))
+        for _ in range(7):
+            conn.execute(transacciones.insert().values(
+                tipo="venta_articulo", usuario_id=usuario_id, sede_id=1,
+                precio_venta=1000, ganancia=100, fecha_transaccion=fecha,
+            ))
+        conn.execute(transacciones.insert().values(
+            tipo="venta_articulo", usuario_id=usuario_id, sede_id=1,
+            precio_venta=1000, ganancia=100, fecha_transaccion=fecha - timedelta(seconds=1),
+        ))
+
+    vistas, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        respuesta = cliente.get("/transacciones/", params=params)
+        assert respuesta.status_code == 200
+        vistas += [fila["id"] for fila in respuesta.json()]
+        cursor = respuesta.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    todas = [fila["id"] for fila in cliente.get("/transacciones/", params={"limit": 100}).json()]
+    assert vistas == todas
+    assert len(vistas) == 8
+    assert all("fecha_cursor" not in fila for fila in cliente.get("/transacciones/").json())
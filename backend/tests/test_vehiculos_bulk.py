@@ -0,0 +1,84 @@
+"""
+Carga masiva de vehículos: CSV o JSON, cada fila se valida por separado y las
+placas repetidas (en el archivo o en la base) se informan sin detener la carga.
+"""
+import json
+
+
+def cargar_csv(cliente, texto: str):
+    respuesta = cliente.post("/vehiculos/bulk", content=texto.encode("utf-8"), headers={"Content-Type": "text/csv"})
+    assert respuesta.status_code == 200, respuesta.text
+    return respuesta.json()
+
+
+def cargar_json(cliente, filas: list):
+    respuesta = cliente.post("/vehiculos/bulk", content=json.dumps(filas), headers={"Content-Type": "application/json"})
+    assert respuesta.status_code == 200, respuesta.text
+    return respuesta.json()
+
+
+def test_carga_csv(cliente, sede):
+    resultado = cargar_csv(cliente, (
+        "\ufeffmarca,modelo,placa,sede_id,precio_venta,soat_vencimiento\n"
+        f"Yamaha,FZ,AAA111,{sede},9000000,2025-06-30\n"
+        f"Honda,CB,BBB222,{sede},,\n"
+    ))
+    assert resultado["total"] == 2
+    assert resultado["insertados"] == 2
+    assert all(fila["ok"] and fila["id"] for fila in resultado["filas"])
+
+    vehiculos = {v["placa"]: v for v in cliente.get("/vehiculos/").json()}
+    assert vehiculos["AAA111"]["precio_venta"] == 9000000
+    assert vehiculos["AAA111"]["soat_vencimiento"] == "2025-06-30"
+    # Las celdas vacías toman el valor por defecto
+    assert vehiculos["BBB222"]["precio_venta"] is None
+    assert vehiculos["BBB222"]["estado"] == "disponible"
+
+
+def test_carga_json(cliente, sede):
+    resultado = cargar_json(cliente, [
+        {"marca": "Suzuki", "placa": "CCC333", "sede_id": sede},
+        {"marca": "AKT", "placa": "DDD444", "sede_id": sede, "estado": "baja"},
+    ])
+    assert resultado["insertados"] == 2
+    assert {v["placa"]: v["estado"] for v in cliente.get("/vehiculos/").json()} == {
+        "CCC333": "disponible", "DDD444": "baja"
+    }
+
+
+def test_errores_por_fila_no_detienen_la_carga(cliente, sede):
+    resultado = cargar_json(cliente, [
+        {"marca": "Yamaha", "placa": "AAA111", "sede_id": sede},
+        {"marca": "Honda", "placa": "BBB222", "precio_venta": "caro"},
+        {"marca": "Suzuki", "placa": "CCC333", "estado": "robado"},
+        {"marca": "AKT", "placa": "DDD444", "sede_id": sede},
+    ])
+    assert (resultado["total"], resultado["insertados"], resultado["errores"]) == (4, 2, 2)
+    filas = {fila["fila"]: fila for fila in resultado["filas"]}
+    assert filas[1]["ok"] and filas[4]["ok"]
+    assert not filas[2]["ok"] and "precio_venta" in filas[2]["error"]
+    assert not filas[3]["ok"] and "estado" in filas[3]["error"]
+    assert sorted(v["placa"] for v in cliente.get("/vehiculos/").json()) == ["AAA111", "DDD444"]
+
+
+def test_placas_repetidas_en_el_archivo_y_en_la_base(cliente, crear_vehiculo, sede):
+    crear_vehiculo("AAA111")
+    resultado = cargar_csv(cliente, (
+        "marca,placa,sede_id\n"
+        f"Yamaha,AAA111,{sede}\n"
+        f"Honda,BBB222,{sede}\n"
+        f"Suzuki,BBB222,{sede}\n"
+    ))
+    assert resultado["insertados"] == 1
+    filas = resultado["filas"]
+    assert not filas[0]["ok"] and "AAA111" in filas[0]["error"]
+    assert filas[1]["ok"]
+    assert not filas[2]["ok"] and "BBB222" in filas[2]["error"]
+    assert len(cliente.get("/vehiculos/").json()) == 2
+
+
+def test_archivo_ilegible(cliente):
+    assert cliente.post("/vehiculos/bulk", content=b"{no es json",
+                        headers={"Content-Type": "application/json"}).status_code == 400
+    assert cliente.post("/vehiculos/bulk", content=b'{"placa": "AAA111"}',
+                        headers={"Content-Type": "application/json"}).status_code == 400
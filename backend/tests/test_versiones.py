@@ -0,0 +1,69 @@
+"""
+Concurrencia optimista con ETag/If-Match en vehículos y artículos: una versión
+vieja responde 412, un registro inexistente 404, y sin If-Match la escritura
+se aplica sin condición (como antes de existir las versiones).
+"""
+
+
+def test_crear_devuelve_la_version_inicial(cliente, sede):
+    respuesta = cliente.post("/vehiculos/", json={"marca": "Honda", "placa": "AAA111", "sede_id": sede})
+    assert respuesta.status_code == 201
+    vehiculo = respuesta.json()
+    assert vehiculo["version"] == 1
+    assert respuesta.headers["etag"] == f'"vehiculo-{vehiculo["id"]}-v1"'
+    assert cliente.get(f"/vehiculos/{vehiculo['id']}").headers["etag"] == respuesta.headers["etag"]
+
+
+def test_if_match_vigente_guarda_y_sube_la_version(cliente, crear_vehiculo):
+    vehiculo = crear_vehiculo()
+    etag = cliente.get(f"/vehiculos/{vehiculo['id']}").headers["etag"]
+
+    respuesta = cliente.put(f"/vehiculos/{vehiculo['id']}", json={"color": "Rojo"}, headers={"If-Match": etag})
+    assert respuesta.status_code == 200
+    assert respuesta.json()["color"] == "Rojo"
+    assert respuesta.json()["version"] == vehiculo["version"] + 1
+    assert respuesta.headers["etag"] != etag
+
+
+def test_if_match_viejo_responde_412_sin_modificar(cliente, crear_vehiculo):
+    vehiculo = crear_vehiculo()
+    etag = cliente.get(f"/vehiculos/{vehiculo['id']}").headers["etag"]
+    # Otra sede guarda primero
+    assert cliente.put(f"/vehiculos/{vehiculo['id']}", json={"color": "Azul"},
+                       headers={"If-Match": etag}).status_code == 200
+
+    for if_match in (etag, f"W/{etag}"):
+        respuesta = cliente.put(f"/vehiculos/{vehiculo['id']}", json={"color": "Rojo"}, headers={"If-Match": if_match})
+        assert respuesta.status_code == 412
+    actual = cliente.get(f"/vehiculos/{vehiculo['id']}").json()
+    assert actual["color"] == "Azul"
+    assert actual["version"] == vehiculo["version"] + 1
+
+
+def test_if_match_de_registro_inexistente_responde_404(cliente):
+    respuesta = cliente.put("/vehiculos/999", json={"color": "Rojo"}, headers={"If-Match": '"vehiculo-999-v1"'})
+    assert respuesta.status_code == 404
+
+
+def test_sin_if_match_la_escritura_se_aplica(cliente, crear_vehiculo):
+    vehiculo = crear_vehiculo()
+    cliente.put(f"/vehiculos/{vehiculo['id']}", json={"color": "Azul"})
+
+    respuesta = cliente.put(f"/vehiculos/{vehiculo['id']}", json={"color": "Rojo"})
+    assert respuesta.status_code == 200
+    assert respuesta.json()["color"] == "Rojo"
+    assert respuesta.json()["version"] == vehiculo["version"] + 2
+
+
+def test_if_match_en_articulos(cliente, crear_articulo):
+    articulo = crear_articulo()
+    assert articulo["version"] == 1
+    etag = f'"articulo-{articulo["id"]}-v1"'
+
+    guardado = cliente.put(f"/articulos_valor/{articulo['id']}", json={"valor": 2000000}, headers={"If-Match": etag})
+    assert guardado.status_code == 200
+    assert guardado.json()["version"] == 2
+
+    viejo = cliente.put(f"/articulos_valor/{articulo['id']}", json={"valor": 3000000}, headers={"If-Match": etag})
+    assert viejo.status_code == 412
+    assert cliente.get(f"/articulos_valor/{articulo['id']}").json()["valor"] == 2000000
@@ -0,0 +1,74 @@
+"""
+Control de concurrencia optimista para vehículos y artículos de valor.
+
+Cada fila tiene una columna version que sube en cada escritura. Los GET
+devuelven un ETag con la versión y las escrituras aceptan If-Match: el UPDATE
+se condiciona a la versión enviada y, si otra sede guardó primero, no modifica
+filas y se responde 412. Sin If-Match la escritura se aplica como antes.
+"""
+import re
+from typing import List, Optional
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import select, true
+from database import database, execute_rowcount
+from models import articulos_valor, vehiculos
+
+# recurso -> (tabla, mensaje si no existe)
+RECURSOS = {
+    "vehiculo": (vehiculos, "Vehículo no encontrado"),
+    "articulo": (articulos_valor, "Artículo no encontrado"),
+}
+
+MENSAJE_CONFLICTO = "El registro fue modificado por otro usuario. Recarga los datos e intenta de nuevo."
+
+
+def etag(recurso: str, fila) -> str:
+    return f'"{recurso}-{fila["id"]}-v{fila["version"]}"'
+
+
+def agregar_etag(response: Response, recurso: str, fila):
+    response.headers["ETag"] = etag(recurso, fila)
+
+
+def versiones_if_match(request: Request, recurso: str, id: int) -> Optional[List[int]]:
+    """
+    Versiones aceptadas según If-Match. None si no se envió (o es *): la
+    escritura no se condiciona. Los ETag débiles o de otro registro no
+    coinciden nunca (comparación fuerte), así que devuelven una lista vacía.
+    """
+    if_match = request.headers.get("if-match")
+    if not if_match or if_match.strip() == "*":
+        return None
+    patron = re.compile(rf'"{recurso}-{id}-v(\d+)"')
+    versiones = []
+    for candidato in if_match.split(","):
+        coincidencia = patron.fullmatch(candidato.strip())
+        if coincidencia:
+            versiones.append(int(coincidencia.group(1)))
+    return versiones
+
+
+def verificar_version(fila, versiones: Optional[List[int]]):
+    """412 si la versión leída ya no es la que tiene el cliente"""
+    if versiones is not None and fila["version"] not in versiones:
+        raise HTTPException(status_code=412, detail=MENSAJE_CONFLICTO)
+
+
+def condicion_version(tabla, versiones: Optional[List[int]]):
+    return tabla.c.version.in_(versiones) if versiones is not None else true()
+
+
+async def actualizar_con_version(recurso: str, id: int, versiones: Optional[List[int]], valores: dict):
+    """
+    UPDATE condicionado a la versión de If-Match que además sube la versión.
+    Si no modifica filas responde 404 o 412 según si el registro existe.
+    """
+    tabla, no_encontrado = RECURSOS[recurso]
+    query = tabla.update().where(
+        (tabla.c.id == id) & condicion_version(tabla, versiones)
+    ).values(**valores, version=tabla.c.version + 1)
+    if await execute_rowcount(query) == 0:
+        existe = await database.fetch_val(select(tabla.c.id).where(tabla.c.id == id))
+        if existe is None:
+            raise HTTPException(status_code=404, detail=no_encontrado)
+        raise HTTPException(status_code=412, detail=MENSAJE_CONFLICTO)
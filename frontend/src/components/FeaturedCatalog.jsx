@@ -19,36 +19,15 @@ const FeaturedCatalog = () => {
   const loadVehiculos = async () => {
     try {
       setLoading(true);
-      // Obtener vehículos disponibles
-      const vehiculosResponse = await axios.get(`${API_URL}/vehiculos/`);
-      const vehiculosDisponibles = vehiculosResponse.data.filter(vehiculo =>
-        vehiculo.estado === 'disponible' && vehiculo.destacado
-      );
+      // Destacados visibles y disponibles, con la url de su imagen principal
+      const vehiculosResponse = await axios.get(`${API_URL}/vehiculos/destacados`);
+      const vehiculosDestacados = vehiculosResponse.data.map(vehiculo => ({
+        ...vehiculo,
+        foto: vehiculo.imagen_principal_url ? `${API_URL}${vehiculo.imagen_principal_url}` :
+          'https://images.unsplash.com/photo-1503736334956-4c8f8e92946d?auto=format&fit=crop&w=400&q=80'
+      }));
 
-      // Cargar imágenes para cada vehículo destacado (máximo 6)
-      const vehiculosConImagenes = await Promise.all(
-        vehiculosDisponibles.slice(0, 6).map(async (vehiculo) => {
-          try {
-            const imagenesResponse = await axios.get(`${API_URL}/vehiculos/${vehiculo.id}/imagenes`);
-            const imagenes = imagenesResponse.data;
-            const imagenPrincipal = imagenes.find(img => img.es_principal) || imagenes[0];
-
-            return {
-              ...vehiculo,
-              foto: imagenPrincipal ? `data:image/jpeg;base64,${imagenPrincipal.imagen_data}` :
-                'https://images.unsplash.com/photo-1503736334956-4c8f8e92946d?auto=format&fit=crop&w=400&q=80'
-            };
-          } catch (error) {
-            console.error(`Error cargando imágenes para vehículo ${vehiculo.id}:`, error);
-            return {
-              ...vehiculo,
-              foto: 'https://images.unsplash.com/photo-1503736334956-4c8f8e92946d?auto=format&fit=crop&w=400&q=80'
-            };
-          }
-        })
-      );
-
-      setVehiculos(vehiculosConImagenes);
+      setVehiculos(vehiculosDestacados);
     } catch (error) {
       console.error('Error cargando vehículos:', error);
       setError('Error al cargar los vehículos');
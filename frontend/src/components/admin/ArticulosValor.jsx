@@ -15,7 +15,7 @@ import {
 } from 'react-bootstrap';
 import { FaPlus, FaEdit, FaTrash, FaGem, FaSearch, FaFilter, FaImage, FaTimes, FaPercent, FaMoneyBillWave, FaClock, FaCalculator } from 'react-icons/fa';
 import axios from 'axios';
-import API_URL from '../../config';
+import API_URL, { mediaUrl } from '../../config';
 import { useAuth } from '../../context/AuthContext';
 import useAlert from '../../hooks/useAlert';
 
@@ -105,7 +105,7 @@ const ArticulosValor = () => {
         const imagenesExistentes = imagenesResponse.data;
 
         if (imagenesExistentes.length > 0) {
-          const previews = imagenesExistentes.map(img => `data:image/jpeg;base64,${img.imagen_data}`);
+          const previews = imagenesExistentes.map(img => mediaUrl(img.url, 'thumb'));
           setImagePreviews(previews);
           setSelectedImages([]);
         } else {
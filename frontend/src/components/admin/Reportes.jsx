@@ -82,52 +82,58 @@ const Reportes = () => {
     }));
   };
 
+  // Suma un campo de los grupos del resumen (opcionalmente solo los de un estado)
+  const sumar = (grupos, campo, estado) => grupos
+    .filter(g => !estado || g.estado === estado)
+    .reduce((sum, g) => sum + (g[campo] || 0), 0);
+
+  // Filas de detalle filtradas en el servidor por estado y sede
+  const cargarDetalle = async (recurso, estado) => {
+    const params = { estado };
+    if (filters.sedeId) params.sede_id = filters.sedeId;
+    const response = await axios.get(`${API_URL}/${recurso}/`, {
+      params,
+      headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` }
+    });
+    return response.data;
+  };
+
   const generateReport = async () => {
     setLoading(true);
     setError('');
 
     try {
-      // Cargar datos necesarios para el reporte
-      const [vehiculosRes, articulosRes, mantenimientosRes] = await Promise.all([
-        axios.get(`${API_URL}/vehiculos/`),
-        axios.get(`${API_URL}/articulos_valor/`),
-        axios.get(`${API_URL}/mantenimientos/`)
-      ]);
-
-      const vehiculos = vehiculosRes.data;
-      const articulos = articulosRes.data;
-      const mantenimientos = mantenimientosRes.data;
-
-      // Filtrar por sede si se especifica
-      const vehiculosFiltrados = filters.sedeId
-        ? vehiculos.filter(v => v.sede_id === parseInt(filters.sedeId))
-        : vehiculos;
-
-      const articulosFiltrados = filters.sedeId
-        ? articulos.filter(a => a.sede_id === parseInt(filters.sedeId))
-        : articulos;
+      // Los totales se calculan en el servidor con GROUP BY (inventario, mantenimientos, empeños y ventas)
+      const token = localStorage.getItem('token');
+      const params = { desde: filters.fechaInicio, hasta: filters.fechaFin };
+      if (filters.sedeId) params.sede_id = filters.sedeId;
+      const resumenRes = await axios.get(`${API_URL}/reportes/resumen`, {
+        params,
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      const resumen = resumenRes.data;
 
       // Generar datos del reporte según el tipo
       let data = {};
 
       switch (filters.tipoReporte) {
         case 'general':
-          data = generateGeneralReport(vehiculosFiltrados, articulosFiltrados, mantenimientos);
+          data = await generateGeneralReport(resumen);
           break;
         case 'vehiculos':
-          data = generateVehiculosReport(vehiculosFiltrados);
+          data = await generateVehiculosReport(resumen);
           break;
         case 'inventario':
-          data = generateInventarioReport(vehiculosFiltrados, articulosFiltrados);
+          data = await generateInventarioReport(resumen);
           break;
         case 'ganancias':
-          data = generateGananciasReport(vehiculosFiltrados, articulosFiltrados, mantenimientos);
+          data = generateGananciasReport(resumen);
           break;
         case 'empenos':
-          data = generateEmpenosReport(vehiculosFiltrados, articulosFiltrados);
+          data = await generateEmpenosReport(resumen);
           break;
         default:
-          data = generateGeneralReport(vehiculosFiltrados, articulosFiltrados, mantenimientos);
+          data = await generateGeneralReport(resumen);
       }
 
       setReportData(data);
@@ -139,74 +145,63 @@ const Reportes = () => {
     }
   };
 
-  const generateGeneralReport = (vehiculos, articulos, mantenimientos) => {
-    const vehiculosVendidos = vehiculos.filter(v => v.estado === 'vendido');
-    const vehiculosDisponibles = vehiculos.filter(v => v.estado === 'disponible');
-    const vehiculosEmpeno = vehiculos.filter(v => v.estado === 'empeño');
-    const articulosEmpeno = articulos.filter(a => a.estado === 'empeño');
-    const articulosVendidos = articulos.filter(a => a.estado === 'vendido');
-
-    const valorInventarioVehiculos = vehiculosDisponibles.reduce((sum, v) => sum + parseFloat(v.precio_venta || 0), 0);
-    const valorInventarioArticulos = articulos.filter(a => a.estado === 'disponible').reduce((sum, a) => sum + parseFloat(a.valor || 0), 0);
-
-    const ingresosPorVentas = vehiculosVendidos.reduce((sum, v) => sum + parseFloat(v.precio_venta || 0), 0) +
-      articulosVendidos.reduce((sum, a) => sum + parseFloat(a.valor || 0), 0);
-
-    const costoMantenimientos = mantenimientos.reduce((sum, m) => sum + parseFloat(m.costo || 0), 0);
-    const costoCompraVehiculos = vehiculosVendidos.reduce((sum, v) => sum + parseFloat(v.precio_compra || 0), 0);
-
-    const gananciaBruta = ingresosPorVentas - costoCompraVehiculos;
-    const gananciaNeta = gananciaBruta - costoMantenimientos;
+  const generateGeneralReport = async ({ inventario, mantenimientos, totales }) => {
+    const [vehiculosVendidos, articulosVendidos] = await Promise.all([
+      cargarDetalle('vehiculos', 'vendido'),
+      cargarDetalle('articulos_valor', 'vendido')
+    ]);
 
     return {
       tipo: 'general',
       resumen: {
-        totalVehiculos: vehiculos.length,
-        vehiculosVendidos: vehiculosVendidos.length,
-        vehiculosDisponibles: vehiculosDisponibles.length,
-        vehiculosEmpeno: vehiculosEmpeno.length,
-        totalArticulos: articulos.length,
-        articulosEmpeno: articulosEmpeno.length,
-        articulosVendidos: articulosVendidos.length,
-        valorInventarioTotal: valorInventarioVehiculos + valorInventarioArticulos,
-        ingresosPorVentas,
-        gananciaBruta,
-        gananciaNeta,
-        costoMantenimientos
+        totalVehiculos: sumar(inventario.vehiculos, 'cantidad'),
+        vehiculosVendidos: sumar(inventario.vehiculos, 'cantidad', 'vendido'),
+        vehiculosDisponibles: sumar(inventario.vehiculos, 'cantidad', 'disponible'),
+        vehiculosEmpeno: sumar(inventario.vehiculos, 'cantidad', 'empeño'),
+        totalArticulos: sumar(inventario.articulos, 'cantidad'),
+        articulosEmpeno: sumar(inventario.articulos, 'cantidad', 'empeño'),
+        articulosVendidos: sumar(inventario.articulos, 'cantidad', 'vendido'),
+        valorInventarioTotal: totales.valor_inventario,
+        ingresosPorVentas: totales.ingresos_ventas,
+        gananciaBruta: totales.ganancia_bruta,
+        gananciaNeta: totales.ganancia_neta,
+        costoMantenimientos: totales.costo_mantenimientos
       },
       detalles: {
         vehiculosVendidos,
         articulosVendidos,
-        mantenimientosRecientes: mantenimientos.slice(-10)
+        mantenimientos
       }
     };
   };
 
-  const generateVehiculosReport = (vehiculos) => {
-    const vehiculosVendidos = vehiculos.filter(v => v.estado === 'vendido');
+  const generateVehiculosReport = async ({ inventario }) => {
+    const vehiculosVendidos = await cargarDetalle('vehiculos', 'vendido');
 
     return {
       tipo: 'vehiculos',
       resumen: {
-        totalVendidos: vehiculosVendidos.length,
-        valorTotalVentas: vehiculosVendidos.reduce((sum, v) => sum + parseFloat(v.precio_venta || 0), 0),
-        valorTotalCompras: vehiculosVendidos.reduce((sum, v) => sum + parseFloat(v.precio_compra || 0), 0)
+        totalVendidos: sumar(inventario.vehiculos, 'cantidad', 'vendido'),
+        valorTotalVentas: sumar(inventario.vehiculos, 'valor_venta', 'vendido'),
+        valorTotalCompras: sumar(inventario.vehiculos, 'valor_compra', 'vendido')
       },
       detalles: vehiculosVendidos
     };
   };
 
-  const generateInventarioReport = (vehiculos, articulos) => {
-    const vehiculosDisponibles = vehiculos.filter(v => v.estado === 'disponible');
-    const articulosDisponibles = articulos.filter(a => a.estado === 'disponible');
+  const generateInventarioReport = async ({ inventario }) => {
+    const [vehiculosDisponibles, articulosDisponibles] = await Promise.all([
+      cargarDetalle('vehiculos', 'disponible'),
+      cargarDetalle('articulos_valor', 'disponible')
+    ]);
 
     return {
       tipo: 'inventario',
       resumen: {
-        vehiculosDisponibles: vehiculosDisponibles.length,
-        articulosDisponibles: articulosDisponibles.length,
-        valorVehiculos: vehiculosDisponibles.reduce((sum, v) => sum + parseFloat(v.precio_venta || 0), 0),
-        valorArticulos: articulosDisponibles.reduce((sum, a) => sum + parseFloat(a.valor || 0), 0)
+        vehiculosDisponibles: sumar(inventario.vehiculos, 'cantidad', 'disponible'),
+        articulosDisponibles: sumar(inventario.articulos, 'cantidad', 'disponible'),
+        valorVehiculos: sumar(inventario.vehiculos, 'valor_venta', 'disponible'),
+        valorArticulos: sumar(inventario.articulos, 'valor', 'disponible')
       },
       detalles: {
         vehiculos: vehiculosDisponibles,
@@ -215,45 +210,42 @@ const Reportes = () => {
     };
   };
 
-  const generateGananciasReport = (vehiculos, articulos, mantenimientos) => {
-    const vehiculosVendidos = vehiculos.filter(v => v.estado === 'vendido');
-    const articulosVendidos = articulos.filter(a => a.estado === 'vendido');
-
-    const ingresosPorVentas = vehiculosVendidos.reduce((sum, v) => sum + parseFloat(v.precio_venta || 0), 0) +
-      articulosVendidos.reduce((sum, a) => sum + parseFloat(a.valor || 0), 0);
-
-    const costoCompras = vehiculosVendidos.reduce((sum, v) => sum + parseFloat(v.precio_compra || 0), 0);
-    const costoMantenimientos = mantenimientos.reduce((sum, m) => sum + parseFloat(m.costo || 0), 0);
+  const generateGananciasReport = ({ ventas, totales }) => {
+    const ventaPorTipo = (tipo) => ventas.find(v => v.tipo === tipo) || { total_ventas: 0, total_ganancias: 0 };
+    const vehiculos = ventaPorTipo('venta_vehiculo');
+    const articulos = ventaPorTipo('venta_articulo');
+    const recuperaciones = ventaPorTipo('recuperacion_empeño');
 
     return {
       tipo: 'ganancias',
       resumen: {
-        ingresosTotales: ingresosPorVentas,
-        costosTotales: costoCompras + costoMantenimientos,
-        gananciaBruta: ingresosPorVentas - costoCompras,
-        gananciaNeta: ingresosPorVentas - costoCompras - costoMantenimientos
-      },
-      detalles: {
-        vehiculosVendidos,
-        articulosVendidos,
-        mantenimientos
+        ingresosTotales: totales.ingresos_ventas,
+        costosTotales: totales.ingresos_ventas - totales.ganancia_neta,
+        gananciaBruta: totales.ganancia_bruta,
+        gananciaNeta: totales.ganancia_neta,
+        ventasVehiculos: vehiculos.total_ventas,
+        ventasArticulos: articulos.total_ventas,
+        recuperacionesEmpeno: recuperaciones.total_ventas,
+        costoVehiculos: vehiculos.total_ventas - vehiculos.total_ganancias,
+        costoArticulos: articulos.total_ventas - articulos.total_ganancias,
+        costoMantenimientos: totales.costo_mantenimientos
       }
     };
   };
 
-  const generateEmpenosReport = (vehiculos, articulos) => {
-    const vehiculosEmpeno = vehiculos.filter(v => v.estado === 'empeño');
-    const articulosEmpeno = articulos.filter(a => a.estado === 'empeño');
+  const generateEmpenosReport = async ({ empenos }) => {
+    const [vehiculosEmpeno, articulosEmpeno] = await Promise.all([
+      cargarDetalle('vehiculos', 'empeño'),
+      cargarDetalle('articulos_valor', 'empeño')
+    ]);
+    const porTipo = (tipo) => empenos.filter(e => e.tipo === tipo);
 
-    // Para vehículos en empeño, el valor del empeño está en precio_compra (valor_empeno)
-    // y la tasa de interés en precio_venta (interes_porcentaje)
     return {
       tipo: 'empenos',
       resumen: {
-        vehiculosEnEmpeno: vehiculosEmpeno.length,
-        articulosEnEmpeno: articulosEmpeno.length,
-        valorTotalEmpenos: vehiculosEmpeno.reduce((sum, v) => sum + parseFloat(v.precio_compra || 0), 0) +
-          articulosEmpeno.reduce((sum, a) => sum + parseFloat(a.valor || 0), 0)
+        vehiculosEnEmpeno: sumar(porTipo('vehiculo'), 'cantidad'),
+        articulosEnEmpeno: sumar(porTipo('articulo'), 'cantidad'),
+        valorTotalEmpenos: sumar(empenos, 'valor_prestado')
       },
       detalles: {
         vehiculos: vehiculosEmpeno,
@@ -280,17 +272,37 @@ const Reportes = () => {
     return sede ? sede.nombre : 'Todas las sedes';
   };
 
-  const exportToExcel = async () => {
-    if (!reportData) return;
-
-    // Cargar datos de vehículos para poder hacer la búsqueda en mantenimientos
-    let vehiculos = [];
+  // Exportación generada en el servidor (CSV por streaming), con los filtros del reporte
+  const exportTransaccionesCSV = async () => {
     try {
-      const vehiculosRes = await axios.get(`${API_URL}/vehiculos/`);
-      vehiculos = vehiculosRes.data;
+      const token = localStorage.getItem('token');
+      const params = {
+        format: 'csv',
+        fecha_inicio: filters.fechaInicio,
+        fecha_fin: filters.fechaFin
+      };
+      if (filters.sedeId) params.sede_id = filters.sedeId;
+      const response = await axios.get(`${API_URL}/transacciones/export`, {
+        params,
+        responseType: 'blob',
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      const url = window.URL.createObjectURL(response.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `transacciones_${filters.fechaInicio}_${filters.fechaFin}.csv`;
+      document.body.appendChild(link);
+      link.click();
+      link.remove();
+      window.URL.revokeObjectURL(url);
     } catch (error) {
-      console.error('Error cargando vehículos para reporte:', error);
+      console.error('Error exportando transacciones:', error);
+      setError('No se pudo exportar las transacciones');
     }
+  };
+
+  const exportToExcel = async () => {
+    if (!reportData) return;
 
     // Crear un nuevo libro de trabajo
     const workbook = XLSX.utils.book_new();
@@ -495,31 +507,22 @@ const Reportes = () => {
         XLSX.utils.book_append_sheet(workbook, articulosVendidosSheet, 'Artículos Vendidos');
       }
 
-      // Hoja 4: Mantenimientos Recientes
-      if (reportData.detalles.mantenimientosRecientes && reportData.detalles.mantenimientosRecientes.length > 0) {
+      // Hoja 4: Costo de mantenimientos por vehículo y mes (agregado en el servidor)
+      if (reportData.detalles.mantenimientos && reportData.detalles.mantenimientos.length > 0) {
         const mantenimientosData = [
-          ['MANTENIMIENTOS RECIENTES'],
+          ['MANTENIMIENTOS POR VEHÍCULO Y MES'],
           [],
-          ['Vehículo', 'Servicio', 'Descripción', 'Costo', 'Fecha', 'Taller', 'Observaciones'],
-          ...reportData.detalles.mantenimientosRecientes.map(mant => {
-            // Buscar el vehículo correspondiente en los datos cargados
-            const vehiculo = vehiculos.find(v => v.id === mant.vehiculo_id);
-            const vehiculoInfo = vehiculo ? formatCleanText(vehiculo.marca, vehiculo.modelo, vehiculo.placa) : 'Vehículo no encontrado';
-
-            return [
-              vehiculoInfo,
-              getCleanValue(mant.servicio),
-              getCleanValue(mant.observaciones),
-              mant.costo || 0,
-              formatDate(mant.fecha_servicio),
-              getCleanValue(mant.taller, 'No especificado'),
-              getCleanValue(mant.observaciones, 'Sin observaciones')
-            ];
-          }),
+          ['Vehículo', 'Mes', 'Servicios', 'Costo'],
+          ...reportData.detalles.mantenimientos.map(mant => [
+            formatCleanText(mant.marca, mant.modelo, mant.placa) || 'Vehículo no encontrado',
+            mant.mes,
+            mant.cantidad,
+            mant.costo
+          ]),
           [],
           ['RESUMEN DE MANTENIMIENTOS'],
-          ['Total Mantenimientos:', reportData.detalles.mantenimientosRecientes.length],
-          ['Costo Total:', reportData.detalles.mantenimientosRecientes.reduce((sum, m) => sum + (m.costo || 0), 0)]
+          ['Total Mantenimientos:', reportData.detalles.mantenimientos.reduce((sum, m) => sum + m.cantidad, 0)],
+          ['Costo Total:', reportData.resumen.costoMantenimientos]
         ];
 
         const mantenimientosSheet = XLSX.utils.aoa_to_sheet(mantenimientosData);
@@ -530,13 +533,10 @@ const Reportes = () => {
 
         // Ajustar ancho de columnas
         mantenimientosSheet['!cols'] = [
-          { width: 20 }, // Vehículo
-          { width: 20 }, // Tipo Mantenimiento
-          { width: 25 }, // Descripción
-          { width: 15 }, // Costo
-          { width: 12 }, // Fecha
-          { width: 20 }, // Taller
-          { width: 18 }  // Próximo Mantenimiento
+          { width: 30 }, // Vehículo
+          { width: 10 }, // Mes
+          { width: 12 }, // Servicios
+          { width: 15 }  // Costo
         ];
 
         XLSX.utils.book_append_sheet(workbook, mantenimientosSheet, 'Mantenimientos');
@@ -745,6 +745,9 @@ const Reportes = () => {
 
     } else if (reportData.tipo === 'ganancias') {
       // Reporte detallado de ganancias
+      const porcentajeIngresos = (valor) => reportData.resumen.ingresosTotales > 0
+        ? `${((valor / reportData.resumen.ingresosTotales) * 100).toFixed(2)}%`
+        : '0%';
       const gananciasData = [
         ...reportInfo,
         ['ANÁLISIS FINANCIERO DETALLADO'],
@@ -753,16 +756,17 @@ const Reportes = () => {
         [],
         ['Concepto', 'Valor (COP)', 'Porcentaje'],
         ['INGRESOS'],
-        ['Ventas de Vehículos', reportData.detalles.vehiculosVendidos ? reportData.detalles.vehiculosVendidos.reduce((sum, v) => sum + (v.precio_venta || 0), 0) : 0, ''],
-        ['Ventas de Artículos', reportData.detalles.articulosVendidos ? reportData.detalles.articulosVendidos.reduce((sum, a) => sum + (a.valor || 0), 0) : 0, ''],
+        ['Ventas de Vehículos', reportData.resumen.ventasVehiculos, ''],
+        ['Ventas de Artículos', reportData.resumen.ventasArticulos, ''],
+        ['Recuperaciones de Empeño', reportData.resumen.recuperacionesEmpeno, ''],
         ['Total Ingresos', reportData.resumen.ingresosTotales, '100%'],
         [],
         ['COSTOS DIRECTOS'],
-        ['Costo Vehículos Vendidos', reportData.detalles.vehiculosVendidos ? reportData.detalles.vehiculosVendidos.reduce((sum, v) => sum + (v.precio_compra || 0), 0) : 0, reportData.resumen.ingresosTotales > 0 ? `${((reportData.detalles.vehiculosVendidos ? reportData.detalles.vehiculosVendidos.reduce((sum, v) => sum + (v.precio_compra || 0), 0) : 0) / reportData.resumen.ingresosTotales * 100).toFixed(2)}%` : '0%'],
-        ['Costo Artículos Vendidos', 0, '0%'],
+        ['Costo Vehículos Vendidos', reportData.resumen.costoVehiculos, porcentajeIngresos(reportData.resumen.costoVehiculos)],
+        ['Costo Artículos Vendidos', reportData.resumen.costoArticulos, porcentajeIngresos(reportData.resumen.costoArticulos)],
         [],
         ['GASTOS OPERATIVOS'],
-        ['Mantenimientos', reportData.resumen.costosTotales - (reportData.detalles.vehiculosVendidos ? reportData.detalles.vehiculosVendidos.reduce((sum, v) => sum + (v.precio_compra || 0), 0) : 0), reportData.resumen.ingresosTotales > 0 ? `${(((reportData.resumen.costosTotales - (reportData.detalles.vehiculosVendidos ? reportData.detalles.vehiculosVendidos.reduce((sum, v) => sum + (v.precio_compra || 0), 0) : 0)) / reportData.resumen.ingresosTotales) * 100).toFixed(2)}%` : '0%'],
+        ['Mantenimientos', reportData.resumen.costoMantenimientos, porcentajeIngresos(reportData.resumen.costoMantenimientos)],
         ['Total Costos y Gastos', reportData.resumen.costosTotales, reportData.resumen.ingresosTotales > 0 ? `${((reportData.resumen.costosTotales / reportData.resumen.ingresosTotales) * 100).toFixed(2)}%` : '0%'],
         [],
         ['RESULTADOS'],
@@ -863,12 +867,18 @@ const Reportes = () => {
           <FaChartBar className="me-2" />
           Reportes y Análisis
         </h2>
-        {reportData && (
-          <Button variant="success" onClick={exportToExcel}>
+        <div className="d-flex gap-2">
+          <Button variant="outline-success" onClick={exportTransaccionesCSV}>
             <FaDownload className="me-2" />
-            Exportar Excel
+            Transacciones CSV
           </Button>
-        )}
+          {reportData && (
+            <Button variant="success" onClick={exportToExcel}>
+              <FaDownload className="me-2" />
+              Exportar Excel
+            </Button>
+          )}
+        </div>
       </div>
 
       {error && (
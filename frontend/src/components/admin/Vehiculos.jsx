@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   Row,
   Col,
@@ -17,7 +17,7 @@ import {
 import { FaPlus, FaEdit, FaTrash, FaCar, FaSearch, FaFilter, FaImage, FaTimes, FaStar, FaVideo, FaPlay, FaEye, FaEyeSlash, FaHandHoldingUsd, FaMoneyBillWave } from 'react-icons/fa';
 import axios from 'axios';
 import { useAuth } from '../../context/AuthContext';
-import API_URL from '../../config';
+import API_URL, { mediaUrl } from '../../config';
 
 const Vehiculos = () => {
   const { isAdmin } = useAuth();
@@ -83,18 +83,43 @@ const Vehiculos = () => {
     { value: 'baja', label: 'Baja', variant: 'danger' }
   ];
 
+  const filtrosIniciales = useRef(true);
+
   useEffect(() => {
     loadData();
   }, []);
 
+  // Los filtros se aplican en el servidor; se espera a que el usuario deje de escribir
+  useEffect(() => {
+    if (filtrosIniciales.current) {
+      filtrosIniciales.current = false;
+      return;
+    }
+    const timer = setTimeout(() => {
+      loadVehiculos().catch(error => {
+        console.error('Error cargando vehículos:', error);
+        setError('Error al cargar los vehículos');
+      });
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm, filterEstado, filterSede]);
+
+  const loadVehiculos = async () => {
+    const params = {};
+    if (searchTerm) params.q = searchTerm;
+    if (filterEstado) params.estado = filterEstado;
+    if (filterSede) params.sede_id = filterSede;
+    const vehiculosRes = await axios.get(`${API_URL}/vehiculos/`, { params });
+    setVehiculos(vehiculosRes.data);
+  };
+
   const loadData = async () => {
     try {
       setLoading(true);
-      const [vehiculosRes, sedesRes] = await Promise.all([
-        axios.get(`${API_URL}/vehiculos/`),
+      const [, sedesRes] = await Promise.all([
+        loadVehiculos(),
         axios.get(`${API_URL}/sedes/`)
       ]);
-      setVehiculos(vehiculosRes.data);
       setSedes(sedesRes.data);
     } catch (error) {
       console.error('Error cargando datos:', error);
@@ -131,8 +156,8 @@ const Vehiculos = () => {
         const imagenesExistentes = imagenesResponse.data;
 
         if (imagenesExistentes.length > 0) {
-          // Convertir las imágenes de base64 a previsualizaciones
-          const previews = imagenesExistentes.map(img => `data:image/jpeg;base64,${img.imagen_data}`);
+          // Usar la url de cada imagen como previsualización
+          const previews = imagenesExistentes.map(img => mediaUrl(img.url, 'thumb'));
           setImagePreviews(previews);
           // No establecemos selectedImages porque estas son imágenes existentes, no nuevas
           setSelectedImages([]);
@@ -542,18 +567,8 @@ const Vehiculos = () => {
     return new Date(dateString).toLocaleDateString('es-CO');
   };
 
-  // Filtrar vehículos
-  const filteredVehiculos = vehiculos.filter(vehiculo => {
-    const matchesSearch = !searchTerm ||
-      vehiculo.marca?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      vehiculo.modelo?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      vehiculo.placa?.toLowerCase().includes(searchTerm.toLowerCase());
-
-    const matchesEstado = !filterEstado || vehiculo.estado === filterEstado;
-    const matchesSede = !filterSede || vehiculo.sede_id === parseInt(filterSede);
-
-    return matchesSearch && matchesEstado && matchesSede;
-  });
+  // Los vehículos ya llegan filtrados desde el servidor
+  const filteredVehiculos = vehiculos;
 
   if (loading) {
     return (
@@ -1,4 +1,11 @@
 // Configuración de la API según el entorno
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
+// URL absoluta de un archivo de media; size pide una variante (thumb, card o detail).
+// Las URLs de la API ya pueden traer ?v=<sha256>, así que size se agrega con & en ese caso.
+export const mediaUrl = (url, size) => {
+  if (!size) return `${API_URL}${url}`;
+  return `${API_URL}${url}${url.includes('?') ? '&' : '?'}size=${size}`;
+};
+
 export default API_URL;
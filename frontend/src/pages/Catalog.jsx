@@ -29,38 +29,15 @@ const Catalog = () => {
   const loadVehiculos = async () => {
     try {
       setLoading(true);
-      // Obtener vehículos visibles en el catálogo público
-      const response = await axios.get(`${API_URL}/vehiculos/catalogo/publico`);
-      const vehiculosData = response.data;
+      // Obtener vehículos visibles en el catálogo público junto con su imagen principal
+      const response = await axios.get(`${API_URL}/vehiculos/catalogo/publico`, {
+        params: { include: 'principal_media' }
+      });
 
-      // Ya están filtrados por el endpoint, solo los disponibles y visibles
-      const vehiculosDisponibles = vehiculosData;
-
-      // Cargar imágenes para cada vehículo
-      const vehiculosConImagenes = await Promise.all(
-        vehiculosDisponibles.map(async (vehiculo) => {
-          try {
-            const imagenesResponse = await axios.get(`${API_URL}/vehiculos/${vehiculo.id}/imagenes`);
-            const imagenes = imagenesResponse.data;
-
-            // Buscar imagen principal o tomar la primera
-            const imagenPrincipal = imagenes.find(img => img.es_principal) || imagenes[0];
-
-            return {
-              ...vehiculo,
-              imagen: imagenPrincipal ? `data:image/jpeg;base64,${imagenPrincipal.imagen_data}` : null,
-              totalImagenes: imagenes.length
-            };
-          } catch (imageError) {
-            console.error(`Error cargando imágenes para vehículo ${vehiculo.id}:`, imageError);
-            return {
-              ...vehiculo,
-              imagen: null,
-              totalImagenes: 0
-            };
-          }
-        })
-      );
+      const vehiculosConImagenes = response.data.map(vehiculo => ({
+        ...vehiculo,
+        imagen: vehiculo.imagen_principal_url ? `${API_URL}${vehiculo.imagen_principal_url}` : null
+      }));
 
       setVehiculos(vehiculosConImagenes);
 
@@ -2,7 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useParams } from 'react-router-dom';
 import { FaGasPump, FaPalette, FaCalendarAlt, FaShieldAlt, FaWhatsapp, FaShare, FaVideo, FaPlay, FaTimes, FaChevronLeft, FaChevronRight, FaExpand } from 'react-icons/fa';
 import axios from 'axios';
-import API_URL from '../config';
+import API_URL, { mediaUrl } from '../config';
 import Navbar from '../components/Navbar.jsx';
 import Footer from '../components/Footer';
 import 'bootstrap/dist/css/bootstrap.min.css';
@@ -30,16 +30,15 @@ const VehicleDetail = () => {
       const vehicleData = vehicleResponse.data;
       setVehicle(vehicleData);
 
-      // Cargar imágenes del vehículo (temporalmente usando el endpoint existente)
+      // Cargar imágenes y videos del vehículo (los videos se reproducen por rangos)
       try {
-        const imagenesResponse = await axios.get(`${API_URL}/vehiculos/${id}/imagenes`);
-        const imagenesData = imagenesResponse.data;
-
-        if (imagenesData.length > 0) {
-          const mediaFormateada = imagenesData.map(img => ({
-            ...img,
-            url: `data:image/jpeg;base64,${img.imagen_data}`,
-            tipo: 'imagen'
+        const mediaResponse = await axios.get(`${API_URL}/vehiculos/${id}/media`);
+        const mediaData = mediaResponse.data;
+
+        if (mediaData.length > 0) {
+          const mediaFormateada = mediaData.map(item => ({
+            ...item,
+            url: mediaUrl(item.url, item.tipo === 'video' ? null : 'detail')
           }));
 
           setMedia(mediaFormateada);